@@ -0,0 +1,171 @@
+"""Benchmark evaluators on synthetic detection dsmds.
+
+Each case is timed (min / median of several runs) and memory profiled (peak
+of traced allocations, numpy arrays included), and results are saved in
+JSON, so that runs of different versions can be compared.
+
+Example:
+    $ python benchmarks/bench_eval.py --output before.json
+    $ # switch to another version
+    $ python benchmarks/bench_eval.py --output after.json --compare before.json
+"""
+
+import argparse
+import itertools
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import medvision as mv
+from medvision.evaluation.compute_overlap import compute_overlap
+from synthetic import SCORE_DISTS, make_boxes, make_det_dsmds
+
+PRESETS = {
+    "quick": {
+        "num_imgs": [1000, 10000],
+        "boxes_per_img": [10],
+        "num_classes": [1],
+        "score_dist": ["uniform"],
+    },
+    "full": {
+        "num_imgs": [1000, 10000, 40000],
+        "boxes_per_img": [2, 10, 50],
+        "num_classes": [1, 3],
+        "score_dist": list(SCORE_DISTS),
+    },
+}
+TARGETS = ("eval_det", "eval_det4binarycls", "compute_overlap")
+
+
+def _measure(func, repeat):
+    """Time func() and trace its peak memory usage (in a separate run)."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "time_min": min(times),
+        "time_median": statistics.median(times),
+        "peak_memory_mb": peak / 2**20,
+    }
+
+
+def _cases(args):
+    grid = dict(PRESETS[args.preset])
+    for name in grid:
+        if getattr(args, name) is not None:
+            grid[name] = getattr(args, name)
+
+    names = list(grid.keys())
+    for values in itertools.product(*[grid[name] for name in names]):
+        yield dict(zip(names, values))
+
+
+def run(args):
+    results = []
+    for case in _cases(args):
+        dts, gts = make_det_dsmds(seed=args.seed, **case)
+        num_dets = sum(len(dt[label]) for dt in dts.values() for label in range(len(dt)))
+        num_gts = sum(len(gt[label]) for gt in gts.values() for label in range(len(gt)))
+        funcs = {
+            "eval_det": lambda: mv.eval_det(dts, gts, case["num_classes"], iou_thr=0.5),
+            "eval_det4binarycls": lambda: mv.eval_det4binarycls(dts, gts, [0.1, 0.5, 0.9]),
+        }
+        for target in args.targets:
+            if target not in funcs or (target == "eval_det4binarycls" and case["num_classes"] != 1):
+                continue
+            result = dict(target=target, num_dets=num_dets, num_gts=num_gts, **case)
+            result.update(_measure(funcs[target], args.repeat))
+            results.append(result)
+            _print(result)
+
+    # overlaps of a single image with many boxes
+    if "compute_overlap" in args.targets:
+        for n in args.overlap_sizes:
+            a, b = make_boxes(n, seed=args.seed), make_boxes(n // 2, seed=args.seed + 1)
+            result = dict(target="compute_overlap", num_dets=n, num_gts=n // 2)
+            result.update(_measure(lambda: compute_overlap(a, b), args.repeat))
+            results.append(result)
+            _print(result)
+
+    return results
+
+
+def _print(result):
+    case = " ".join(
+        "{}={}".format(k, v) for k, v in result.items() if not k.startswith(("time", "peak"))
+    )
+    print("{:<100s} {:8.3f}s {:9.1f}MB".format(case, result["time_min"], result["peak_memory_mb"]))
+
+
+def _case_key(result):
+    return tuple((k, v) for k, v in sorted(result.items()) if not k.startswith(("time", "peak")))
+
+
+def compare(results, baseline):
+    """Print time and memory ratios of results to a baseline run."""
+    baseline = {_case_key(r): r for r in baseline["results"]}
+    print("\ncompared to baseline (ratio < 1 means faster / smaller):")
+    for result in results:
+        base = baseline.get(_case_key(result))
+        if base is None:
+            continue
+        print(
+            "{:<20s} num_dets={:<9d} time x{:.2f} memory x{:.2f}".format(
+                result["target"],
+                result["num_dets"],
+                result["time_min"] / max(base["time_min"], 1e-9),
+                result["peak_memory_mb"] / max(base["peak_memory_mb"], 1e-9),
+            )
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--preset", choices=sorted(PRESETS.keys()), default="quick")
+    parser.add_argument("--targets", nargs="+", choices=TARGETS, default=list(TARGETS))
+    parser.add_argument("--num-imgs", dest="num_imgs", nargs="+", type=int)
+    parser.add_argument("--boxes-per-img", dest="boxes_per_img", nargs="+", type=int)
+    parser.add_argument("--num-classes", dest="num_classes", nargs="+", type=int)
+    parser.add_argument("--score-dist", dest="score_dist", nargs="+", choices=SCORE_DISTS)
+    parser.add_argument("--overlap-sizes", nargs="+", type=int, default=[1000, 4000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="path of the JSON result file")
+    parser.add_argument("--compare", help="path of a JSON result file to compare with")
+    args = parser.parse_args()
+
+    output = {
+        "meta": {
+            "medvision": mv.__version__,
+            "numpy": np.__version__,
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "args": vars(args),
+        },
+        "results": run(args),
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(output["results"], json.load(f))
+
+
+if __name__ == "__main__":
+    main()
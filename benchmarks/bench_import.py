@@ -0,0 +1,145 @@
+"""Benchmark import time of medvision.
+
+Each statement is run in fresh interpreters (so that nothing is cached in
+sys.modules), the time of the statement is measured and heavy dependencies
+loaded by it are recorded. The exit code is 1 if a statement is slower than
+its limit, so that import time regressions are caught.
+
+Example:
+    $ python benchmarks/bench_import.py --output import.json
+    $ python benchmarks/bench_import.py --max-time 0.1
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+STATEMENTS = (
+    "import medvision as mv",
+    "import medvision as mv; mv.glob",
+    "import medvision as mv; mv.imread",
+    "import medvision as mv; mv.eval_det",
+    "import medvision as mv; mv.draw_roc_curve",
+    "from medvision import *",
+)
+HEAVY_MODULES = (
+    "Crypto",
+    "SimpleITK",
+    "cv2",
+    "matplotlib",
+    "pandas",
+    "pydicom",
+    "sklearn",
+    "tqdm",
+)
+
+_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+exec({statement!r})
+elapsed = time.perf_counter() - start
+loaded = [m for m in {heavy_modules!r} if m in sys.modules]
+print(json.dumps({{"time": elapsed, "loaded": loaded}}))
+"""
+
+
+def _run(statement, root_dir):
+    script = _SCRIPT.format(statement=statement, heavy_modules=HEAVY_MODULES)
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [root_dir, env.get("PYTHONPATH")]))
+    output = subprocess.run(
+        [sys.executable, "-c", script], env=env, check=True, capture_output=True, text=True
+    ).stdout
+
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(args):
+    results = []
+    for statement in args.statements:
+        runs = [_run(statement, args.root_dir) for _ in range(args.repeat)]
+        times = [r["time"] for r in runs]
+        result = {
+            "statement": statement,
+            "time_min": min(times),
+            "time_median": statistics.median(times),
+            "loaded": runs[0]["loaded"],
+        }
+        results.append(result)
+        print(
+            "{:<45s} {:8.3f}s  loaded: {}".format(
+                statement, result["time_min"], ", ".join(result["loaded"]) or "-"
+            )
+        )
+
+    return results
+
+
+def compare(results, baseline):
+    """Print time ratios of results to a baseline run."""
+    baseline = {r["statement"]: r for r in baseline["results"]}
+    print("\ncompared to baseline (ratio < 1 means faster):")
+    for result in results:
+        base = baseline.get(result["statement"])
+        if base is None:
+            continue
+        print(
+            "{:<45s} time x{:.2f}".format(
+                result["statement"], result["time_min"] / max(base["time_min"], 1e-9)
+            )
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--statements", nargs="+", default=list(STATEMENTS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--root-dir",
+        default=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        help="directory containing the medvision package",
+    )
+    parser.add_argument(
+        "--max-time",
+        type=float,
+        help="limit (seconds) of 'import medvision', exit with 1 if it is exceeded",
+    )
+    parser.add_argument("--output", help="path of the JSON result file")
+    parser.add_argument("--compare", help="path of a JSON result file to compare with")
+    args = parser.parse_args()
+
+    output = {
+        "meta": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "args": vars(args),
+        },
+        "results": run(args),
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(output["results"], json.load(f))
+
+    if args.max_time is not None:
+        for result in output["results"]:
+            if result["statement"] == STATEMENTS[0] and result["time_min"] > args.max_time:
+                print(
+                    "'{}' takes {:.3f}s, more than {:.3f}s".format(
+                        result["statement"], result["time_min"], args.max_time
+                    )
+                )
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
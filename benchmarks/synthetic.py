@@ -0,0 +1,84 @@
+"""Synthetic detection dsmds for benchmarks."""
+
+from collections import OrderedDict
+
+import numpy as np
+
+SCORE_DISTS = ("uniform", "beta", "bimodal", "ties")
+
+
+def _scores(rng, n, score_dist):
+    if score_dist == "uniform":
+        return rng.random(n)
+    if score_dist == "beta":  # most detections have low scores
+        return rng.beta(0.5, 4.0, n)
+    if score_dist == "bimodal":  # confident detector
+        return np.where(rng.random(n) < 0.5, rng.beta(8, 2, n), rng.beta(2, 8, n))
+    if score_dist == "ties":  # scores quantized to 2 decimals
+        return np.round(rng.random(n), 2)
+    raise ValueError("unknown score distribution: {}".format(score_dist))
+
+
+def _random_boxes(rng, n, img_size):
+    wh = rng.uniform(8, img_size / 8, (n, 2))
+    xy = rng.uniform(0, img_size, (n, 2)) - wh / 2
+    return np.hstack([xy, xy + wh])
+
+
+def make_boxes(n, img_size=1024, seed=0):
+    """Generate n random bounding boxes of shape (n, 4) (float32)."""
+    return _random_boxes(np.random.default_rng(seed), n, img_size).astype(np.float32)
+
+
+def make_det_dsmds(
+    num_imgs,
+    boxes_per_img=10,
+    num_classes=1,
+    score_dist="uniform",
+    tp_ratio=0.5,
+    img_size=1024,
+    seed=0,
+):
+    """Generate a pair of detection dsmds (dts, gts).
+
+    The number of ground truths of an image follows a Poisson distribution
+    with mean boxes_per_img / 2, and so does the number of detections (with
+    mean boxes_per_img). A fraction of detections are jittered copies of
+    ground truths, the others are random boxes.
+
+    Args:
+        num_imgs (int): number of images.
+        boxes_per_img (int): mean number of detections per image and label.
+        num_classes (int): number of classes.
+        score_dist (str): distribution of detection scores, one of
+            SCORE_DISTS.
+        tp_ratio (float): fraction of detections generated around ground
+            truths.
+        img_size (int): images are of shape (img_size, img_size).
+        seed (int): random seed.
+
+    Returns:
+        (OrderedDict): detection results, refer to 'mv.load_det_dsmd'.
+        (OrderedDict): ground truths, refer to 'mv.load_det_dsmd'.
+    """
+    rng = np.random.default_rng(seed)
+
+    dts, gts = OrderedDict(), OrderedDict()
+    for i in range(num_imgs):
+        key = "img_{:08d}.png".format(i)
+        dts[key], gts[key] = [], []
+        for _ in range(num_classes):
+            gt = _random_boxes(rng, rng.poisson(boxes_per_img / 2), img_size)
+
+            num_dts = rng.poisson(boxes_per_img)
+            num_tps = min(rng.binomial(num_dts, tp_ratio), len(gt) * 2) if len(gt) else 0
+            matched = gt[rng.integers(0, max(len(gt), 1), num_tps)]
+            sizes = np.tile(matched[:, 2:] - matched[:, :2], 2)
+            matched = matched + rng.normal(0, 0.05, matched.shape) * sizes
+            dt = np.vstack([matched, _random_boxes(rng, num_dts - num_tps, img_size)])
+            dt = np.hstack([dt, _scores(rng, len(dt), score_dist)[:, None]])
+
+            dts[key].append(dt.astype(np.float32))
+            gts[key].append(gt.astype(np.float32))
+
+    return dts, gts
@@ -1,10 +1,19 @@
 # flake8: noqa
 from .__version__ import __version__
-from .annotation import *
-from .dataset import *
-from .dicom import *
-from .evaluation import *
-from .image import *
-from .network import *
-from .util import *
-from .visualization import *
+from ._lazy import attach as _attach
+
+# subpackages are imported on first attribute access (e.g. 'mv.imread'), so
+# that heavy dependencies (matplotlib, SimpleITK, ...) are loaded on demand
+__getattr__, __dir__, __all__ = _attach(
+    __name__,
+    {
+        "annotation": None,
+        "dataset": None,
+        "dicom": None,
+        "evaluation": None,
+        "image": None,
+        "network": None,
+        "util": None,
+        "visualization": None,
+    },
+)
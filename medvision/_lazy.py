@@ -0,0 +1,86 @@
+"""Lazy loading of package attributes (PEP 562).
+
+A package declares which names each of its submodules exports, and the
+submodule is only imported when one of its names is accessed for the first
+time, e.g. 'mv.imread' imports 'medvision.image.io' (and cv2) on demand.
+"""
+
+import importlib
+import sys
+import types
+
+
+class LazyModule(types.ModuleType):
+    """Module type of lazily loaded packages.
+
+    When a submodule is imported, the import system binds it to the package
+    under its own name. Names exported by a submodule of the same name (e.g.
+    function 'eval_det' of module 'eval_det') must not be shadowed by the
+    submodule, so such bindings are skipped.
+    """
+
+    def __setattr__(self, name, value):
+        if (
+            isinstance(value, types.ModuleType)
+            and name in self.__dict__.get("_lazy_exports", ())
+            and value.__name__ == self.__name__ + "." + name
+        ):
+            return
+        super().__setattr__(name, value)
+
+
+def attach(package_name, submodules):
+    """Make attributes of a package load lazily.
+
+    Example (in the __init__.py of a package):
+    >>> __getattr__, __dir__, __all__ = attach(__name__, {"io": ["imread"]})
+
+    Args:
+        package_name (str): name of the package, i.e. its '__name__'.
+        submodules (dict): {submodule name: names exported by it}. If the
+            exported names are None, everything in '__all__' of the
+            submodule (a subpackage) is exported.
+
+    Returns:
+        (function): '__getattr__' of the package.
+        (function): '__dir__' of the package.
+        (list[str]): '__all__' of the package, i.e. exported names and
+            submodule names.
+    """
+    package = sys.modules[package_name]
+
+    # later submodules take precedence, as 'from .x import *' statements do
+    exports = {}
+    for submodule, names in submodules.items():
+        if names is None:
+            names = importlib.import_module(package_name + "." + submodule).__all__
+            # e.g. module 'medvision.dataset.util' must not hide 'medvision.util'
+            names = [name for name in names if name not in submodules]
+        for name in names:
+            exports[name] = submodule
+
+    package.__dict__["_lazy_exports"] = frozenset(exports)
+    package.__class__ = LazyModule
+
+    def __getattr__(name):
+        if name in exports:
+            module = importlib.import_module(package_name + "." + exports[name])
+            value = getattr(module, name)
+        else:
+            try:
+                value = importlib.import_module(package_name + "." + name)
+            except ModuleNotFoundError as e:
+                if e.name != package_name + "." + name:
+                    raise
+                raise AttributeError(
+                    "module '{}' has no attribute '{}'".format(package_name, name)
+                ) from None
+        setattr(package, name, value)
+        return value
+
+    def __dir__():
+        return sorted(set(package.__dict__) | set(__all__))
+
+    __all__ = list(exports) + [name for name in submodules if name not in exports]
+
+    return __getattr__, __dir__, __all__
@@ -1,16 +1,20 @@
 # flake8: noqa
+from .._lazy import attach as _attach
 
-from .mask2rws import batch_mask2rws, mask2rws
-from .rws import (
-    get_rws_annot_path,
-    get_rws_datainfo_path,
-    get_rws_flag_path,
-    get_rws_text_path,
-    load_rws_bbox,
-    load_rws_contour,
-    save_rws_bbox,
+__getattr__, __dir__, __all__ = _attach(
+    __name__,
+    {
+        "mask2rws": ["batch_mask2rws", "mask2rws"],
+        "rws": [
+            "get_rws_annot_path",
+            "get_rws_datainfo_path",
+            "get_rws_flag_path",
+            "get_rws_text_path",
+            "load_rws_bbox",
+            "load_rws_contour",
+            "save_rws_bbox",
+        ],
+        "rws2dsmd": ["dsmd2rws_bbox", "rws2dsmd_bbox"],
+        "rws2mask": ["batch_rws2mask", "rws2mask"],
+    },
 )
-from .rws2dsmd import dsmd2rws_bbox, rws2dsmd_bbox
-from .rws2mask import batch_rws2mask, rws2mask
-
-__all__ = [k for k in globals().keys() if not k.startswith("_")]
@@ -1,9 +1,22 @@
 # flake8: noqa
+from .._lazy import attach as _attach
 
-from .classification import gen_cls_ds_from_datafolder, gen_cls_dsmd_file_from_datafolder
-from .detection import load_det_dsmd, merge_det_dsmds, save_det_dsmd
-from .dsmd import load_c2l, load_dsmd, save_dsmd
-from .segmentation import load_seg_dsmd, save_seg_dsmd
-from .util import make_dsmd, match_dsmds, split_dsmd_file, update_dsmd_keys
-
-__all__ = [k for k in globals().keys() if not k.startswith("_")]
+__getattr__, __dir__, __all__ = _attach(
+    __name__,
+    {
+        "binary": ["binary_format", "convert_dsmd", "load_binary_dsmd", "save_binary_dsmd"],
+        "classification": [
+            "gen_cls_ds_from_datafolder",
+            "gen_cls_dsmd_file_from_datafolder",
+            "load_cls_dsmd",
+            "save_cls_dsmd",
+        ],
+        "container": ["Dsmd"],
+        "detection": ["load_det_dsmd", "merge_det_dsmds", "save_det_dsmd"],
+        "dsmd": ["iter_dsmd", "load_c2l", "load_dsmd", "save_dsmd"],
+        "ragged": ["RaggedDetDsmd"],
+        "segmentation": ["load_seg_dsmd", "save_seg_dsmd"],
+        "split": ["split_dsmd"],
+        "util": ["make_dsmd", "match_dsmds", "split_dsmd_file", "update_dsmd_keys"],
+    },
+)
@@ -0,0 +1,295 @@
+"""Binary columnar dsmd files.
+
+A binary dsmd stores keys, annotations and class names of a dataset as a
+few typed columns, so that it is loaded without parsing text.
+
+npz files (uncompressed) store:
+    mode (str): 'cls' or 'det'.
+    keys (ndarray): keys of shape (N,), natsorted.
+    det:
+        boxes (ndarray): boxes of all the images of shape (n, 4) or (n, 5)
+            (float32), boxes of an image are sorted by label.
+        labels (ndarray): labels of boxes of shape (n,) (int16).
+        offsets (ndarray): boxes[offsets[i]:offsets[i + 1]] are boxes of
+            the i-th image (int64).
+        class_names (ndarray): class names ordered by label.
+    cls:
+        values (ndarray): labels (int64) of shape (N,), multi-labels (int64)
+            of shape (N, C), or strings (e.g. mask paths) of shape (N,).
+Members are not compressed, so they are memory-mapped instead of read.
+
+parquet files (pandas with pyarrow is needed) store one row per box (det,
+a row of NaN boxes for an empty image) with columns 'key', 'x1', 'y1',
+'x2', 'y2', ('score') and 'class' (categorical whose categories are class
+names ordered by label), or one row per key (cls) with columns 'key' and
+'value' (or 'value0', 'value1', ... for multi-labels).
+"""
+
+import struct
+import zipfile
+from collections import OrderedDict
+
+import numpy as np
+from natsort import index_natsorted
+
+import medvision as mv
+
+from .container import Dsmd
+from .ragged import RaggedDetDsmd
+
+BINARY_FORMATS = ("npz", "parquet")
+BOX_COLUMNS = ("x1", "y1", "x2", "y2", "score")
+
+_MAGICS = {b"PK\x03\x04": "npz", b"PAR1": "parquet"}
+
+
+def binary_format(dsmd_path):
+    """Format of a binary dsmd file ('npz' or 'parquet'), or None if it is a
+    text (csv) dsmd file.
+    """
+    with open(str(dsmd_path), "rb") as f:
+        return _MAGICS.get(f.read(4))
+
+
+def _class_names(class2label):
+    if isinstance(class2label, str):
+        class2label = mv.load_c2l(class2label)
+    label2class = {label: name for name, label in class2label.items()}
+    assert sorted(label2class) == list(range(len(label2class))), "labels must be 0, 1, ..."
+    return [label2class[label] for label in range(len(label2class))]
+
+
+def _cls_columns(data):
+    """Keys (natsorted) and values of a cls dsmd as arrays."""
+    keys = list(data.keys())
+    keys = [keys[i] for i in index_natsorted(keys)]
+    values = [data[key] for key in keys]
+
+    if all(isinstance(v, str) for v in values):
+        return keys, np.array(values, dtype=str)
+    if all(isinstance(v, (int, np.integer)) and not isinstance(v, bool) for v in values):
+        return keys, np.array(values, dtype=np.int64)
+    if all(mv.isarrayinstance(v) and not isinstance(v, str) for v in values):
+        values = np.array([list(v) for v in values], dtype=np.int64)
+        assert values.ndim == 2, "multi-labels must have the same length"
+        return keys, values
+    raise ValueError("only int, multi-label or str annotations can be saved in binary format")
+
+
+def _save_npz(f, data, class_names, mode):
+    if mode == "det":
+        ragged = RaggedDetDsmd.from_dsmd(data, len(class_names))
+        np.savez(
+            f,
+            mode=np.array("det"),
+            keys=np.array(list(ragged.keys())),
+            boxes=ragged.boxes,
+            labels=ragged.labels,
+            offsets=ragged.offsets,
+            class_names=np.array(class_names, dtype=str),
+        )
+    else:
+        keys, values = _cls_columns(data)
+        np.savez(f, mode=np.array("cls"), keys=np.array(keys), values=values)
+
+
+def _save_parquet(f, data, class_names, mode):
+    import pandas as pd
+
+    if mode == "det":
+        ragged = RaggedDetDsmd.from_dsmd(data, len(class_names))
+        counts = np.diff(ragged.offsets)
+        num_rows = np.maximum(counts, 1)  # a row of NaN boxes for an empty image
+        row_offsets = np.concatenate([[0], np.cumsum(num_rows)])
+        rows = np.repeat(row_offsets[:-1] - ragged.offsets[:-1], counts) + np.arange(
+            len(ragged.boxes)
+        )
+
+        boxes = np.full((row_offsets[-1], ragged.boxes.shape[1]), np.nan, dtype=np.float32)
+        boxes[rows] = ragged.boxes
+        codes = np.full(row_offsets[-1], -1, dtype=np.int16)
+        codes[rows] = ragged.labels
+
+        df = pd.DataFrame({"key": np.repeat(np.array(list(ragged.keys())), num_rows)})
+        for i in range(boxes.shape[1]):
+            df[BOX_COLUMNS[i]] = boxes[:, i]
+        df["class"] = pd.Categorical.from_codes(codes, categories=class_names)
+    else:
+        keys, values = _cls_columns(data)
+        df = pd.DataFrame({"key": keys})
+        if values.ndim == 1:
+            df["value"] = values
+        else:
+            for i in range(values.shape[1]):
+                df["value%d" % i] = values[:, i]
+
+    df.to_parquet(f, index=False)
+
+
+def save_binary_dsmd(dsmd_path, data, class2label=None, auto_mkdirs=True, mode="cls", format="npz"):
+    """Save dataset metadata to a binary dsmd file.
+
+    Args:
+        dsmd_path (str): file path to save dataset metadata.
+        data (dict or RaggedDetDsmd): dataset metadata, refer to 'load_dsmd'.
+            Boxes of det dsmds are saved as float32.
+        class2label (str or dict): class-to-label file or dict (det only).
+        auto_mkdirs (bool): If the parent folder of `file_path` does
+            not exist, whether to create it automatically.
+        mode (str): dataset mission, can be one of 'cls', 'seg', 'det'.
+        format (str): 'npz' or 'parquet'.
+    """
+    assert format in BINARY_FORMATS, "format must be one of {}".format(BINARY_FORMATS)
+    if auto_mkdirs:
+        mv.mkdirs(mv.parentdir(dsmd_path))
+
+    mode = "det" if mode == "det" else "cls"
+    class_names = _class_names(class2label) if mode == "det" else None
+
+    # np.savez appends '.npz' to paths without it, so a file object is used
+    with open(str(dsmd_path), "wb") as f:
+        if format == "npz":
+            _save_npz(f, data, class_names, mode)
+        else:
+            _save_parquet(f, data, class_names, mode)
+
+
+def _mmap_npz(dsmd_path, mmap=True):
+    """Load arrays of an npz file, memory-mapped if they are not compressed."""
+    arrays = {}
+    with zipfile.ZipFile(str(dsmd_path)) as zf, open(str(dsmd_path), "rb") as f:
+        for info in zf.infolist():
+            name = info.filename.replace(".npy", "")
+            if not mmap or info.compress_type != zipfile.ZIP_STORED:
+                arrays[name] = np.load(zf.open(info))
+                continue
+
+            # skip the local file header to the .npy data
+            f.seek(info.header_offset + 26)
+            name_length, extra_length = struct.unpack("<HH", f.read(4))
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+
+            if dtype.hasobject or len(shape) == 0 or np.prod(shape) == 0:
+                arrays[name] = np.load(zf.open(info))
+            else:
+                arrays[name] = np.memmap(
+                    f.name,
+                    dtype=dtype,
+                    mode="r",
+                    shape=shape,
+                    order="F" if fortran_order else "C",
+                    offset=f.tell(),
+                )
+
+    return arrays
+
+
+def _read_npz(dsmd_path, mmap=True):
+    arrays = _mmap_npz(dsmd_path, mmap)
+    arrays["mode"] = str(arrays["mode"])
+    if arrays["mode"] == "det":
+        arrays["class_names"] = arrays["class_names"].tolist()
+    return arrays
+
+
+def _read_parquet(dsmd_path, mmap=True):
+    import pandas as pd
+
+    from .detection import _group_det_rows
+
+    df = pd.read_parquet(str(dsmd_path), memory_map=mmap)
+    if "class" not in df.columns:
+        arrays = {"mode": "cls", "keys": df["key"].to_numpy()}
+        columns = ["value"] if "value" in df.columns else list(df.columns[1:])
+        values = df[columns].to_numpy()
+        arrays["values"] = values[:, 0] if columns == ["value"] else values
+        return arrays
+
+    class_names = df["class"].cat.categories.tolist()
+    columns = [column for column in BOX_COLUMNS if column in df.columns]
+    keys, boxes, labels, offsets = _group_det_rows(
+        df["key"], df[columns].to_numpy(dtype=np.float32), df["class"].cat.codes.to_numpy()
+    )
+    return {
+        "mode": "det",
+        "keys": keys,
+        "boxes": boxes,
+        "labels": labels,
+        "offsets": offsets,
+        "class_names": class_names,
+    }
+
+
+def _read_binary(dsmd_path, mmap=True):
+    if binary_format(dsmd_path) == "npz":
+        return _read_npz(dsmd_path, mmap)
+    return _read_parquet(dsmd_path, mmap)
+
+
+def load_binary_dsmd(dsmd_path, class2label=None, ragged=False, mmap=True):
+    """Load dataset metadata from a binary dsmd file.
+
+    Args:
+        dsmd_path (str): binary dsmd file path.
+        class2label (str, dict or None): class-to-label file or dict (det
+            only). If given, it must match class names stored in the file.
+        ragged (bool): whether to return a RaggedDetDsmd instead of a dict
+            (det only).
+        mmap (bool): whether to memory-map arrays instead of reading them.
+
+    Returns:
+        (Dsmd or RaggedDetDsmd): dataset metadata, the same as
+            'load_dsmd' on the csv file.
+    """
+    arrays = _read_binary(dsmd_path, mmap)
+    keys = np.asarray(arrays["keys"]).tolist()
+
+    if arrays["mode"] == "cls":
+        values = arrays["values"]
+        if values.ndim == 2:
+            values = [tuple(v) for v in values.tolist()]
+        else:
+            values = values.tolist()
+        # keys are stored in natsorted order
+        return Dsmd._from_sorted(keys, None, values)
+
+    class_names = arrays["class_names"]
+    if class2label is not None:
+        assert _class_names(class2label) == class_names, "class2label does not match"
+    dsmd = RaggedDetDsmd(
+        keys, arrays["boxes"], arrays["labels"], arrays["offsets"], len(class_names)
+    )
+
+    if ragged:
+        return dsmd
+    return Dsmd._from_sorted(keys, None, [dsmd[key] for key in keys])
+
+
+def convert_dsmd(src_path, dst_path, class2label=None, mode="cls", format="npz"):
+    """Convert a dsmd file between csv and binary formats.
+
+    Conversions are lossless, i.e. the converted file is loaded as the same
+    dsmd (boxes of det dsmds are float32).
+
+    Args:
+        src_path (str): source dsmd file, csv or binary.
+        dst_path (str): destination dsmd file.
+        class2label (str, dict or None): class-to-label file or dict (det
+            only), optional if the source file is binary.
+        mode (str): dataset mission, can be one of 'cls', 'seg', 'det'.
+        format (str): format of the destination file, 'csv', 'npz' or
+            'parquet'.
+    """
+    if mode == "det" and class2label is None:
+        if binary_format(src_path) is None:
+            raise ValueError("class2label is required to convert a text det dsmd")
+        class_names = _read_binary(src_path, mmap=True)["class_names"]
+        class2label = OrderedDict((name, label) for label, name in enumerate(class_names))
+
+    data = mv.load_dsmd(src_path, class2label, mode=mode)
+    mv.save_dsmd(dst_path, data, class2label, mode=mode, format=format)
@@ -1,22 +1,175 @@
 import ast
+import io
+import itertools
+import re
+from collections import OrderedDict
+
+import numpy as np
+from natsort import index_natsorted
 
 import medvision as mv
 
+# the first characters of python literals, other values (e.g. paths) are
+# kept as str without trying ast.literal_eval
+_LITERAL_START = re.compile(r"""[0-9+\-.(\[{'"]|(?:True|False|None)$|[bBrRuUfF]{1,2}['"]""")
+
+# an int label as ast.literal_eval parses it, i.e. without leading zeros,
+# '+' or '_', and with at most 18 digits so that it fits in int64
+_INT = re.compile(r"0|-?[1-9][0-9]{0,17}")
+_INT_VALUE = r"[ \t]*(?:" + _INT.pattern + r")[ \t]*"
+
+
+def _parse_cls_line(line):
+    key, value = line.strip().split(",", 1)
+    if _INT.fullmatch(value.strip()):  # the same as ast.literal_eval, but faster
+        value = int(value.strip())
+    elif _LITERAL_START.match(value.strip()):
+        try:  # try to interpret annotation as int or list[int].
+            value = ast.literal_eval(value.strip())
+        except (SyntaxError, ValueError):
+            pass
+
+    return key, value
+
+
+def _parse_int_labels(text, num_head_lines=100):
+    """Parse a cls dsmd file of int labels or multi-labels at once.
+
+    The shape of values (an int or a tuple of C ints) is detected on the
+    first lines, then all the lines are validated by a single regular
+    expression and values are parsed by numpy.
+
+    Returns:
+        (list or None): keys of lines, None if the file is not of int labels
+            or multi-labels of the same length.
+        (ndarray or None): labels of shape (N,) or multi-labels of shape
+            (N, C) (int64).
+    """
+    head = [
+        _parse_cls_line(line)[1] for line in itertools.islice(io.StringIO(text), num_head_lines)
+    ]
+    if len(head) > 0 and all(type(value) is int for value in head):
+        num_values = 1
+    elif len(head) > 0 and all(
+        type(value) is tuple
+        and len(value) == len(head[0]) > 1
+        and all(type(x) is int for x in value)
+        for value in head
+    ):
+        num_values = len(head[0])
+    else:
+        return None, None
 
-def load_cls_dsmd(dsmd_path):
-    data = {}
+    # every line must match, otherwise it is left to ast.literal_eval
+    regex = re.compile(r"^[^\s,][^,\n]*," + ",".join([_INT_VALUE] * num_values) + "$", re.M)
+    num_lines = text.count("\n") + (not text.endswith("\n"))
+    if len(regex.findall(text)) != num_lines:
+        return None, None
+
+    keys = re.findall(r"^[^,\n]*", text, re.M)[:num_lines]
+    values = np.loadtxt(
+        io.StringIO(text),
+        dtype=np.int64,
+        delimiter=",",
+        comments=None,
+        usecols=range(1, num_values + 1),
+        ndmin=2,
+    )
+    return keys, values[:, 0] if num_values == 1 else values
+
+
+def load_cls_dsmd(dsmd_path, as_matrix=False, num_classes=None):
+    """Load classification (or segmentation) dataset metadata.
+
+    Files of int labels or multi-labels are parsed at once instead of line
+    by line with ast.literal_eval, and the result is the same.
+
+    Args:
+        dsmd_path (str): dataset metadata file path.
+        as_matrix (bool): whether to return labels as a dense matrix instead
+            of a dict (int labels or multi-labels only).
+        num_classes (int or None): number of classes of int labels (if
+            as_matrix is True). If None, it is the max label + 1.
+
+    Returns:
+        (OrderedDict): dataset metadata, refer to 'load_dsmd'.
+        or (if as_matrix is True)
+        (ndarray): natsorted keys of shape (N,).
+        (ndarray): labels of shape (N, C) (uint8), one-hot for int labels.
+    """
     with open(dsmd_path, "r") as fd:
-        for line in fd:
-            key, value = line.strip().split(",", 1)
-            try:  # try to interpret annotation as int or list[int].
-                value = ast.literal_eval(value.strip())
-            except (SyntaxError, ValueError):
-                pass
+        text = fd.read()
+
+    keys, values = _parse_int_labels(text)
+    if as_matrix:
+        if keys is None:
+            raise ValueError("only int labels or multi-labels can be loaded as a matrix")
+        return _label_matrix(keys, values, num_classes)
+
+    if keys is None:
+        data = {}
+        for line in io.StringIO(text):
+            key, value = _parse_cls_line(line)
             data[key] = value
+    elif values.ndim == 1:
+        data = dict(zip(keys, values.tolist()))
+    else:
+        data = dict(zip(keys, map(tuple, values.tolist())))
 
     return mv.make_dsmd(data)
 
 
+def _label_matrix(keys, values, num_classes=None):
+    # the last line of a key wins, as in the dict
+    index = dict(zip(keys, range(len(keys))))
+    keys = list(index.keys())
+    rows = np.array(list(index.values()), dtype=np.int64)
+    order = index_natsorted(keys)
+    keys, values = np.array(keys)[order], values[rows[order]]
+
+    if values.ndim == 2:
+        assert values.min(initial=0) >= 0 and values.max(initial=0) <= 255, "labels must be uint8"
+        return keys, values.astype(np.uint8)
+
+    assert values.min(initial=0) >= 0, "labels must be non-negative"
+    num_classes = values.max(initial=-1) + 1 if num_classes is None else num_classes
+    assert values.max(initial=-1) < num_classes, "labels must be in [0, num_classes)"
+    matrix = np.zeros((len(values), num_classes), dtype=np.uint8)
+    matrix[np.arange(len(values)), values] = 1
+
+    return keys, matrix
+
+
+def iter_cls_dsmd(dsmd_path, chunk_rows=100000, chunked=False):
+    """Iterate over a classification (or segmentation) dsmd file line by
+    line, with bounded memory. Items are in order of appearance.
+
+    Args:
+        dsmd_path (str): dataset metadata file path.
+        chunk_rows (int): number of rows of a chunk.
+        chunked (bool): whether to yield a dsmd of each chunk instead of
+            each item.
+
+    Yields:
+        (tuple): key and annotation of an item, refer to 'load_dsmd'. Or an
+            OrderedDict of items of a chunk if chunked is True.
+    """
+    with open(dsmd_path, "r") as fd:
+        if not chunked:
+            yield from (_parse_cls_line(line) for line in fd)
+            return
+
+        dsmd = OrderedDict()
+        for line in fd:
+            key, value = _parse_cls_line(line)
+            dsmd[key] = value
+            if len(dsmd) == chunk_rows:
+                yield dsmd
+                dsmd = OrderedDict()
+        if len(dsmd) > 0:
+            yield dsmd
+
+
 def save_cls_dsmd(dsmd_path, data, auto_mkdirs=True):
     if auto_mkdirs:
         mv.mkdirs(mv.parentdir(dsmd_path))
@@ -24,10 +177,13 @@ def save_cls_dsmd(dsmd_path, data, auto_mkdirs=True):
     dsmd = mv.make_dsmd(data)
     with open(dsmd_path, "w") as fd:
         for key, value in dsmd.items():
-            if mv.isarrayinstance(value):  # handle multi-label case
-                value = ",".join([str(entry) for entry in value])
-            line = "%s,%s\n" % (str(key), str(value))
-            fd.write(line)
+            fd.write(_format_cls_line(key, value))
+
+
+def _format_cls_line(key, value):
+    if mv.isarrayinstance(value) and not isinstance(value, str):  # multi-label case
+        value = ",".join([str(entry) for entry in value])
+    return "%s,%s\n" % (str(key), str(value))
 
 
 def gen_cls_dsmd_file_from_datafolder(root_dir, c2l_path, dsmd_path, classnames=None):
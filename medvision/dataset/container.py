@@ -0,0 +1,175 @@
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from collections.abc import Mapping
+
+from natsort import natsort_keygen
+
+_natsort_key = natsort_keygen()
+
+
+class Dsmd(OrderedDict):
+    """Dataset metadata whose items are kept in natsorted key order.
+
+    Natsort keys of keys are computed once and cached (in natsorted order),
+    so that a new key is inserted in place with bisect instead of sorting
+    all the items again, and subsets (e.g. 'intersection', 'difference'
+    and 'subset') keep the order of the dsmd without re-sorting. Ties (keys
+    with the same natsort key) are in order of insertion, as 'natsorted'
+    does.
+
+    It is an OrderedDict, so it can be used wherever a dsmd is used.
+    Inserting a key is O(log n) if it goes to the end, O(n) otherwise.
+    Items can not be reordered (e.g. by 'move_to_end').
+
+    Example:
+    >>> dsmd = mv.Dsmd({"data/10.png": 1, "data/2.png": 0})
+    >>> list(dsmd)
+    ['data/2.png', 'data/10.png']
+    >>> dsmd["data/3.png"] = 1  # inserted between them
+
+    Args:
+        data (dict or iterable): items of the dsmd.
+    """
+
+    def __init__(self, data=(), **kwargs):
+        super().__init__()
+        if isinstance(data, Dsmd) and not kwargs:
+            self._keys = list(data._keys)
+            self._natkeys = None if data._natkeys is None else list(data._natkeys)
+            values = data.values()
+        else:
+            data = OrderedDict(data, **kwargs)
+            natkeys = [_natsort_key(key) for key in data]
+            order = sorted(range(len(natkeys)), key=natkeys.__getitem__)
+            keys = list(data.keys())
+            self._keys = [keys[i] for i in order]
+            self._natkeys = [natkeys[i] for i in order]
+            values = [data[key] for key in self._keys]
+
+        for key, value in zip(self._keys, values):
+            OrderedDict.__setitem__(self, key, value)
+
+    @classmethod
+    def _from_sorted(cls, keys, natkeys, values):
+        """Make a dsmd from items already in natsorted order (e.g. loaded
+        from a dsmd file). If natkeys is None, natsort keys are computed
+        when they are needed, i.e. when a key is inserted or deleted.
+        """
+        dsmd = cls()
+        dsmd._keys = list(keys)
+        dsmd._natkeys = None if natkeys is None else list(natkeys)
+        for key, value in zip(dsmd._keys, values):
+            OrderedDict.__setitem__(dsmd, key, value)
+        return dsmd
+
+    def _sort_keys(self):
+        if self._natkeys is None:
+            self._natkeys = [_natsort_key(key) for key in self._keys]
+        return self._natkeys
+
+    def __reduce__(self):
+        # the cached natsort keys are pickled instead of being recomputed
+        return self._from_sorted, (self._keys, self._natkeys, list(self.values()))
+
+    def _position(self, key):
+        natkey, natkeys = _natsort_key(key), self._sort_keys()
+        first = bisect_left(natkeys, natkey)
+        last = bisect_right(natkeys, natkey, lo=first)
+        return first + self._keys[first:last].index(key)
+
+    def __setitem__(self, key, value):
+        if key in self:
+            OrderedDict.__setitem__(self, key, value)
+            return
+
+        natkey, natkeys = _natsort_key(key), self._sort_keys()
+        index = bisect_right(natkeys, natkey)
+        self._keys.insert(index, key)
+        natkeys.insert(index, natkey)
+        OrderedDict.__setitem__(self, key, value)
+        # keys after the new one are moved behind it
+        start = index + 1
+        for next_key in self._keys[start:]:
+            OrderedDict.move_to_end(self, next_key)
+
+    def move_to_end(self, key, last=True):
+        raise NotImplementedError("items of a Dsmd are in natsorted order, and can not be moved")
+
+    def __delitem__(self, key):
+        OrderedDict.__delitem__(self, key)
+        index = self._position(key)
+        del self._keys[index], self._natkeys[index]
+
+    def pop(self, key, *default):
+        if key not in self:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        value = self[key]
+        del self[key]
+        return value
+
+    def popitem(self, last=True):
+        if len(self) == 0:
+            raise KeyError("dsmd is empty")
+        key = self._keys[-1 if last else 0]
+        return key, self.pop(key)
+
+    def clear(self):
+        OrderedDict.clear(self)
+        self._keys, self._natkeys = [], []
+
+    def _take(self, indices):
+        return self._from_sorted(
+            [self._keys[i] for i in indices],
+            None if self._natkeys is None else [self._natkeys[i] for i in indices],
+            [self[self._keys[i]] for i in indices],
+        )
+
+    def subset(self, keys):
+        """Items of given keys, in natsorted order.
+
+        Args:
+            keys (iterable): keys of the dsmd.
+
+        Returns:
+            (Dsmd): the subset.
+        """
+        positions = {key: i for i, key in enumerate(self._keys)}
+        return self._take(sorted(set(positions[key] for key in keys)))
+
+    def intersection(self, other):
+        """Items of keys also in another dsmd (or a set of keys).
+
+        Args:
+            other (dict or set): another dsmd or keys.
+
+        Returns:
+            (Dsmd): items of the intersection, values are from this dsmd.
+        """
+        return self._take([i for i, key in enumerate(self._keys) if key in other])
+
+    def difference(self, other):
+        """Items of keys not in another dsmd (or a set of keys).
+
+        Args:
+            other (dict or set): another dsmd or keys.
+
+        Returns:
+            (Dsmd): items of the difference.
+        """
+        return self._take([i for i, key in enumerate(self._keys) if key not in other])
+
+    def with_values(self, values):
+        """A dsmd of the same keys (and order) with other values.
+
+        Args:
+            values (dict or iterable): values of keys, a mapping containing
+                all the keys or values in the order of keys.
+
+        Returns:
+            (Dsmd): the new dsmd.
+        """
+        if isinstance(values, Mapping):
+            values = [values[key] for key in self._keys]
+        return self._from_sorted(self._keys, self._natkeys, values)
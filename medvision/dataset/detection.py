@@ -1,18 +1,37 @@
+import csv
+import itertools
+from collections import OrderedDict
 from pathlib import Path
 from typing import Dict, List, Union
 
 import numpy as np
 import pandas as pd
+from natsort import index_natsorted
 
 import medvision as mv
 
+from .container import Dsmd
+from .ragged import RaggedDetDsmd
 
-def load_det_dsmd(dsmd_path: Union[str, Path], class2label: Union[str, Dict[str, int]]):
+
+def load_det_dsmd(
+    dsmd_path: Union[str, Path],
+    class2label: Union[str, Dict[str, int]],
+    dtype=np.float32,
+    ragged: bool = False,
+):
     """load detection dataset metadata.
 
+    Rows are grouped by filename and class in one sort, and boxes of each
+    image / class are views of a single array, so loading is linear in the
+    number of rows.
+
     Args:
         dsmd_path (str or Path): dataset metadata file path.
         class2label (str or dict): class-to-label file.
+        dtype (dtype): data type of boxes.
+        ragged (bool): whether to return a RaggedDetDsmd (boxes are float32)
+            instead of a dict.
 
     Return:
         (OrderedDict): Loaded dsmd is a OrderedDict looks like
@@ -27,31 +46,211 @@ def load_det_dsmd(dsmd_path: Union[str, Path], class2label: Union[str, Dict[str,
             ]
             ...
         }
+        or a RaggedDetDsmd if ragged is True.
     """
     if isinstance(class2label, str):
         class2label = mv.load_c2l(class2label)
     assert min(class2label.values()) == 0, "label should start from 0, but got %d" % min(
         class2label.values()
     )
-    num_classes = len(class2label)
 
     df = pd.read_csv(dsmd_path, header=None)
     assert df.shape[1] == 6 or df.shape[1] == 7, "Incorrect dsmd file format %s" % dsmd_path
 
-    data = {}
-    for r in df.itertuples():
-        filename = r[1]
+    return _det_dsmd_from_rows(df, class2label, dtype, ragged)
+
+
+def _det_dsmd_from_rows(df, class2label, dtype=np.float32, ragged=False, natsort=True):
+    """Make a det dsmd of rows of a det dsmd file, refer to 'load_det_dsmd'.
+
+    If natsort is False, images are in order of appearance instead of
+    natsorted order.
+    """
+    num_classes = len(class2label)
+
+    # rows of empty images have no box
+    has_box = df[1].notnull().to_numpy()
+    labels = df[df.shape[1] - 1][has_box].map(class2label)
+    assert not labels.isnull().any(), "unknown classes in dsmd"
+    row_labels = np.full(len(df), -1, dtype=np.int64)
+    row_labels[has_box] = labels.to_numpy(dtype=np.int64)
+
+    filenames, boxes, labels, offsets = _group_det_rows(
+        df[0], df.iloc[:, 1:-1].to_numpy(dtype=dtype), row_labels, natsort
+    )
+    if ragged:
+        return RaggedDetDsmd(filenames, boxes, labels, offsets, num_classes)
+
+    # offsets of boxes of each image / class
+    img_ids = np.repeat(np.arange(len(filenames)), np.diff(offsets))
+    counts = np.bincount(img_ids * num_classes + labels, minlength=len(filenames) * num_classes)
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    instances = []
+    for i in range(len(filenames)):
+        first, last = i * num_classes, (i + 1) * num_classes + 1
+        bounds = offsets[first:last]
+        instances.append([boxes[start:end] for start, end in zip(bounds[:-1], bounds[1:])])
+
+    if natsort:
+        return Dsmd._from_sorted(filenames, None, instances)
+    return OrderedDict(zip(filenames, instances))
+
+
+def _group_det_rows(filenames, boxes, labels, natsort=True):
+    """Group rows of a det dsmd file by image (in natsorted order) and label.
+
+    Args:
+        filenames (pd.Series): filename of each row.
+        boxes (ndarray): box of each row.
+        labels (ndarray): label of each row, -1 for rows of empty images.
+        natsort (bool): whether to natsort images. If False, images are in
+            order of appearance.
+
+    Returns:
+        (list): filenames of images.
+        (ndarray): boxes sorted by (image, label), lexsort is stable so that
+            boxes of an image / label keep their order in file.
+        (ndarray): labels of the sorted boxes.
+        (ndarray): boxes[offsets[i]:offsets[i + 1]] are boxes of the i-th
+            image.
+    """
+    img_ids, filenames = pd.factorize(filenames)
+    natsorted_ids = index_natsorted(filenames) if natsort else range(len(filenames))
+    filenames = [filenames[i] for i in natsorted_ids]
+    ranks = np.empty(len(filenames), dtype=np.int64)
+    ranks[natsorted_ids] = np.arange(len(filenames))
+
+    has_box = labels >= 0
+    img_ids, labels = ranks[img_ids[has_box]], labels[has_box]
+    order = np.lexsort((labels, img_ids))
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(img_ids, minlength=len(filenames)))])
+
+    return filenames, boxes[has_box][order], labels[order], offsets
+
+
+def iter_det_dsmd(
+    dsmd_path: Union[str, Path],
+    class2label: Union[str, Dict[str, int]],
+    chunk_rows: int = 100000,
+    chunked: bool = False,
+):
+    """Iterate over a detection dsmd file chunk by chunk, with bounded memory.
+
+    The file is read chunk_rows rows at a time. Rows of the last image of a
+    chunk are carried over to the next chunk, so that an image is never
+    split between chunks. Rows of an image must be consecutive (as files
+    saved by 'save_det_dsmd' are), and images are in order of appearance.
+
+    Args:
+        dsmd_path (str or Path): dataset metadata file path.
+        class2label (str or dict): class-to-label file.
+        chunk_rows (int): number of rows read at a time.
+        chunked (bool): whether to yield a dsmd of each chunk instead of
+            each image.
+
+    Yields:
+        (tuple): key and boxes of each label of an image, refer to
+            'load_det_dsmd'. Or an OrderedDict of images of a chunk if
+            chunked is True.
+    """
+    if isinstance(class2label, str):
+        class2label = mv.load_c2l(class2label)
+
+    # rows of empty images may have fewer fields, so that the number of
+    # columns is fixed by the first rows instead of by each chunk
+    with open(str(dsmd_path), "r") as f:
+        num_columns = max((len(row) for row in itertools.islice(csv.reader(f), 1000)), default=6)
+    assert num_columns in (6, 7), "Incorrect dsmd file format %s" % dsmd_path
+
+    def _dsmds():
+        carry = None
+        reader = pd.read_csv(dsmd_path, header=None, names=range(num_columns), chunksize=chunk_rows)
+        for df in reader:
+            if carry is not None:
+                df = pd.concat([carry, df], ignore_index=True)
+
+            # hold rows of the last image, which may continue in the next chunk
+            filenames = df[0].to_numpy()
+            changes = np.flatnonzero(filenames[1:] != filenames[:-1])
+            start = changes[-1] + 1 if len(changes) > 0 else 0
+            df, carry = df.iloc[:start], df.iloc[start:]
+            if len(df) > 0:
+                yield _det_dsmd_from_rows(df, class2label, natsort=False)
+
+        if carry is not None:
+            yield _det_dsmd_from_rows(carry, class2label, natsort=False)
+
+    for dsmd in _dsmds():
+        if chunked:
+            yield dsmd
+        else:
+            yield from dsmd.items()
+
+
+def _box_dtype(data, width=None):
+    """Data type of box columns of a det dsmd file, the same as pandas infers
+    from records of boxes, or None if boxes can not be written as blocks
+    (e.g. boxes of different widths, or no box at all and width is None).
+    """
+    widths, kinds, has_empty = set() if width is None else {width}, set(), False
+    for instance in data.values():
+        num_boxes = 0
+        for boxes in instance:
+            if not isinstance(boxes, np.ndarray) or boxes.ndim != 2:
+                return None
+            if len(boxes) > 0:
+                widths.add(boxes.shape[1])
+                kinds.add(boxes.dtype.kind)
+                num_boxes += len(boxes)
+        has_empty |= num_boxes == 0
+
+    if len(widths) != 1 or not kinds <= set("iuf"):
+        return None
+    # rows of empty images are NaN
+    return np.int64 if kinds <= set("iu") and not has_empty else np.float64
+
+
+def _det_blocks(data, keys, label2class, dtype, chunk_size, width=None):
+    """Yield DataFrames of rows of a det dsmd file, each of which contains
+    boxes of consecutive images (about chunk_size rows).
+    """
+    if width is None:
+        width = next(boxes.shape[1] for key in keys for boxes in data[key] if len(boxes) > 0)
+    empty_row = np.full((1, width), np.nan)
+
+    filenames, num_rows, labels, blocks = [], [], [], []
+    chunk_rows = 0
+    for i, key in enumerate(keys):
+        instance = data[key]
+        counts = [len(boxes) for boxes in instance]
+        filenames.append(key)
+        if sum(counts) == 0:
+            num_rows.append(1)
+            labels.append(np.array([-1]))
+            blocks.append(empty_row)
+        else:
+            num_rows.append(sum(counts))
+            labels.append(np.repeat(np.arange(len(instance)), counts))
+            blocks.extend(boxes for boxes in instance if len(boxes) > 0)
+
+        chunk_rows += num_rows[-1]
+        if chunk_rows < chunk_size and i + 1 < len(keys):
+            continue
 
-        if filename not in data:
-            empty_box = np.zeros((0, df.shape[1] - 2), dtype=np.float32)
-            data[filename] = [empty_box] * num_classes
+        # class names of labels, NaN for rows of empty images
+        unique_labels, inverse = np.unique(np.concatenate(labels), return_inverse=True)
+        names = [np.nan if label < 0 else label2class[label] for label in unique_labels]
 
-        if not pd.isnull(r[2]):
-            box = r[2:-1]
-            category_id = class2label[r[-1]]
-            data[filename][category_id] = np.append(data[filename][category_id], [box], axis=0)
+        df = pd.DataFrame(
+            np.concatenate(blocks).astype(dtype, copy=False), columns=range(1, width + 1)
+        )
+        df.insert(0, 0, np.repeat(np.array(filenames, dtype=object), num_rows))
+        df[width + 1] = np.array(names, dtype=object)[inverse]
+        yield df
 
-    return mv.make_dsmd(data)
+        filenames, num_rows, labels, blocks = [], [], [], []
+        chunk_rows = 0
 
 
 def save_det_dsmd(
@@ -59,15 +258,22 @@ def save_det_dsmd(
     data: Dict[str, List[np.ndarray]],
     class2label: Union[str, Dict[str, int]],
     auto_mkdirs: bool = True,
+    chunk_size: int = 1 << 20,
 ):
     """Save dataset metadata to specified file.
 
+    Boxes of an image are written as a block instead of box by box, and
+    rows are streamed to the file chunk by chunk, so that memory usage is
+    bounded for dsmds of many boxes.
+
     Args:
         dsmd_path (str or Path): file path to save dataset metadata.
-        data (dict): dsmd to be serialized, refer to 'load_dsmd'.
+        data (dict or RaggedDetDsmd): dsmd to be serialized, refer to
+            'load_dsmd'.
         class2label (str or dict): class-to-label file or class2label dict.
         auto_mkdirs (bool): If the parent folder of `file_path` does not
             exist, whether to create it automatically.
+        chunk_size (int): number of rows written at a time.
     """
     if auto_mkdirs:
         mv.mkdirs(mv.parentdir(dsmd_path))
@@ -77,12 +283,32 @@ def save_det_dsmd(
         class2label = mv.load_c2l(class2label)
     label2class = {value: key for key, value in class2label.items()}
 
+    keys = list(data.keys())
+    keys = [keys[i] for i in index_natsorted(keys)]
+
+    with open(str(dsmd_path), "w", encoding="utf-8", newline="") as f:
+        _write_det_rows(f, data, keys, label2class, chunk_size)
+
+
+def _write_det_rows(f, data, keys, label2class, chunk_size=1 << 20, width=None):
+    """Write rows of images (keys) of a det dsmd to an open csv file.
+
+    Args:
+        width (int or None): number of box columns, so that rows of empty
+            images are padded to it when no image has boxes (e.g. a chunk
+            of a dsmd).
+    """
+    dtype = _box_dtype(data, width)
+    if dtype is not None:
+        for df in _det_blocks(data, keys, label2class, dtype, chunk_size, width):
+            df.to_csv(f, header=False, index=False)
+        return
+
     # write dataset metadata loop
-    dsmd = mv.make_dsmd(data)
     data_list = []
-    for filename, instance in dsmd.items():
+    for filename in keys:
         record = None
-        for category_id, boxes in enumerate(instance):
+        for category_id, boxes in enumerate(data[filename]):
             for box in boxes:
                 record = [filename, *box.tolist(), label2class[category_id]]
                 data_list.append(record)
@@ -90,12 +316,38 @@ def save_det_dsmd(
             data_list.append([filename])
 
     df = pd.DataFrame(data_list)
-    df.to_csv(str(dsmd_path), header=False, index=False)
+    df.to_csv(f, header=False, index=False)
+
+
+def _merge_ragged_dsmds(ref_dsmd, *dsmds):
+    """Merge RaggedDetDsmds by concatenating and sorting their flat arrays."""
+    sources = list(dsmds) + [ref_dsmd]
+    keys = list(ref_dsmd.keys())
+    positions = {key: i for i, key in enumerate(keys)}
+
+    img_ids, src_ids = [], []
+    for i, dsmd in enumerate(sources):
+        assert dsmd.num_classes == ref_dsmd.num_classes, "dsmds not match"
+        ids = np.array([positions[key] for key in dsmd.keys()], dtype=np.int64)
+        img_ids.append(ids[dsmd.img_ids])
+        src_ids.append(np.full(len(dsmd.boxes), i))
+    img_ids, src_ids = np.concatenate(img_ids), np.concatenate(src_ids)
+    labels = np.concatenate([dsmd.labels for dsmd in sources])
+
+    # boxes of an image / class are in the same order as np.vstack of sources
+    order = np.lexsort((src_ids, labels, img_ids))
+    boxes = np.vstack([dsmd.boxes for dsmd in sources])[order]
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(img_ids, minlength=len(keys)))])
+
+    return RaggedDetDsmd(keys, boxes, labels[order], offsets, ref_dsmd.num_classes)
 
 
 def merge_det_dsmds(ref_dsmd, *dsmds):
     """Merge dsmds into one dsmd.
 
+    If all the dsmds are RaggedDetDsmds, the merged dsmd is a RaggedDetDsmd
+    too, otherwise it is a dict.
+
     N.B. Overlapping boxes (even boxes with the same coordinates) are all kept.
     """
     filenames = set(ref_dsmd.keys())
@@ -103,6 +355,9 @@ def merge_det_dsmds(ref_dsmd, *dsmds):
     for dsmd in dsmds:
         assert set(dsmd.keys()) == filenames, "dsmds not match"
 
+    if all(isinstance(dsmd, RaggedDetDsmd) for dsmd in (ref_dsmd,) + dsmds):
+        return _merge_ragged_dsmds(ref_dsmd, *dsmds)
+
     ref_filename = filenames.pop()
     num_categories = len(ref_dsmd[ref_filename])
     assert num_categories != 0
@@ -1,5 +1,8 @@
-from .classification import load_cls_dsmd, save_cls_dsmd
-from .detection import load_det_dsmd, save_det_dsmd
+from collections import OrderedDict
+
+from .binary import BINARY_FORMATS, binary_format, load_binary_dsmd, save_binary_dsmd
+from .classification import iter_cls_dsmd, load_cls_dsmd, save_cls_dsmd
+from .detection import iter_det_dsmd, load_det_dsmd, save_det_dsmd
 
 
 def load_dsmd(dsmd_path, class2label=None, mode="cls"):
@@ -62,6 +65,9 @@ def load_dsmd(dsmd_path, class2label=None, mode="cls"):
     |...                                                    |
     +-------------------------------------------------------+
 
+    Binary dsmd files (saved by 'save_dsmd' in 'npz' or 'parquet' format)
+    are detected automatically, refer to 'load_binary_dsmd'.
+
     Args:
         dsmd_path (str): dataset metadata file path.
         class2label (str or dict): class-to-label file or dict.
@@ -70,7 +76,9 @@ def load_dsmd(dsmd_path, class2label=None, mode="cls"):
     Return:
         (OrderedDict): dataset metadata.
     """
-    if mode in ["cls", "seg"]:
+    if mode in ["cls", "seg", "det"] and binary_format(dsmd_path) is not None:
+        return load_binary_dsmd(dsmd_path, class2label)
+    elif mode in ["cls", "seg"]:
         return load_cls_dsmd(dsmd_path)
     elif mode == "det":
         return load_det_dsmd(dsmd_path, class2label)
@@ -78,7 +86,59 @@ def load_dsmd(dsmd_path, class2label=None, mode="cls"):
         raise ValueError("only support cls, seg, det modes")
 
 
-def save_dsmd(dsmd_path, data, class2label=None, auto_mkdirs=True, mode="cls"):
+def _iter_binary_dsmd(dsmd_path, class2label, mode, chunk_rows, chunked):
+    """Iterate over a memory-mapped binary dsmd file, refer to 'iter_dsmd'."""
+    dsmd = load_binary_dsmd(dsmd_path, class2label, ragged=True)
+    if not chunked:
+        yield from dsmd.items()
+        return
+
+    chunk, num_rows = OrderedDict(), 0
+    for key, value in dsmd.items():
+        chunk[key] = value
+        num_rows += max(sum(len(boxes) for boxes in value), 1) if mode == "det" else 1
+        if num_rows >= chunk_rows:
+            yield chunk
+            chunk, num_rows = OrderedDict(), 0
+    if len(chunk) > 0:
+        yield chunk
+
+
+def iter_dsmd(dsmd_path, class2label=None, mode="cls", chunk_rows=100000, chunked=False):
+    """Iterate over a dataset metadata file with bounded memory, instead of
+    loading the whole file as 'load_dsmd' does.
+
+    Example:
+    >>> evaluator = mv.DetEvaluator(num_classes=1)
+    >>> gts = mv.load_dsmd(gt_path, c2l, mode="det")
+    >>> for dts in mv.iter_dsmd(dt_path, c2l, mode="det", chunked=True):
+    >>>     evaluator.update(dts, {key: gts[key] for key in dts})
+
+    Args:
+        dsmd_path (str): dataset metadata file path, refer to 'load_dsmd'.
+        class2label (str or dict): class-to-label file or dict.
+        mode (str): dataset mission, can be one of 'cls', 'seg', 'det'.
+        chunk_rows (int): number of rows (lines of a csv file) read at a
+            time. Rows of an image of a det dsmd are never split between
+            chunks (they must be consecutive in file).
+        chunked (bool): whether to yield a dsmd (OrderedDict) of each chunk
+            instead of (key, annotation) of each item.
+
+    Yields:
+        (tuple or OrderedDict): (key, annotation) of each item in order of
+            appearance, or a dsmd of each chunk if chunked is True.
+    """
+    if mode in ["cls", "seg", "det"] and binary_format(dsmd_path) is not None:
+        return _iter_binary_dsmd(dsmd_path, class2label, mode, chunk_rows, chunked)
+    elif mode in ["cls", "seg"]:
+        return iter_cls_dsmd(dsmd_path, chunk_rows, chunked)
+    elif mode == "det":
+        return iter_det_dsmd(dsmd_path, class2label, chunk_rows, chunked)
+    else:
+        raise ValueError("only support cls, seg, det modes")
+
+
+def save_dsmd(dsmd_path, data, class2label=None, auto_mkdirs=True, mode="cls", format="csv"):
     """Save dataset metadata to specified file.
 
     Args:
@@ -88,8 +148,14 @@ def save_dsmd(dsmd_path, data, class2label=None, auto_mkdirs=True, mode="cls"):
         auto_mkdirs (bool): If the parent folder of `file_path` does
             not exist, whether to create it automatically.
         mode (str): dataset mission, can be one of 'cls', 'seg', 'det'.
+        format (str): 'csv' (text), or a binary format 'npz' or 'parquet',
+            refer to 'save_binary_dsmd'.
     """
-    if mode in ["cls", "seg"]:
+    if mode in ["cls", "seg", "det"] and format in BINARY_FORMATS:
+        return save_binary_dsmd(dsmd_path, data, class2label, auto_mkdirs, mode, format)
+    elif format != "csv":
+        raise ValueError("only support csv, npz, parquet formats")
+    elif mode in ["cls", "seg"]:
         return save_cls_dsmd(dsmd_path, data, auto_mkdirs)
     elif mode == "det":
         return save_det_dsmd(dsmd_path, data, class2label, auto_mkdirs)
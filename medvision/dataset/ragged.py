@@ -0,0 +1,146 @@
+from collections import OrderedDict
+from collections.abc import Mapping
+
+import numpy as np
+from natsort import index_natsorted
+
+from .container import Dsmd
+
+
+class RaggedDetDsmd(Mapping):
+    """Detection dsmd stored in flat arrays.
+
+    A det dsmd in dict format (refer to 'load_det_dsmd') holds an ndarray per
+    image and class, which is costly in memory and slow to pickle for
+    millions of images. RaggedDetDsmd stores boxes of all the images in one
+    array instead, boxes of an image are sorted by label, i.e.
+    boxes[offsets[i]:offsets[i + 1]] are boxes of the i-th image and
+    labels[offsets[i]:offsets[i + 1]] are their labels.
+
+    It is a read-only Mapping, and dsmd[key] returns a list of views of the
+    boxes of each label, the same as the dict format, so it can be used
+    wherever a det dsmd is read.
+
+    Example:
+    >>> dsmd = mv.RaggedDetDsmd.from_dsmd(mv.load_det_dsmd(dsmd_path, c2l))
+    >>> dsmd["data/1.png"][0]  # boxes of label 0 in 'data/1.png'
+    >>> dsmd = dsmd.to_dsmd()  # back to the dict format
+
+    Args:
+        keys (list): keys of images, e.g. natsorted image paths.
+        boxes (ndarray): boxes of shape (n, 4) or (n, 5) (float32).
+        labels (ndarray): labels of boxes of shape (n,) (int16).
+        offsets (ndarray): offsets of images of shape (len(keys) + 1,)
+            (int64).
+        num_classes (int): number of classes.
+    """
+
+    def __init__(self, keys, boxes, labels, offsets, num_classes):
+        self._keys = list(keys)
+        self.boxes = np.asarray(boxes, dtype=np.float32)
+        self.labels = np.asarray(labels, dtype=np.int16)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.num_classes = num_classes
+
+        assert self.boxes.ndim == 2 and self.boxes.shape[1] in (4, 5), "boxes must be (n, 4|5)"
+        assert len(self.labels) == len(self.boxes), "labels and boxes must have the same length"
+        assert len(self.offsets) == len(self._keys) + 1, "offsets must be of len(keys) + 1"
+        assert self.offsets[0] == 0 and self.offsets[-1] == len(self.boxes), "invalid offsets"
+        assert len(self.labels) == 0 or (
+            self.labels.min() >= 0 and self.labels.max() < num_classes
+        ), "labels must be in [0, num_classes)"
+
+        # boxes of an image must be sorted by label (stably)
+        img_ids = self.img_ids
+        if np.any(np.diff(img_ids * num_classes + self.labels) < 0):
+            order = np.lexsort((self.labels, img_ids))
+            self.boxes, self.labels = self.boxes[order], self.labels[order]
+
+        self._build_index()
+
+    def _build_index(self):
+        counts = np.bincount(
+            self.img_ids * self.num_classes + self.labels,
+            minlength=len(self._keys) * self.num_classes,
+        )
+        self._label_offsets = np.concatenate([[0], np.cumsum(counts)])
+        self._index = {key: i for i, key in enumerate(self._keys)}
+
+    def __getstate__(self):
+        # the index is rebuilt after unpickling instead of being pickled
+        state = dict(self.__dict__)
+        del state["_label_offsets"], state["_index"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._build_index()
+
+    def __getitem__(self, key):
+        first = self._index[key] * self.num_classes
+        last = first + self.num_classes + 1
+        bounds = self._label_offsets[first:last].tolist()
+        return [self.boxes[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __repr__(self):
+        return "{}(num_imgs={}, num_boxes={}, num_classes={})".format(
+            self.__class__.__name__, len(self._keys), len(self.boxes), self.num_classes
+        )
+
+    @property
+    def img_ids(self):
+        """Index (in keys) of the image of each box."""
+        return np.repeat(np.arange(len(self._keys)), np.diff(self.offsets))
+
+    @classmethod
+    def from_dsmd(cls, dsmd, num_classes=None):
+        """Convert a det dsmd in dict format, images are ordered by natsorted
+        keys.
+
+        Args:
+            dsmd (dict): det dsmd, refer to 'load_det_dsmd'.
+            num_classes (int or None): number of classes. If None, it is
+                the number of box arrays of an image.
+
+        Returns:
+            (RaggedDetDsmd): the converted dsmd.
+        """
+        keys = list(dsmd.keys())
+        if not isinstance(dsmd, Dsmd):  # keys of a Dsmd are already natsorted
+            keys = [keys[i] for i in index_natsorted(keys)]
+        if isinstance(dsmd, RaggedDetDsmd) and keys == list(dsmd.keys()):
+            return dsmd
+        instances = [dsmd[key] for key in keys]
+        if num_classes is None:
+            num_classes = max((len(instance) for instance in instances), default=0)
+
+        counts = [[len(boxes) for boxes in instance] for instance in instances]
+        labels = np.concatenate(
+            [np.zeros(0, dtype=np.int16)]
+            + [np.repeat(np.arange(len(c), dtype=np.int16), c) for c in counts]
+        )
+        offsets = np.concatenate([[0], np.cumsum([sum(c) for c in counts], dtype=np.int64)])
+
+        arrays = [boxes for instance in instances for boxes in instance]
+        width = next((boxes.shape[1] for boxes in arrays if np.ndim(boxes) == 2), 4)
+        boxes = np.zeros((0, width), dtype=np.float32)
+        boxes = np.concatenate([boxes] + [b for b in arrays if len(b) > 0]).astype(np.float32)
+
+        return cls(keys, boxes, labels, offsets, num_classes)
+
+    def to_dsmd(self):
+        """Convert to a det dsmd in dict format (boxes are views).
+
+        Returns:
+            (OrderedDict): det dsmd, refer to 'load_det_dsmd'.
+        """
+        return OrderedDict((key, self[key]) for key in self._keys)
@@ -1,4 +1,5 @@
-from .classification import load_cls_dsmd, save_cls_dsmd
+from .classification import iter_cls_dsmd, load_cls_dsmd, save_cls_dsmd
 
+iter_seg_dsmd = iter_cls_dsmd
 load_seg_dsmd = load_cls_dsmd
 save_seg_dsmd = save_cls_dsmd
@@ -0,0 +1,278 @@
+import csv
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+from natsort import natsorted
+
+import medvision as mv
+
+from .binary import binary_format
+from .classification import _format_cls_line, _parse_cls_line
+from .detection import _write_det_rows
+
+
+def _identity(key):
+    return key
+
+
+def _strata(value, mode):
+    """Labels an item is stratified on: the label (cls), positive labels
+    (multi-label cls) or labels of boxes (det). Seg items have none.
+    """
+    if mode == "det":
+        return [label for label, boxes in enumerate(value) if len(boxes) > 0]
+    if isinstance(value, str):
+        return []
+    if mv.isarrayinstance(value):
+        return [i for i, entry in enumerate(value) if entry]
+    return [value]
+
+
+def _text_items(dsmd_path, class2label, mode):
+    """Yield (key, labels, rows) of each item of a text dsmd file, rows are
+    raw lines of the item in file (rows of an image of a det dsmd must be
+    consecutive).
+    """
+    with open(str(dsmd_path), "r", encoding="utf-8", newline="") as f:
+        if mode != "det":
+            for line in f:
+                key, value = _parse_cls_line(line)
+                yield key, _strata(value, mode), [line if line.endswith("\n") else line + "\n"]
+            return
+
+        key, labels, rows = None, set(), []
+        for line in f:
+            if not line.strip():
+                continue
+            fields = next(csv.reader([line])) if '"' in line else line.rstrip("\r\n").split(",")
+            if fields[0] != key and len(rows) > 0:
+                yield key, sorted(labels), rows
+                labels, rows = set(), []
+            key = fields[0]
+            if len(fields) > 1 and fields[-1] != "":
+                assert fields[-1] in class2label, "unknown class %s in dsmd" % fields[-1]
+                labels.add(class2label[fields[-1]])
+            rows.append(line if line.endswith("\n") else line + "\n")
+        if len(rows) > 0:
+            yield key, sorted(labels), rows
+
+
+def _chunks(dsmd_path, class2label, mode, chunk_rows):
+    """Yield lists of (key, labels, rows or annotation) of items of a dsmd
+    file chunk by chunk. Rows (raw lines) of text files are copied as they
+    are, annotations of binary files are written by dsmd writers.
+    """
+    if binary_format(dsmd_path) is not None:
+        for chunk in mv.iter_dsmd(dsmd_path, class2label, mode, chunk_rows, chunked=True):
+            yield [(key, _strata(value, mode), value) for key, value in chunk.items()]
+        return
+
+    chunk = []
+    for item in _text_items(dsmd_path, class2label, mode):
+        chunk.append(item)
+        if len(chunk) == chunk_rows:
+            yield chunk
+            chunk = []
+    if len(chunk) > 0:
+        yield chunk
+
+
+def _count_groups(dsmd_path, class2label, mode, group_fn, stratify, chunk_rows):
+    """Count items and labels of each group in a streaming pass.
+
+    Returns:
+        (dict): {group: index of the group}.
+        (ndarray): counts of shape (num_groups, 1 + num_labels), the number
+            of items of each group, then the number of its items of each
+            label (if stratify is True).
+    """
+    groups, sizes = {}, []
+    label_counts, columns = defaultdict(int), {}
+    for chunk in _chunks(dsmd_path, class2label, mode, chunk_rows):
+        for key, labels, _ in chunk:
+            group = groups.setdefault(group_fn(key), len(groups))
+            if group == len(sizes):
+                sizes.append(0)
+            sizes[group] += 1
+
+            if stratify:
+                for label in labels:
+                    label_counts[group, columns.setdefault(label, len(columns) + 1)] += 1
+
+    counts = np.zeros((len(sizes), len(columns) + 1))
+    counts[:, 0] = sizes
+    for (group, column), count in label_counts.items():
+        counts[group, column] = count
+
+    return groups, counts
+
+
+def _assign_groups(counts, ratios, seed):
+    """Assign groups to splits greedily, so that the number of items and of
+    each label in splits are proportional to ratios.
+
+    Groups are visited in a seeded random order, those with the rarest
+    labels first (then the largest first), and each one goes to the split
+    which is the least filled after adding it, i.e. the sum over labels of
+    its counts relative to its targets.
+
+    Args:
+        counts (ndarray): counts of shape (num_groups, C), refer to
+            '_count_groups'.
+        ratios (ndarray): ratios of splits of shape (num_splits,).
+        seed (int): random seed.
+
+    Returns:
+        (ndarray): split index of each group of shape (num_groups,).
+    """
+    rng = np.random.default_rng(seed)
+    totals = counts.sum(axis=0)
+    targets = ratios[:, None] * totals[None, :]
+
+    perm = rng.permutation(len(counts))
+    rarity = np.where(counts[perm, 1:] > 0, totals[1:], np.inf).min(axis=1, initial=np.inf)
+    order = perm[np.lexsort((-counts[perm, 0], rarity))]
+
+    # plain python on the few nonzero counts of a group is much faster than
+    # numpy on tiny arrays, as groups are assigned one by one
+    nonzeros = [np.flatnonzero(row).tolist() for row in counts]
+    counts, targets = counts.tolist(), targets.tolist()
+    active = np.flatnonzero(ratios > 0).tolist()
+
+    splits = np.zeros(len(counts), dtype=np.int64)
+    assigned = [[0.0] * len(totals) for _ in ratios]
+    for group in order.tolist():
+        columns, row = nonzeros[group], counts[group]
+        best_split, best_fill = None, np.inf
+        for split in active:
+            fill = sum((assigned[split][j] + row[j]) / targets[split][j] for j in columns)
+            if fill < best_fill:
+                best_split, best_fill = split, fill
+        splits[group] = best_split
+        for j in columns:
+            assigned[best_split][j] += row[j]
+
+    return splits
+
+
+def _write_items(f, items, mode, label2class, raw):
+    if raw:
+        for _, rows in items:
+            f.writelines(rows)
+    elif mode == "det":
+        data = OrderedDict(items)
+        width = next((b.shape[1] for value in data.values() for b in value if len(b) > 0), 4)
+        _write_det_rows(f, data, list(data), label2class, width=width)
+    else:
+        f.writelines(_format_cls_line(key, value) for key, value in items)
+
+
+def split_dsmd(
+    dsmd_path,
+    datasplit=None,
+    out_dir=None,
+    class2label=None,
+    mode="cls",
+    group_fn=None,
+    stratify=True,
+    num_folds=None,
+    seed=0,
+    chunk_rows=100000,
+    suffix=".csv",
+):
+    """Split a dataset metadata file into several files, e.g. 'train.csv'
+    and 'val.csv', or k folds.
+
+    The file is read twice in chunks (refer to 'iter_dsmd'), once to count
+    items and labels of each group, once to write every output file at
+    the same time, so that memory usage is bounded by the number of
+    groups instead of the size of the file. Items of a group (e.g. images
+    of a patient) always go to the same split, and splits are stratified
+    on labels (cls), positive labels (multi-label cls) or classes present
+    in images (det).
+
+    Example:
+    >>> # images of a patient are in 'data/<patient>/'
+    >>> mv.split_dsmd(dsmd_path, {"train": 0.8, "val": 0.2}, group_fn=mv.parentdir)
+    >>> # 'fold0/train.csv', 'fold0/val.csv', ..., 'fold4/val.csv'
+    >>> mv.split_dsmd(dsmd_path, num_folds=5, group_fn=mv.parentdir)
+
+    Args:
+        dsmd_path (str): dataset metadata file path, refer to 'load_dsmd'.
+        datasplit (dict[str, float]): how to split the dataset, e.g.
+            {'train': 0.9, 'val': 0.1, 'test': 0.0}. Items of the rest (if
+            ratios sum to less than 1) are not saved.
+        out_dir (str or None): directory of output files. If None, it is
+            the directory of dsmd_path.
+        class2label (str or dict): class-to-label file or dict (det only).
+        mode (str): dataset mission, can be one of 'cls', 'seg', 'det'.
+        group_fn (callable or None): function mapping a key to its group.
+            If None, each item is a group.
+        stratify (bool): whether to stratify splits on labels.
+        num_folds (int or None): if given, split into k folds instead, and
+            save 'fold{i}/train' and 'fold{i}/val' files of each fold.
+        seed (int): random seed of the split.
+        chunk_rows (int): number of rows read at a time.
+        suffix (str): suffix of output files.
+
+    Returns:
+        (OrderedDict): {output file path: number of items in it}. Items
+            are in order of the dsmd file, rows of a text dsmd file are
+            copied as they are, and empty files are not saved.
+    """
+    assert mode in ["cls", "seg", "det"], "only support cls, seg, det modes"
+    assert mode != "det" or class2label is not None, "class2label is required for det mode"
+    if out_dir is None:
+        out_dir = mv.parentdir(dsmd_path)
+    if group_fn is None:
+        group_fn = _identity
+    if isinstance(class2label, str):
+        class2label = mv.load_c2l(class2label)
+
+    # output files of items of each split
+    if num_folds is not None:
+        assert num_folds >= 2, "num_folds must be at least 2"
+        ratios = np.full(num_folds, 1.0 / num_folds)
+        fold_dirs = [mv.joinpath(out_dir, "fold%d" % i) for i in range(num_folds)]
+        outputs = [
+            [mv.joinpath(fold_dirs[i], "val" + suffix)]
+            + [mv.joinpath(fold_dirs[j], "train" + suffix) for j in range(num_folds) if j != i]
+            for i in range(num_folds)
+        ]
+    else:
+        if datasplit is None:
+            datasplit = {"train": 0.9, "val": 0.1}
+        ratios = list(datasplit.values())
+        assert 0.0 < sum(ratios) <= 1.0 and min(ratios) >= 0.0, "invalid datasplit"
+        outputs = [[mv.joinpath(out_dir, name + suffix)] for name in datasplit]
+        # the rest, which is not saved
+        rest = 1.0 - sum(ratios)
+        ratios, outputs = np.array(ratios + [rest if rest > 1e-6 else 0.0]), outputs + [[]]
+
+    groups, counts = _count_groups(dsmd_path, class2label, mode, group_fn, stratify, chunk_rows)
+    splits = _assign_groups(counts, ratios, seed)
+    raw = binary_format(dsmd_path) is None
+    label2class = None
+    if mode == "det":
+        label2class = {label: name for name, label in class2label.items()}
+
+    files, num_items = {}, OrderedDict()
+    try:
+        for chunk in _chunks(dsmd_path, class2label, mode, chunk_rows):
+            items_of_files = defaultdict(list)
+            for key, _, value in chunk:
+                for file_path in outputs[splits[groups[group_fn(key)]]]:
+                    items_of_files[file_path].append((key, value))
+
+            for file_path, items in items_of_files.items():
+                if file_path not in files:
+                    mv.mkdirs(mv.parentdir(file_path))
+                    files[file_path] = open(file_path, "w", encoding="utf-8", newline="")
+                    num_items[file_path] = 0
+                num_items[file_path] += len(items)
+                _write_items(files[file_path], items, mode, label2class, raw)
+    finally:
+        for f in files.values():
+            f.close()
+
+    return OrderedDict((file_path, num_items[file_path]) for file_path in natsorted(num_items))
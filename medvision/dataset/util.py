@@ -1,21 +1,23 @@
 import random
-from collections import OrderedDict
 
 import numpy as np
-from natsort import natsorted
 
 import medvision as mv
 
+from .container import Dsmd
+
 
 def make_dsmd(data):
     """Make a dataset metadata.
 
     Args:
         data (dict): dataset metadata.
+
+    Returns:
+        (Dsmd): dataset metadata in natsorted key order.
     """
     if isinstance(data, dict):
-        dsmd = OrderedDict(natsorted(data.items()))
-        return dsmd
+        return Dsmd(data)
     else:
         raise ValueError("dsmd only support dict type")
 
@@ -63,13 +65,15 @@ def split_dsmd_file(dsmd_filepath, datasplit=None, shuffle=True, suffix=".csv"):
         0.0 < datasplit['train'] + datasplit['val'] + datasplit['test'] <= 1.0
         If there's no image in a split. The corresponding dsmd file will
         not be saved.
+        Refer to 'split_dsmd' for grouped, stratified or k-fold splits of
+        cls, seg and det dsmds.
     """
     if datasplit is None:
         datasplit = {"train": 0.9, "val": 0.1}
 
     dsmd_dir = mv.parentdir(dsmd_filepath)
 
-    dsmd = mv.load_dsmd(dsmd_filepath)
+    dsmd = make_dsmd(mv.load_dsmd(dsmd_filepath))
     num_total = len(dsmd)
 
     keys = list(dsmd.keys())
@@ -91,12 +95,9 @@ def split_dsmd_file(dsmd_filepath, datasplit=None, shuffle=True, suffix=".csv"):
         start_index = np.clip(start_index, 0, num_total)
         end_index = np.clip(end_index, 0, num_total)
 
-        keys_split = keys[start_index:end_index]
-        keys_split = natsorted(keys_split)
-        dsmd_split = {keys: dsmd[keys] for keys in keys_split}
+        dsmd_split = dsmd.subset(keys[start_index:end_index])
         if len(dsmd_split) != 0:
             mv.save_dsmd(file_path, dsmd_split)
-            mv.save_dsmd(file_path, dsmd_split)
 
         start_index = end_index
 
@@ -118,17 +119,14 @@ def match_dsmds(dt_src, gt_src, return_unmatched=False):
         (dsmd, optional) unmatched items in the first dsmd when
             matching with the 2nd dsmd.
     """
-    dt_keys = set(dt_src.keys())
-    gt_keys = set(gt_src.keys())
-
-    intersection_keys = dt_keys & gt_keys
-    missing_keys = gt_keys - dt_keys
-    unmatched_keys = dt_keys - gt_keys
-
-    dt_dst = make_dsmd({key: dt_src[key] for key in intersection_keys})
-    gt_dst = make_dsmd({key: gt_src[key] for key in intersection_keys})
-    missing = make_dsmd({key: gt_src[key] for key in missing_keys})
-    unmatched = make_dsmd({key: dt_src[key] for key in unmatched_keys})
+    dt_src = dt_src if isinstance(dt_src, Dsmd) else Dsmd(dt_src)
+    gt_src = gt_src if isinstance(gt_src, Dsmd) else Dsmd(gt_src)
+
+    # subsets keep the natsorted order of the sources, nothing is re-sorted
+    dt_dst = dt_src.intersection(gt_src)
+    gt_dst = dt_dst.with_values(gt_src)
+    missing = gt_src.difference(dt_src)
+    unmatched = dt_src.difference(gt_src)
 
     if return_unmatched:
         return dt_dst, gt_dst, missing, unmatched
@@ -1,6 +1,10 @@
 # flake8: noqa
+from .._lazy import attach as _attach
 
-from .fileutil import isdicom, isdicomdir
-from .io import dcminfo_pydicom, dcmread_itk, dcmread_pydicom
-
-__all__ = [k for k in globals().keys() if not k.startswith("_")]
+__getattr__, __dir__, __all__ = _attach(
+    __name__,
+    {
+        "fileutil": ["isdicom", "isdicomdir"],
+        "io": ["dcminfo_pydicom", "dcmread_itk", "dcmread_pydicom"],
+    },
+)
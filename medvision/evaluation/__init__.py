@@ -1,5 +1,25 @@
 # flake8: noqa
+from .._lazy import attach as _attach
 
-from .eval_det import eval_det, eval_det4binarycls
-
-__all__ = [k for k in globals().keys() if not k.startswith("_")]
+__getattr__, __dir__, __all__ = _attach(
+    __name__,
+    {
+        "bootstrap": ["bootstrap_eval_det", "bootstrap_eval_det4binarycls"],
+        # the module itself was exported as 'mv.compute_overlap'
+        "compute_overlap": [],
+        "eval_cls": ["DEFAULT_SCORE_THRS", "ClsEvaluator", "eval_cls"],
+        "eval_det": [
+            "DEFAULT_AREA_RANGES",
+            "DetEvaluator",
+            "DetGtIndex",
+            "eval_det",
+            "eval_det4binarycls",
+            "eval_det_subsets",
+            "eval_dets",
+        ],
+        "eval_seg": ["confusion_matrix", "eval_seg", "surface_distances"],
+        "match_cache": ["MatchCache"],
+        "metrics": ["auc", "precision_recall_curve", "roc_auc_score", "roc_curve"],
+        "operating_point": ["find_operating_points"],
+    },
+)
@@ -0,0 +1,232 @@
+from collections import OrderedDict
+
+import numpy as np
+
+import medvision as mv
+
+from .eval_det import _image_scores, _standardize
+from .match_det import match_labels
+
+# max number of elements of a (replicates, detections) matrix in a batch
+_MAX_BATCH_ELEMENTS = 1 << 22
+
+
+def _resample(seed, replicate_ids, num_imgs):
+    """Count how many times each image is drawn in bootstrap replicates.
+
+    Each replicate has its own random stream derived from (seed, replicate
+    id), so results do not depend on how replicates are batched.
+
+    Returns:
+        (ndarray): image counts of shape (len(replicate_ids), num_imgs).
+    """
+    counts = np.zeros((len(replicate_ids), num_imgs), dtype=np.float64)
+    for i, replicate_id in enumerate(replicate_ids):
+        rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(replicate_id,)))
+        counts[i] = np.bincount(rng.integers(0, num_imgs, num_imgs), minlength=num_imgs)
+
+    return counts
+
+
+def _bootstrap_ap_froc(counts, tps, img_ids, num_gts, froc_range=(0.125, 2)):
+    """Compute AP and FROC AUC of a label for bootstrap replicates.
+
+    An image drawn k times is handled by weighting its detections by k
+    instead of duplicating them, so detections are sorted only once.
+
+    Args:
+        counts (ndarray): image counts of replicates, refer to '_resample'.
+        tps (ndarray): true positive flags (bool) of detections sorted by
+            descending score.
+        img_ids (ndarray): image index of each detection.
+        num_gts (ndarray): number of ground truth bboxes in each image.
+        froc_range (tuple[float]): refer to '_compute_froc'.
+
+    Returns:
+        (ndarray): AP and FROC AUC of shape (2, num_replicates), nan if
+            undefined in a replicate.
+    """
+    num_imgs = counts.shape[1]
+    tp_weights = counts[:, img_ids] * tps
+    fp_weights = counts[:, img_ids] - tp_weights
+    ctps = np.cumsum(tp_weights, axis=1)
+    cfps = np.cumsum(fp_weights, axis=1)
+    num_anns = (counts @ num_gts)[:, None]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # AP (VOC12), a detection of weight k equals k duplicated detections
+        recall = ctps / num_anns
+        precision = ctps / np.maximum(ctps + cfps, np.finfo(np.float32).eps)
+        zeros, ones = np.zeros_like(num_anns), np.ones_like(num_anns)
+        mrec = np.hstack([zeros, recall, ones])
+        mpre = np.hstack([zeros, precision, zeros])
+        mpre = np.maximum.accumulate(mpre[:, ::-1], axis=1)[:, ::-1]
+        aps = np.sum((mrec[:, 1:] - mrec[:, :-1]) * mpre[:, 1:], axis=1)
+        aps[num_anns[:, 0] == 0] = np.nan
+
+        # FROC, count the points of duplicated detections within froc_range.
+        # duplicated tps share the same fps, while recall increases one by one
+        begin, end = froc_range[0] * num_imgs, froc_range[1] * num_imgs
+        tp_in_range = np.where((cfps >= begin) & (cfps <= end), tp_weights, 0)
+        num_points = tp_in_range
+        sum_tps = tp_in_range * (ctps - tp_weights) + tp_in_range * (tp_in_range + 1) / 2
+        # duplicated fps share the same recall, while fps increases one by one
+        prev_fps = cfps - fp_weights
+        first = np.maximum(np.ceil(begin - prev_fps), 1)
+        last = np.minimum(np.floor(end - prev_fps), fp_weights)
+        fp_in_range = np.maximum(last - first + 1, 0)
+        num_points = np.sum(num_points + fp_in_range, axis=1)
+        sum_tps = np.sum(sum_tps + fp_in_range * ctps, axis=1)
+        frocs = sum_tps / num_anns[:, 0] / num_points
+
+    return np.stack([aps, frocs])
+
+
+def _bootstrap_roc_auc(counts, order, labels, group_starts):
+    """Compute ROC AUC for bootstrap replicates.
+
+    Args:
+        counts (ndarray): image counts of replicates, refer to '_resample'.
+        order (ndarray): image indices sorted by ascending score.
+        labels (ndarray): labels (bool) of images sorted by ascending score.
+        group_starts (ndarray): start positions of groups of equal scores in
+            sorted images.
+
+    Returns:
+        (ndarray): ROC AUC of shape (1, num_replicates).
+    """
+    counts = counts[:, order]
+    pos = np.add.reduceat(counts * labels, group_starts, axis=1)
+    neg = np.add.reduceat(counts * ~labels, group_starts, axis=1)
+
+    # a positive beats negatives of lower scores, and ties count half
+    neg_below = np.cumsum(neg, axis=1) - neg
+    with np.errstate(divide="ignore", invalid="ignore"):
+        aucs = np.sum(pos * (neg_below + 0.5 * neg), axis=1)
+        aucs /= pos.sum(axis=1) * neg.sum(axis=1)
+
+    return aucs[None]
+
+
+def _bootstrap_batch(args):
+    batch_id, func, data, replicate_ids, seed, num_imgs = args
+    counts = _resample(seed, replicate_ids, num_imgs)
+    return batch_id, np.concatenate([func(counts, *d) for d in data])
+
+
+def _bootstrap(func, data, num_imgs, num_samples, seed, workers, batch_size):
+    """Run 'func(counts, *d)' for each d in data on batches of replicates.
+
+    Returns:
+        (ndarray): metrics of shape (num_metrics, num_samples).
+    """
+    args = []
+    for batch_id, start in enumerate(range(0, num_samples, batch_size)):
+        replicate_ids = range(start, min(start + batch_size, num_samples))
+        args.append((batch_id, func, data, replicate_ids, seed, num_imgs))
+
+    if workers is None or workers <= 1:
+        results = [_bootstrap_batch(arg) for arg in args]
+    else:
+        results = mv.tqdm_imap_unordered(_bootstrap_batch, args, workers)
+
+    results = [samples for _, samples in sorted(results, key=lambda x: x[0])]
+    return np.concatenate(results, axis=1)
+
+
+def _interval(samples, confidence):
+    """Percentile interval of bootstrap samples, None if undefined."""
+    result = OrderedDict()
+    valid = samples[~np.isnan(samples)]
+    if len(valid) == 0:
+        result["lower"], result["upper"] = None, None
+    else:
+        alpha = (1.0 - confidence) / 2
+        result["lower"], result["upper"] = np.percentile(valid, [alpha * 100, 100 - alpha * 100])
+    result["samples"] = samples
+
+    return result
+
+
+def bootstrap_eval_det(
+    dts, gts, num_classes=1, iou_thr=0.5, num_samples=1000, confidence=0.95, seed=0, workers=None
+):
+    """Estimate confidence intervals of AP and FROC AUC by bootstrapping.
+
+    Images are resampled with replacement. Detections are matched only once,
+    and each replicate is evaluated by weighting detections with the times
+    their images are drawn.
+
+    Args:
+        dts (dict or list[list[ndarray]]): refer to 'eval_det'.
+        gts (dict or list[list[ndarray]]): refer to 'eval_det'.
+        num_classes (int): number of classes to detect.
+        iou_thr (float): refer to 'eval_det'.
+        num_samples (int): number of bootstrap replicates.
+        confidence (float): confidence level of intervals.
+        seed (int): random seed, results are reproducible given the seed.
+        workers (int or None): number of processes used to match images and
+            evaluate replicates. Results are independent of it.
+
+    Returns:
+        (OrderedDict): for each label, 'ap' and 'froc_auc' intervals, each
+        one is an OrderedDict containing 'lower', 'upper' and 'samples'.
+    """
+    dts, gts = _standardize(dts, gts)
+    num_imgs = len(gts)
+
+    data = []
+    matches = match_labels(dts, gts, num_classes, [iou_thr], workers)
+    for label, (tps, scores, _) in enumerate(matches):
+        img_ids = np.repeat(np.arange(num_imgs), [len(dt[label]) for dt in dts])
+        indices = np.argsort(-scores)
+        num_gts = np.array([len(gt[label]) for gt in gts], dtype=np.float64)
+        data.append((tps[0, indices], img_ids[indices], num_gts))
+
+    num_elements = max([num_imgs] + [len(tps) for tps, _, _ in data])
+    batch_size = max(1, min(num_samples, _MAX_BATCH_ELEMENTS // max(num_elements, 1)))
+    samples = _bootstrap(_bootstrap_ap_froc, data, num_imgs, num_samples, seed, workers, batch_size)
+
+    results = OrderedDict()
+    for label in range(num_classes):
+        results[label] = OrderedDict()
+        results[label]["ap"] = _interval(samples[2 * label], confidence)
+        results[label]["froc_auc"] = _interval(samples[2 * label + 1], confidence)
+
+    return results
+
+
+def bootstrap_eval_det4binarycls(dts, gts, num_samples=1000, confidence=0.95, seed=0, workers=None):
+    """Estimate confidence interval of ROC AUC of 'eval_det4binarycls' by
+    bootstrapping images.
+
+    Args:
+        dts (dict or list[list[ndarray]]): refer to 'eval_det4binarycls'.
+        gts (dict or list[list[ndarray]]): refer to 'eval_det4binarycls'.
+        num_samples (int): number of bootstrap replicates.
+        confidence (float): confidence level of intervals.
+        seed (int): random seed, results are reproducible given the seed.
+        workers (int or None): number of processes used to evaluate
+            replicates. Results are independent of it.
+
+    Returns:
+        (OrderedDict): 'roc_auc' interval, an OrderedDict containing 'lower',
+        'upper' and 'samples'.
+    """
+    dts, gts = _standardize(dts, gts)
+    num_imgs = len(gts)
+
+    # images without detection have score 0, as 'eval_det4binarycls' does
+    max_scores, has_dts, has_gts = _image_scores(dts, gts)
+    scores = np.where(has_dts, max_scores, 0).astype(np.float64)
+    order = np.argsort(scores, kind="stable")
+    group_starts = np.flatnonzero(np.r_[True, np.diff(scores[order]) != 0])
+    data = [(order, has_gts[order], group_starts)]
+
+    batch_size = max(1, min(num_samples, _MAX_BATCH_ELEMENTS // max(num_imgs, 1)))
+    samples = _bootstrap(_bootstrap_roc_auc, data, num_imgs, num_samples, seed, workers, batch_size)
+
+    results = OrderedDict()
+    results["roc_auc"] = _interval(samples[0], confidence)
+
+    return results
@@ -5,18 +5,10 @@ def compute_overlap(a, b):
     # a [N,4]
     # b [M,4]
     area = (b[:, 2] - b[:, 0] + 1) * (b[:, 3] - b[:, 1] + 1)
-    iw = (
-        np.minimum(np.expand_dims(a[:, 2], axis=1), b[:, 2])
-        - np.maximum(np.expand_dims(a[:, 0], axis=1), b[:, 0])
-        + 1
-    )
-    ih = (
-        np.minimum(np.expand_dims(a[:, 3], axis=1), b[:, 3])
-        - np.maximum(np.expand_dims(a[:, 1], axis=1), b[:, 1])
-        + 1
-    )
+    iw = np.minimum(a[:, 2, None], b[:, 2]) - np.maximum(a[:, 0, None], b[:, 0]) + 1
+    ih = np.minimum(a[:, 3, None], b[:, 3]) - np.maximum(a[:, 1, None], b[:, 1]) + 1
     # 假设a的数目是N，b的数目是M
-    # np.expand_dims((N,),axis=1)将(N,)变成(N,1)
+    # a[:, i, None]将(N,)变成(N,1)
     # np.minimum((N,1),(M,)) 得到 (N M) 的矩阵 代表a和b逐一比较的结果
     # 取x和y中较小的值 来计算intersection
     # iw和ih分别是intersection的宽和高 iw和ih的shape都是(N,M),
@@ -24,9 +16,128 @@ def compute_overlap(a, b):
     iw = np.maximum(iw, 0)
     ih = np.maximum(ih, 0)
 
-    ua = np.expand_dims((a[:, 2] - a[:, 0] + 1) * (a[:, 3] - a[:, 1] + 1), axis=1) + area - iw * ih
+    ua = ((a[:, 2] - a[:, 0] + 1) * (a[:, 3] - a[:, 1] + 1))[:, None] + area - iw * ih
     # 并集的计算 S_a+S_b-intersection_ab
     ua = np.maximum(ua, np.finfo(float).eps)
 
     intersection = iw * ih
     return intersection / ua  # (N,M)
+
+
+def compute_overlap_sparse(a, b, max_candidates=1 << 22):
+    """Compute non-zero overlaps between a [N,4] and b [M,4] in CSR format.
+
+    b is sorted by x1, so that the candidates of each box in a (boxes of b
+    whose x range may intersect with it) are found by binary search (sort
+    and sweep). Only candidate pairs are evaluated, and the dense (N, M)
+    matrix is never built.
+
+    Args:
+        a (ndarray): bounding boxes of shape (N, 4).
+        b (ndarray): bounding boxes of shape (M, 4).
+        max_candidates (int): max number of candidate pairs evaluated at a
+            time, to bound memory usage.
+
+    Returns:
+        (ndarray): row pointers of shape (N + 1,), overlaps of the i-th box
+            of a are stored in [indptr[i], indptr[i + 1]).
+        (ndarray): column indices (boxes of b) of non-zero overlaps, sorted
+            within each row.
+        (ndarray): non-zero overlaps, equal to those of 'compute_overlap'.
+    """
+    area_a = (a[:, 2] - a[:, 0] + 1) * (a[:, 3] - a[:, 1] + 1)
+    area_b = (b[:, 2] - b[:, 0] + 1) * (b[:, 3] - b[:, 1] + 1)
+
+    # candidates of a box in a are b[order[lo:hi]], bounds are relaxed by 1
+    # pixel, and exact intersections are checked after
+    order = np.argsort(b[:, 0], kind="stable")
+    x1 = b[order, 0]
+    max_w = np.max(b[:, 2] - b[:, 0]) if len(b) != 0 else 0
+    lo = np.searchsorted(x1, a[:, 0] - max_w - 2, side="left")
+    hi = np.searchsorted(x1, a[:, 2] + 2, side="right")
+    counts = np.maximum(hi - lo, 0)
+    ends = np.cumsum(counts)
+
+    rows, cols, overlaps = [], [], []
+    start = 0
+    while start < len(a):
+        offset = ends[start - 1] if start > 0 else 0
+        end = max(np.searchsorted(ends, offset + max_candidates, side="right"), start + 1)
+
+        # enumerate candidate pairs of rows [start, end)
+        c = counts[start:end]
+        r = np.repeat(np.arange(start, end), c)
+        k = np.arange(np.sum(c)) - np.repeat(np.cumsum(c) - c, c)
+        k = order[np.repeat(lo[start:end], c) + k]
+
+        iw = np.minimum(a[r, 2], b[k, 2]) - np.maximum(a[r, 0], b[k, 0]) + 1
+        ih = np.minimum(a[r, 3], b[k, 3]) - np.maximum(a[r, 1], b[k, 1]) + 1
+        keep = (iw > 0) & (ih > 0)
+        r, k, iw, ih = r[keep], k[keep], iw[keep], ih[keep]
+
+        ua = area_a[r] + area_b[k] - iw * ih
+        ua = np.maximum(ua, np.finfo(float).eps)
+
+        rows.append(r)
+        cols.append(k)
+        overlaps.append(iw * ih / ua)
+        start = end
+
+    rows = np.concatenate(rows) if rows else np.zeros((0,), dtype=np.int64)
+    cols = np.concatenate(cols) if cols else np.zeros((0,), dtype=np.int64)
+    overlaps = np.concatenate(overlaps) if overlaps else np.zeros((0,), dtype=a.dtype)
+
+    indices = np.lexsort((cols, rows))
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=len(a)))])
+
+    return indptr, cols[indices], overlaps[indices]
+
+
+def compute_overlap_batched(a, a_offsets, b, b_offsets, dtype=None, area_b=None):
+    """Compute overlaps between boxes of many images in one call.
+
+    Boxes of all images are stored in flat (ragged) arrays, i.e. boxes of
+    the i-th image are a[a_offsets[i]:a_offsets[i + 1]] and
+    b[b_offsets[i]:b_offsets[i + 1]].
+
+    Args:
+        a (ndarray): bounding boxes of shape (N, 4) (extra columns ignored).
+        a_offsets (ndarray): offsets of images in a of shape (I + 1,).
+        b (ndarray): bounding boxes of shape (M, 4) (extra columns ignored).
+        b_offsets (ndarray): offsets of images in b of shape (I + 1,).
+        dtype (dtype or None): dtype to compute overlaps in, e.g.
+            np.float32. If None, dtypes of a and b are used.
+        area_b (ndarray or None): precomputed areas of b of shape (M,), e.g.
+            areas of ground truths cached across evaluations.
+
+    Returns:
+        (ndarray): flat overlaps of all images. Overlaps of the i-th image
+            are overlaps[offsets[i]:offsets[i + 1]].reshape(n_i, m_i), equal
+            to 'compute_overlap' of the boxes of the i-th image.
+        (ndarray): offsets of images in overlaps of shape (I + 1,).
+    """
+    if dtype is not None:
+        a, b = a.astype(dtype, copy=False), b.astype(dtype, copy=False)
+    a_offsets, b_offsets = np.asarray(a_offsets), np.asarray(b_offsets)
+    num_a, num_b = np.diff(a_offsets), np.diff(b_offsets)
+
+    # (row of a, row of b) of every pair, images are in row-major order
+    num_pairs = num_a * num_b
+    offsets = np.concatenate([[0], np.cumsum(num_pairs)])
+    img_ids = np.repeat(np.arange(len(num_pairs)), num_pairs)
+    local_ids = np.arange(offsets[-1]) - offsets[img_ids]
+    rows = a_offsets[img_ids] + local_ids // num_b[img_ids]
+    cols = b_offsets[img_ids] + local_ids % num_b[img_ids]
+
+    area_a = (a[:, 2] - a[:, 0] + 1) * (a[:, 3] - a[:, 1] + 1)
+    if area_b is None:
+        area_b = (b[:, 2] - b[:, 0] + 1) * (b[:, 3] - b[:, 1] + 1)
+    iw = np.minimum(a[rows, 2], b[cols, 2]) - np.maximum(a[rows, 0], b[cols, 0]) + 1
+    ih = np.minimum(a[rows, 3], b[cols, 3]) - np.maximum(a[rows, 1], b[cols, 1]) + 1
+    iw = np.maximum(iw, 0)
+    ih = np.maximum(ih, 0)
+
+    ua = area_a[rows] + area_b[cols] - iw * ih
+    ua = np.maximum(ua, np.finfo(float).eps)
+
+    return iw * ih / ua, offsets
@@ -0,0 +1,246 @@
+from collections import OrderedDict
+
+import numpy as np
+from natsort import index_natsorted, natsorted
+
+# default thresholds of the threshold sweep of 'eval_cls'
+DEFAULT_SCORE_THRS = np.linspace(0, 1, 101)
+
+
+def _pack(preds, labels, num_classes, multi_label):
+    """Match predictions with labels by key and pack them into matrices.
+
+    Returns:
+        (list): keys of matched samples.
+        (ndarray): scores of shape (n, num_classes) (float64).
+        (ndarray): targets (bool) of shape (n, num_classes), one-hot for
+            single-label classification.
+    """
+    if isinstance(preds, dict) and isinstance(labels, dict):
+        keys = natsorted(set(preds.keys()) & set(labels.keys()))
+        preds = [preds[key] for key in keys]
+        labels = [labels[key] for key in keys]
+    else:
+        assert len(preds) == len(labels), "preds and labels must have the same length"
+        keys = None
+
+    scores = np.asarray(preds, dtype=np.float64).reshape(len(preds), -1)
+    if scores.shape[1] == 1 and num_classes == 2:  # score of the positive class
+        scores = np.hstack([1 - scores, scores])
+    assert scores.shape[1] == num_classes, "number of scores must be num_classes"
+
+    if multi_label:
+        targets = np.asarray(labels, dtype=np.int64).reshape(len(labels), -1) != 0
+        assert targets.shape[1] == num_classes, "number of labels must be num_classes"
+    else:
+        labels = np.asarray(labels, dtype=np.int64).reshape(len(labels))
+        assert np.all((labels >= 0) & (labels < num_classes)), "labels must be in [0, C)"
+        targets = np.zeros((len(labels), num_classes), dtype=bool)
+        targets[np.arange(len(labels)), labels] = True
+
+    return keys, scores, targets
+
+
+def _roc_auc(scores, targets):
+    """ROC AUC of each class (column) by the rank-sum statistic.
+
+    Scores of all the classes are sorted at once, and tied scores get their
+    average rank, which equals the trapezoidal area under the ROC curve.
+
+    Args:
+        scores (ndarray): scores of shape (n, C).
+        targets (ndarray): targets (bool) of shape (n, C).
+
+    Returns:
+        (ndarray): ROC AUC of each class, nan if a class has only positive
+            or only negative samples.
+    """
+    n, num_classes = scores.shape
+    s, y = scores.T.ravel(), targets.T.ravel()
+    cols = np.repeat(np.arange(num_classes), n)
+    order = np.lexsort((s, cols))
+    s, y, cols = s[order], y[order], cols[order]
+
+    # groups of tied scores within a class
+    starts = np.flatnonzero(np.r_[True, (s[1:] != s[:-1]) | (cols[1:] != cols[:-1])])
+    ends = np.r_[starts[1:], len(s)]
+    ranks = (starts + ends + 1) / 2 - cols[starts] * n  # 1-based average rank
+    ranks = np.repeat(ranks, ends - starts)
+
+    num_pos = np.bincount(cols, weights=y, minlength=num_classes)
+    num_neg = n - num_pos
+    rank_sums = np.bincount(cols, weights=ranks * y, minlength=num_classes)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (rank_sums - num_pos * (num_pos + 1) / 2) / (num_pos * num_neg)
+
+
+def _sweep(scores, targets, score_thrs):
+    """Count TP, FP, TN, FN of a class at several thresholds by binary search,
+    a sample is predicted positive if its score >= threshold.
+    """
+    pos_scores = np.sort(scores[targets])
+    neg_scores = np.sort(scores[~targets])
+    tp = len(pos_scores) - np.searchsorted(pos_scores, score_thrs, side="left")
+    fp = len(neg_scores) - np.searchsorted(neg_scores, score_thrs, side="left")
+    tn, fn = len(neg_scores) - fp, len(pos_scores) - tp
+
+    eps = np.finfo(np.float32).eps
+    table = OrderedDict()
+    table["thr"] = np.asarray(score_thrs)
+    table["tp"], table["fp"], table["tn"], table["fn"] = tp, fp, tn, fn
+    table["accuracy"] = (tp + tn) / np.maximum(tp + fn + tn + fp, eps)
+    table["sensitivity"] = tp / np.maximum(tp + fn, eps)
+    table["specificity"] = tn / np.maximum(tn + fp, eps)
+    table["precision"] = tp / np.maximum(tp + fp, eps)
+
+    return table
+
+
+class ClsEvaluator:
+    """Accumulate classification results batch by batch and evaluate them.
+
+    Predictions and labels are matched by key and packed into (n, C)
+    matrices once per batch, and metrics are computed with vectorized
+    kernels on the accumulated matrices.
+
+    Example:
+    >>> evaluator = mv.ClsEvaluator(num_classes=3)
+    >>> for preds_batch, labels_batch in batches:
+    >>>     evaluator.update(preds_batch, labels_batch)
+    >>> results = evaluator.compute()
+
+    Args:
+        num_classes (int): number of classes.
+        multi_label (bool): whether it is multi-label classification, i.e.
+            labels are multi-hot tuples (e.g. (0, 1, 1)) instead of class
+            indices.
+    """
+
+    def __init__(self, num_classes=2, multi_label=False):
+        self.num_classes = num_classes
+        self.multi_label = multi_label
+        self.reset()
+
+    def reset(self):
+        self.keys = []
+        self._scores = []
+        self._targets = []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def update(self, preds, labels):
+        """Add a batch of predictions and labels.
+
+        Args:
+            preds (dict or list): scores of each sample, a score per class
+                (e.g. [0.1, 0.7, 0.2]), or the score of the positive class
+                for binary classification. {key: scores} if in dict format.
+            labels (dict or list): labels of each sample (e.g. loaded by
+                'load_cls_dsmd'), a class index, or a multi-hot tuple for
+                multi-label classification. Only samples in both preds and
+                labels are evaluated if in dict format.
+        """
+        keys, scores, targets = _pack(preds, labels, self.num_classes, self.multi_label)
+        if keys is None:
+            keys = list(range(len(self.keys), len(self.keys) + len(scores)))
+        self.keys.extend(keys)
+        self._scores.append(scores)
+        self._targets.append(targets)
+
+    def merge(self, other):
+        """Merge samples of another evaluator into this one."""
+        assert self.num_classes == other.num_classes, "num_classes not match"
+        assert self.multi_label == other.multi_label, "multi_label not match"
+        # samples of list batches are numbered by position, so those of the
+        # other evaluator follow the samples of this one
+        offset = len(self.keys)
+        self.keys.extend(key + offset if isinstance(key, int) else key for key in other.keys)
+        self._scores.extend(other._scores)
+        self._targets.extend(other._targets)
+
+        return self
+
+    def arrays(self):
+        """Accumulated samples in natsorted key order.
+
+        Returns:
+            (list): keys of samples.
+            (ndarray): scores of shape (n, num_classes).
+            (ndarray): targets (bool) of shape (n, num_classes).
+        """
+        assert len(set(self.keys)) == len(self.keys), "samples of different batches overlap"
+        scores = np.zeros((0, self.num_classes), dtype=np.float64)
+        targets = np.zeros((0, self.num_classes), dtype=bool)
+        scores = np.concatenate([scores] + self._scores)
+        targets = np.concatenate([targets] + self._targets)
+        self._scores, self._targets = [scores], [targets]
+
+        order = index_natsorted(self.keys)
+        return [self.keys[i] for i in order], scores[order], targets[order]
+
+    def compute(self, score_thrs=None, thr=0.5):
+        """Compute metrics of all the accumulated samples.
+
+        Args:
+            score_thrs (Iterable or None): thresholds of the per-class
+                threshold sweep. If None, DEFAULT_SCORE_THRS are used.
+            thr (float): threshold of the confusion matrices of multi-label
+                classification.
+
+        Returns:
+            (OrderedDict): results[label] contains 'auc', 'num_pos' and the
+            threshold sweep table 'thrs' (TP, FP, TN, FN, accuracy,
+            sensitivity, specificity and precision at each threshold, a
+            sample is positive if its score >= threshold).
+            results['confusion_matrix'] is of shape (C, C) (rows are labels
+            and columns are top-1 predictions) for single-label
+            classification, and of shape (C, 2, 2) ([[tn, fp], [fn, tp]] of
+            each class) for multi-label classification. results['accuracy']
+            is the top-1 accuracy (subset accuracy if multi-label).
+        """
+        score_thrs = DEFAULT_SCORE_THRS if score_thrs is None else np.asarray(score_thrs)
+        _, scores, targets = self.arrays()
+        num_classes = self.num_classes
+
+        results = OrderedDict()
+        aucs = _roc_auc(scores, targets)
+        for label in range(num_classes):
+            results[label] = OrderedDict()
+            results[label]["auc"] = aucs[label]
+            results[label]["num_pos"] = int(np.count_nonzero(targets[:, label]))
+            results[label]["thrs"] = _sweep(scores[:, label], targets[:, label], score_thrs)
+
+        if self.multi_label:
+            preds = scores >= thr
+            index = targets.astype(np.int64) * 2 + preds + np.arange(num_classes) * 4
+            counts = np.bincount(index.ravel(), minlength=num_classes * 4)
+            results["confusion_matrix"] = counts.reshape(num_classes, 2, 2)
+            results["accuracy"] = np.mean(np.all(preds == targets, axis=1))
+        else:
+            preds = np.argmax(scores, axis=1)
+            labels = np.argmax(targets, axis=1)
+            counts = np.bincount(labels * num_classes + preds, minlength=num_classes**2)
+            results["confusion_matrix"] = counts.reshape(num_classes, num_classes)
+            results["accuracy"] = np.mean(preds == labels)
+
+        return results
+
+
+def eval_cls(preds, labels, num_classes=2, multi_label=False, score_thrs=None, thr=0.5):
+    """Evaluate a classifier by comparing predictions with labels.
+
+    Args:
+        preds (dict or list): refer to 'ClsEvaluator.update'.
+        labels (dict or list): refer to 'ClsEvaluator.update'.
+        num_classes (int): number of classes.
+        multi_label (bool): whether it is multi-label classification.
+        score_thrs (Iterable or None): refer to 'ClsEvaluator.compute'.
+        thr (float): refer to 'ClsEvaluator.compute'.
+
+    Returns:
+        (OrderedDict): refer to 'ClsEvaluator.compute'.
+    """
+    evaluator = ClsEvaluator(num_classes, multi_label)
+    evaluator.update(preds, labels)
+    return evaluator.compute(score_thrs, thr)
@@ -1,11 +1,19 @@
 from collections import OrderedDict
-from collections.abc import Iterable
+from collections.abc import Iterable, Mapping
 
 import numpy as np
-from natsort import natsorted
-from sklearn import metrics as skm
+from natsort import index_natsorted, natsorted
 
-from .compute_overlap import compute_overlap
+import medvision as mv
+
+from .match_det import gather_gts, match_label, match_labels
+from .metrics import roc_auc_score, roc_curve
+from .operating_point import find_operating_points
+
+# default size buckets of 'eval_det_subsets', i.e. areas of COCO
+DEFAULT_AREA_RANGES = OrderedDict(
+    [("small", (0, 32**2)), ("medium", (32**2, 96**2)), ("large", (96**2, np.inf))]
+)
 
 
 def _compute_ap_voc07(rec, pre):
@@ -27,8 +35,7 @@ def _compute_ap_voc12(rec, pre):
     mpre = np.concatenate(([0.0], pre, [0.0]))
 
     # compute the precision envelope
-    for i in range(mpre.size - 1, 0, -1):
-        mpre[i - 1] = np.maximum(mpre[i - 1], mpre[i])
+    mpre = np.maximum.accumulate(mpre[::-1])[::-1]
 
     # to calculate area under PR curve, look for points
     # where X axis (recall) changes value
@@ -68,6 +75,11 @@ def _compute_ap(rec, pre, use_voc07_metric=False):
         return _compute_ap_voc12(rec, pre)
 
 
+def _natsorted_keys(dsmd):
+    # keys of a Dsmd are already natsorted
+    return list(dsmd.keys()) if isinstance(dsmd, mv.Dsmd) else natsorted(dsmd.keys())
+
+
 def _standardize(dts, gts):
     """Convert gt/dt from dict to list[list[ndarray]] (if in dict format).
     Args:
@@ -80,10 +92,11 @@ def _standardize(dts, gts):
     """
     assert len(gts) == len(dts), "dts and gts must have the same length"
 
-    if isinstance(dts, dict) and isinstance(gts, dict):
+    if isinstance(dts, Mapping) and isinstance(gts, Mapping):
         assert set(dts.keys()) == set(gts.keys()), "dts and gts must have the same key set"
-        dts = [value for _, value in natsorted(dts.items())]
-        gts = [value for _, value in natsorted(gts.items())]
+        keys = _natsorted_keys(gts)
+        dts = [dts[key] for key in keys]
+        gts = [gts[key] for key in keys]
 
     return dts, gts
 
@@ -106,39 +119,23 @@ def eval_det4binarycls(dts, gts, score_thrs):
             whether a detection is valid.
     Returns:
         (dict): a dict containing classification metrics TP, FP, TN, FN,
-        accuracy, recall, precision.
+        accuracy, recall, precision at each threshold, the operating point
+        table (metrics at every distinct image score, an image is positive
+        if its max score >= the score of the row) and the roc curve.
     """
-    if not isinstance(score_thrs, Iterable):
-        score_thrs = [score_thrs]
+    score_thrs = list(score_thrs) if isinstance(score_thrs, Iterable) else [score_thrs]
 
     assert len(gts) == len(dts)
     dts, gts = _standardize(dts, gts)
 
+    # an image is 'positive' if its max detection score > score_thr
+    max_scores, has_dts, has_gts = _image_scores(dts, gts)
+
     # compute detector's classification capability
     results = {"thrs": {}}
-    for score_thr in score_thrs:
-        tp, fp, tn, fn = 0, 0, 0, 0
-        for i in range(len(gts)):
-            assert len(gts[i]) == 1, "only support 1-class detection"
-            assert len(dts[i]) == 1, "only support 1-class detection"
-            gt = gts[i][0]
-            dt = dts[i][0]
-
-            if len(dt) != 0:
-                has_dt = dt[:, 4].max() > score_thr
-            else:
-                has_dt = False
-
-            has_gt = len(gt) != 0
-
-            if has_dt and has_gt:
-                tp += 1
-            elif has_dt and not has_gt:
-                fp += 1
-            elif not has_dt and has_gt:
-                fn += 1
-            else:  # not has_dt and not has_gt:
-                tn += 1
+    counts = _count_binarycls(max_scores, has_gts, score_thrs)
+    for i, score_thr in enumerate(score_thrs):
+        tp, fp, tn, fn = [int(count[i]) for count in counts]
 
         # build result
         result = OrderedDict()
@@ -157,16 +154,134 @@ def eval_det4binarycls(dts, gts, score_thrs):
 
         results["thrs"][str(score_thr)] = result
 
+    # build operating point table at every distinct max score, the images
+    # at the score of a row are positive in that row
+    thrs = np.unique(max_scores[has_dts])[::-1]
+    tp, fp, tn, fn = _count_binarycls(max_scores, has_gts, thrs, inclusive=True)
+    eps = np.finfo(np.float32).eps
+    table = OrderedDict()
+    table["thr"] = thrs
+    table["tp"], table["fp"], table["tn"], table["fn"] = tp, fp, tn, fn
+    table["accuracy"] = (tp + tn) / np.maximum(tp + fn + tn + fp, eps)
+    table["sensitivity"] = tp / np.maximum(tp + fn, eps)
+    table["specificity"] = tn / np.maximum(tn + fp, eps)
+    table["precision"] = tp / np.maximum(tp + fp, eps)
+    results["operating_points"] = table
+
     # create roc curve
-    gt_labels = [(len(gt[0]) != 0) for gt in gts]
-    dt_scores = [dt[0][:, -1].max() if len(dt[0]) > 0 else 0 for dt in dts]
-    results["roc_curve"] = skm.roc_curve(gt_labels, dt_scores)
-    results["roc_auc"] = skm.roc_auc_score(gt_labels, dt_scores)
+    gt_labels = has_gts.tolist()
+    dt_scores = np.where(has_dts, max_scores, 0).astype(np.float64)
+    results["roc_curve"] = roc_curve(gt_labels, dt_scores)
+    results["roc_auc"] = roc_auc_score(gt_labels, dt_scores)
 
     return results
 
 
-def eval_det(dts, gts, num_classes=1, iou_thr=0.5):
+def _image_scores(dts, gts):
+    """Get image-level scores and labels for 1-class detection.
+
+    Args:
+        dts (list[list[ndarray]]): refer to 'eval_det4binarycls'.
+        gts (list[list[ndarray]]): refer to 'eval_det4binarycls'.
+
+    Returns:
+        (ndarray): max detection score of each image, -inf if no target is
+            detected in an image.
+        (ndarray): whether any target is detected in each image (bool).
+        (ndarray): whether there is any target in each image (bool).
+    """
+    assert all(len(gt) == 1 for gt in gts), "only support 1-class detection"
+    assert all(len(dt) == 1 for dt in dts), "only support 1-class detection"
+
+    has_dts = np.array([len(dt[0]) != 0 for dt in dts], dtype=bool)
+    has_gts = np.array([len(gt[0]) != 0 for gt in gts], dtype=bool)
+    score_dtype = np.result_type(np.float32, *[dt[0].dtype for dt in dts if len(dt[0])])
+    max_scores = np.full((len(dts),), -np.inf, dtype=score_dtype)
+    max_scores[has_dts] = [dt[0][:, -1].max() for dt in dts if len(dt[0])]
+
+    return max_scores, has_dts, has_gts
+
+
+def _count_binarycls(max_scores, labels, score_thrs, inclusive=False):
+    """Count image-level TP, FP, TN, FN at several thresholds by binary search.
+
+    Args:
+        max_scores (ndarray): max detection score of each image, -inf if no
+            target is detected in an image.
+        labels (ndarray): whether there is any target in each image (bool).
+        score_thrs (Iterable): thresholds, an image is predicted positive if
+            its max detection score > threshold.
+        inclusive (bool): whether an image is also predicted positive if its
+            max detection score == threshold.
+
+    Returns:
+        (tuple[ndarray]): TP, FP, TN, FN at each threshold.
+    """
+    score_thrs = np.asarray(score_thrs, dtype=max_scores.dtype)
+    pos_scores = np.sort(max_scores[labels])
+    neg_scores = np.sort(max_scores[~labels])
+
+    side = "left" if inclusive else "right"
+    tp = len(pos_scores) - np.searchsorted(pos_scores, score_thrs, side=side)
+    fp = len(neg_scores) - np.searchsorted(neg_scores, score_thrs, side=side)
+
+    return tp, fp, len(neg_scores) - fp, len(pos_scores) - tp
+
+
+def _eval_label(tps, scores, num_anns, num_imgs, fp_rates=None, recalls=None):
+    """Compute AP, FROC, etc. of a label from its matched detections.
+
+    Args:
+        tps (ndarray): true positive flags (bool) of detections sorted by
+            descending score.
+        scores (ndarray): detection scores in descending order.
+        num_anns (float): number of ground truth bounding boxes.
+        num_imgs (int): number of images.
+        fp_rates (Iterable or None): refer to 'find_operating_points'.
+        recalls (Iterable or None): refer to 'find_operating_points'.
+
+    Returns:
+        (OrderedDict): AP, number of GT bboxes, FROC curve of the label.
+    """
+    result = OrderedDict()
+
+    # no annotations -> AP for this class is None
+    if num_anns == 0:
+        result["ap"] = None
+        result["num_gt_bboxes"] = 0
+        result["froc"] = None
+        return result
+
+    # compute false positives and true positives at retrieval cutoff
+    # of k bboxes (k in [1, n], n is the total number of detected bboxes)
+    fps = np.cumsum((~tps).astype(np.float64))
+    tps = np.cumsum(tps.astype(np.float64))
+
+    # compute recall and precision
+    recall = tps / num_anns
+    precision = tps / np.maximum(tps + fps, np.finfo(np.float32).eps)
+
+    # compute AP, number of ground truth bboxes and FROC
+    result["ap"] = _compute_ap(recall, precision)
+    result["num_gt_bboxes"] = num_anns
+    result["froc"] = fps / num_imgs, recall  # recall = sensitivity
+    result["froc_auc"] = _compute_froc(fps / num_imgs, recall)
+
+    # find operating points, e.g. threshold of 0.5 fps and 1 fps.
+    result["pr"] = find_operating_points(
+        fps / num_imgs, recall, precision, scores, fp_rates, recalls
+    )
+
+    return result
+
+
+def _mean(values):
+    return None if any(v is None for v in values) else np.mean(values)
+
+
+def eval_det(
+    dts, gts, num_classes=1, iou_thr=0.5, workers=None, fp_rates=None, recalls=None, cache=None
+):
     """Evaluate a given dataset by comparing DT with GT.
 
     Args:
@@ -177,92 +292,450 @@ def eval_det(dts, gts, num_classes=1, iou_thr=0.5):
             shape (n, 4).
             gts[img_id][label_id] = bboxes (for a specific label in an image).
         num_classes (int): number of classes to detect.
-        iou_thr (float): threshold to determine whether a detection is
-            positive or negative.
+        iou_thr (float or Iterable): threshold to determine whether a
+            detection is positive or negative. If several thresholds are
+            given (e.g. np.linspace(0.5, 0.95, 10)), overlaps are computed
+            only once and detections are matched against all of them.
+        workers (int or None): number of processes used to match images.
+        fp_rates (Iterable or None): refer to 'find_operating_points'.
+        recalls (Iterable or None): refer to 'find_operating_points'.
+        cache (MatchCache or None): cache of per-image matching results, only
+            images whose detections or ground truths changed are matched.
 
     Returns:
         (OrderedDict): AP, number of GT bboxes, FROC curve for each label.
+        If several IoU thresholds are given, results of each threshold are
+        stored in results[label]["thrs"][str_thr], and results[label]["ap"],
+        results[label]["froc_auc"] are averaged over thresholds.
     """
+    multi_thrs = isinstance(iou_thr, Iterable)
+    iou_thrs = list(iou_thr) if multi_thrs else [iou_thr]
+
     dts, gts = _standardize(dts, gts)
     num_imgs = len(gts)
 
-    results = OrderedDict()
-
     # match ground truths and detection results
-    for label in range(num_classes):
-        fps = np.zeros((0,), np.float32)
-        tps = np.zeros((0,), np.float32)
-        scores = np.zeros((0,), np.float32)
-        num_anns = 0.0
-
-        for i in range(num_imgs):
-            gt = gts[i][label]
-            dt = dts[i][label]
-            dt = dt[np.argsort(-dt[:, -1])]
-            num_anns += len(gt)
-            matched_anns = []
-
-            for d in dt:
-                scores = np.append(scores, d[-1])
-
-                if len(gt) == 0:
-                    fps = np.append(fps, 1)
-                    tps = np.append(tps, 0)
-                    continue
-
-                overlaps = compute_overlap(
-                    np.expand_dims(d, axis=0).astype(np.float32), gt.astype(np.float32)
-                )
-                matched_ann = np.argmax(overlaps, axis=1)
-                max_overlap = overlaps[0, matched_ann]
-
-                if max_overlap > iou_thr and matched_ann not in matched_anns:
-                    fps = np.append(fps, 0)
-                    tps = np.append(tps, 1)
-                    matched_anns.append(matched_ann)
-                else:
-                    fps = np.append(fps, 1)
-                    tps = np.append(tps, 0)
-
-        # no annotations -> AP for this class is None
-        if num_anns == 0:
-            results[label] = OrderedDict()
-            results[label]["ap"] = None
-            results[label]["num_gt_bboxes"] = 0
-            results[label]["froc"] = None
-            continue
+    if cache is None:
+        matches = match_labels(dts, gts, num_classes, iou_thrs, workers)
+    else:
+        matches = cache.match_labels(dts, gts, num_classes, iou_thrs, workers)
+
+    return _eval_matches(matches, num_imgs, iou_thrs, multi_thrs, fp_rates, recalls)
+
+
+def _eval_matches(matches, num_imgs, iou_thrs, multi_thrs, fp_rates=None, recalls=None, masks=None):
+    """Build the results of 'eval_det' from matched detections of each label.
+
+    If masks are given, only the masked detections of each label (masks of
+    shape (len(iou_thrs), n), one row per threshold) are evaluated.
+    """
+    results = OrderedDict()
 
+    for label, (tps, scores, num_anns) in enumerate(matches):
         # sort by score
         indices = np.argsort(-scores)
-        fps, tps, scores = fps[indices], tps[indices], scores[indices]
+        tps, scores = tps[:, indices], scores[indices]
 
-        # compute false positives and true positives at retrieval cutoff
-        # of k bboxes (k in [1, n], n is the total number of detected bboxes)
-        fps, tps = np.cumsum(fps), np.cumsum(tps)
-
-        # compute recall and precision
-        recall = tps / num_anns
-        precision = tps / np.maximum(tps + fps, np.finfo(np.float32).eps)
+        if masks is None:
+            label_results = [
+                _eval_label(t, scores, num_anns, num_imgs, fp_rates, recalls) for t in tps
+            ]
+        else:
+            label_results = [
+                _eval_label(t[m], scores[m], num_anns, num_imgs, fp_rates, recalls)
+                for t, m in zip(tps, masks[label][:, indices])
+            ]
+        if not multi_thrs:
+            results[label] = label_results[0]
+            continue
 
-        # compute AP, number of ground truth bboxes and FROC
         results[label] = OrderedDict()
-        results[label]["ap"] = _compute_ap(recall, precision)
-        results[label]["num_gt_bboxes"] = num_anns
-        results[label]["froc"] = fps / num_imgs, recall  # recall = sensitivity
-        results[label]["froc_auc"] = _compute_froc(fps / num_imgs, recall)
-
-        # find score of 0.5 fps and 1 fps.
-        # TODO: move to project level code/script
-        fps_per_image = fps / num_imgs
-        fp_range = np.array(range(10)) * 0.1 + 0.1
-        results[label]["pr"] = {}
-        for i in range(len(scores) - 1):
-            for n in fp_range:
-                if fps_per_image[i] < n <= fps_per_image[i + 1]:
-                    results[label]["pr"]["fp-" + str(n)[:3]] = {
-                        "thr": scores[i],
-                        "recall": recall[i],
-                        "precision": precision[i],
-                    }
+        results[label]["ap"] = _mean([r["ap"] for r in label_results])
+        results[label]["num_gt_bboxes"] = label_results[0]["num_gt_bboxes"]
+        results[label]["froc_auc"] = _mean([r.get("froc_auc") for r in label_results])
+        results[label]["thrs"] = OrderedDict(
+            ("%g" % thr, r) for thr, r in zip(iou_thrs, label_results)
+        )
 
     return results
+
+
+def _in_range(areas, area_range):
+    return (areas >= area_range[0]) & (areas < area_range[1])
+
+
+def eval_det_subsets(
+    dts,
+    gts,
+    num_classes=1,
+    iou_thr=0.5,
+    area_ranges=None,
+    groups=None,
+    workers=None,
+    fp_rates=None,
+    recalls=None,
+):
+    """Evaluate a detector on size buckets and groups of images (e.g.
+    patients or studies) with a single matching pass.
+
+    Detections are matched once against all ground truths. Then a ground
+    truth belongs to the bucket of its area, a true positive to the bucket
+    of its matched ground truth, and a false positive to the bucket of its
+    own area. Each bucket / group is evaluated by masking detections.
+
+    Args:
+        dts (dict or list[list[ndarray]]): refer to 'eval_det'.
+        gts (dict or list[list[ndarray]]): refer to 'eval_det'.
+        num_classes (int): number of classes to detect.
+        iou_thr (float or Iterable): refer to 'eval_det'.
+        area_ranges (dict or None): {bucket name: (min area, max area)},
+            area in [min, max) belongs to the bucket. If None,
+            DEFAULT_AREA_RANGES (small, medium, large) are used.
+        groups (dict, list or None): group id of each image, e.g. patient
+            id. {key: group id} if gts is a dict, otherwise a list of group
+            ids of images. If None, no group-level result is computed.
+        workers (int or None): refer to 'eval_det'.
+        fp_rates (Iterable or None): refer to 'eval_det'.
+        recalls (Iterable or None): refer to 'eval_det'.
+
+    Returns:
+        (OrderedDict): 'all': result of 'eval_det', 'areas': {bucket name:
+        result}, 'groups': {group id: result} (if groups is given). FROC of a
+        group is computed with the number of images of the group.
+    """
+    multi_thrs = isinstance(iou_thr, Iterable)
+    iou_thrs = list(iou_thr) if multi_thrs else [iou_thr]
+    area_ranges = DEFAULT_AREA_RANGES if area_ranges is None else area_ranges
+
+    if groups is not None and isinstance(gts, Mapping):
+        groups = [groups[key] for key in _natsorted_keys(gts)]
+    dts, gts = _standardize(dts, gts)
+    num_imgs = len(gts)
+
+    matches = match_labels(dts, gts, num_classes, iou_thrs, workers, return_areas=True)
+
+    results = OrderedDict()
+    results["all"] = _eval_matches(
+        [m[:3] for m in matches], num_imgs, iou_thrs, multi_thrs, fp_rates, recalls
+    )
+
+    # size buckets
+    gt_areas = [gather_gts(gts, label)[2] for label in range(num_classes)]
+    results["areas"] = OrderedDict()
+    for name, area_range in area_ranges.items():
+        bucket_matches, masks = [], []
+        for label, (tps, scores, _, dt_areas, matched_areas) in enumerate(matches):
+            num_anns = float(np.count_nonzero(_in_range(gt_areas[label], area_range)))
+            bucket_matches.append((tps, scores, num_anns))
+            with np.errstate(invalid="ignore"):
+                masks.append(
+                    np.where(
+                        tps, _in_range(matched_areas, area_range), _in_range(dt_areas, area_range)
+                    )
+                )
+        results["areas"][name] = _eval_matches(
+            bucket_matches, num_imgs, iou_thrs, multi_thrs, fp_rates, recalls, masks
+        )
+
+    if groups is None:
+        return results
+
+    # groups of images
+    assert len(groups) == num_imgs, "groups and gts must have the same length"
+    group_names, group_ids = np.unique(np.asarray(groups), return_inverse=True)
+    num_dets = [np.array([len(dt[label]) for dt in dts]) for label in range(num_classes)]
+    num_gts = [np.array([len(gt[label]) for gt in gts]) for label in range(num_classes)]
+    results["groups"] = OrderedDict()
+    for i, name in enumerate(group_names.tolist()):
+        in_group = group_ids == i
+        group_matches, masks = [], []
+        for label, (tps, scores, _, _, _) in enumerate(matches):
+            num_anns = float(np.sum(num_gts[label][in_group]))
+            group_matches.append((tps, scores, num_anns))
+            mask = np.repeat(in_group, num_dets[label])
+            masks.append(np.broadcast_to(mask, tps.shape))
+        results["groups"][name] = _eval_matches(
+            group_matches, int(np.sum(in_group)), iou_thrs, multi_thrs, fp_rates, recalls, masks
+        )
+
+    return results
+
+
+class DetEvaluator:
+    """Accumulate detection results batch by batch and evaluate them.
+
+    Only the matching results (true positive flags and scores) are kept, so
+    evaluation can run alongside inference, and evaluators of different
+    nodes can be merged before computing the final metrics.
+
+    Example:
+    >>> evaluator = mv.DetEvaluator(num_classes=1, iou_thr=0.5)
+    >>> for dts_batch, gts_batch in batches:
+    >>>     evaluator.update(dts_batch, gts_batch)
+    >>> evaluator.merge(evaluator_of_another_node)
+    >>> results = evaluator.compute()  # same as eval_det(dts, gts, 1, 0.5)
+
+    Args:
+        num_classes (int): number of classes to detect.
+        iou_thr (float or Iterable): refer to 'eval_det'.
+        workers (int or None): refer to 'eval_det'.
+    """
+
+    def __init__(self, num_classes=1, iou_thr=0.5, workers=None):
+        self.num_classes = num_classes
+        self.iou_thr = iou_thr
+        self.workers = workers
+        self.reset()
+
+    @property
+    def iou_thrs(self):
+        return list(self.iou_thr) if isinstance(self.iou_thr, Iterable) else [self.iou_thr]
+
+    def reset(self):
+        self.keys = []
+        self.num_anns = [0.0] * self.num_classes
+        self._tps = [[] for _ in range(self.num_classes)]
+        self._scores = [[] for _ in range(self.num_classes)]
+        self._img_ids = [[] for _ in range(self.num_classes)]
+
+    def update(self, dts_batch, gts_batch):
+        """Match a batch of detection results with ground truths.
+
+        Args:
+            dts_batch (dict or list[list[ndarray]]): refer to 'eval_det'.
+            gts_batch (dict or list[list[ndarray]]): refer to 'eval_det'.
+
+        N.B.
+            Images of different batches should not overlap. If batches are
+            given in dict format, images are ordered by natsorted keys (as
+            'eval_det' does). Otherwise, images are ordered by the order
+            they are added.
+        """
+        if isinstance(dts_batch, Mapping) and isinstance(gts_batch, Mapping):
+            keys = _natsorted_keys(gts_batch)
+        else:
+            keys = list(range(len(self.keys), len(self.keys) + len(gts_batch)))
+        dts_batch, gts_batch = _standardize(dts_batch, gts_batch)
+
+        matches = match_labels(dts_batch, gts_batch, self.num_classes, self.iou_thrs, self.workers)
+        for label, (tps, scores, num_anns) in enumerate(matches):
+            num_dets = [len(dt[label]) for dt in dts_batch]
+            img_ids = np.repeat(np.arange(len(keys)) + len(self.keys), num_dets)
+            self._tps[label].append(tps)
+            self._scores[label].append(scores)
+            self._img_ids[label].append(img_ids)
+            self.num_anns[label] += num_anns
+        self.keys.extend(keys)
+
+    def merge(self, other):
+        """Merge matching results of another evaluator into this one.
+
+        Args:
+            other (DetEvaluator): evaluator of another part of the dataset.
+
+        Returns:
+            (DetEvaluator): the evaluator itself.
+        """
+        assert self.num_classes == other.num_classes, "num_classes not match"
+        assert self.iou_thrs == other.iou_thrs, "iou_thr not match"
+
+        offset = len(self.keys)
+        for label in range(self.num_classes):
+            self._tps[label].extend(other._tps[label])
+            self._scores[label].extend(other._scores[label])
+            self._img_ids[label].extend(ids + offset for ids in other._img_ids[label])
+            self.num_anns[label] += other.num_anns[label]
+        # images of list batches are numbered by position, so those of the
+        # other evaluator follow the images of this one
+        self.keys.extend(key + offset if isinstance(key, int) else key for key in other.keys)
+
+        return self
+
+    def _concatenate(self, label):
+        if len(self._tps[label]) == 0:
+            tps = np.zeros((len(self.iou_thrs), 0), dtype=bool)
+            return tps, np.zeros((0,), np.float32), np.zeros((0,), np.int64)
+
+        # compact accumulated chunks to speed up later updates and merges
+        self._tps[label] = [np.concatenate(self._tps[label], axis=1)]
+        self._scores[label] = [np.concatenate(self._scores[label])]
+        self._img_ids[label] = [np.concatenate(self._img_ids[label])]
+
+        return self._tps[label][0], self._scores[label][0], self._img_ids[label][0]
+
+    def state_dict(self):
+        """Return the state of the evaluator, which only contains builtin
+        types and ndarrays, and can be serialized (e.g. by pickle).
+        """
+        state = {
+            "num_classes": self.num_classes,
+            "iou_thr": self.iou_thr,
+            "keys": list(self.keys),
+            "num_anns": list(self.num_anns),
+            "tps": [],
+            "scores": [],
+            "img_ids": [],
+        }
+        for label in range(self.num_classes):
+            tps, scores, img_ids = self._concatenate(label)
+            state["tps"].append(tps)
+            state["scores"].append(scores)
+            state["img_ids"].append(img_ids)
+
+        return state
+
+    @classmethod
+    def from_state_dict(cls, state, workers=None):
+        """Create an evaluator from a state returned by 'state_dict()'."""
+        evaluator = cls(state["num_classes"], state["iou_thr"], workers)
+        evaluator.keys = list(state["keys"])
+        evaluator.num_anns = list(state["num_anns"])
+        evaluator._tps = [[tps] for tps in state["tps"]]
+        evaluator._scores = [[scores] for scores in state["scores"]]
+        evaluator._img_ids = [[img_ids] for img_ids in state["img_ids"]]
+
+        return evaluator
+
+    def compute(self, fp_rates=None, recalls=None):
+        """Compute metrics of all the accumulated results.
+
+        Args:
+            fp_rates (Iterable or None): refer to 'eval_det'.
+            recalls (Iterable or None): refer to 'eval_det'.
+
+        Returns:
+            (OrderedDict): same as the result of 'eval_det'.
+        """
+        assert len(set(self.keys)) == len(self.keys), "images of different batches overlap"
+
+        # rank of each image in the order that 'eval_det' visits images
+        ranks = np.empty((len(self.keys),), dtype=np.int64)
+        ranks[index_natsorted(self.keys)] = np.arange(len(self.keys))
+
+        matches = []
+        for label in range(self.num_classes):
+            tps, scores, img_ids = self._concatenate(label)
+            indices = np.argsort(ranks[img_ids], kind="stable")
+            matches.append((tps[:, indices], scores[indices], self.num_anns[label]))
+
+        multi_thrs = isinstance(self.iou_thr, Iterable)
+        return _eval_matches(matches, len(self.keys), self.iou_thrs, multi_thrs, fp_rates, recalls)
+
+
+class DetGtIndex:
+    """Ground truths indexed once to evaluate several detectors against them.
+
+    Keys are natsorted, and boxes (with their areas) of each label are
+    gathered into flat arrays only once, instead of in every 'eval_det' call.
+
+    Example:
+    >>> gt_index = mv.DetGtIndex(gts, num_classes=1)
+    >>> results = [gt_index.evaluate(dts, iou_thr=0.5) for dts in models]
+    >>> # or evaluate models in parallel
+    >>> results = mv.eval_dets(models, gt_index, num_classes=1, workers=4)
+
+    Args:
+        gts (dict or list[list[ndarray]]): refer to 'eval_det'.
+        num_classes (int): number of classes to detect.
+    """
+
+    def __init__(self, gts, num_classes=1):
+        if isinstance(gts, Mapping):
+            self.keys = _natsorted_keys(gts)
+            gts = [gts[key] for key in self.keys]
+        else:
+            self.keys = None
+        self.num_classes = num_classes
+        self.num_imgs = len(gts)
+        self.gathered_gts = [gather_gts(gts, label) for label in range(num_classes)]
+
+    def order(self, dts):
+        """Arrange detection results in the order of the ground truths.
+
+        Args:
+            dts (dict or list[list[ndarray]]): refer to 'eval_det'.
+
+        Returns:
+            (list[list[ndarray]]): detection results of each image.
+        """
+        assert len(dts) == self.num_imgs, "dts and gts must have the same length"
+        if isinstance(dts, Mapping):
+            assert self.keys is not None, "dts and gts must be both dicts or both lists"
+            assert set(dts.keys()) == set(self.keys), "dts and gts must have the same key set"
+            return [dts[key] for key in self.keys]
+
+        return dts
+
+    def evaluate(self, dts, iou_thr=0.5, fp_rates=None, recalls=None):
+        """Evaluate detection results against the ground truths.
+
+        Args:
+            dts (dict or list[list[ndarray]]): refer to 'eval_det'.
+            iou_thr (float or Iterable): refer to 'eval_det'.
+            fp_rates (Iterable or None): refer to 'eval_det'.
+            recalls (Iterable or None): refer to 'eval_det'.
+
+        Returns:
+            (OrderedDict): same as the result of 'eval_det'.
+        """
+        multi_thrs = isinstance(iou_thr, Iterable)
+        iou_thrs = list(iou_thr) if multi_thrs else [iou_thr]
+
+        dts = self.order(dts)
+        matches = [
+            match_label(dts, None, label, iou_thrs, self.gathered_gts[label])
+            for label in range(self.num_classes)
+        ]
+
+        return _eval_matches(matches, self.num_imgs, iou_thrs, multi_thrs, fp_rates, recalls)
+
+
+def _eval_model(args):
+    model_id, dts, gt_index, iou_thr, fp_rates, recalls = args
+    return model_id, gt_index.evaluate(dts, iou_thr, fp_rates, recalls)
+
+
+def eval_dets(
+    dts_of_models, gts, num_classes=1, iou_thr=0.5, workers=None, fp_rates=None, recalls=None
+):
+    """Evaluate several detectors against the same ground truths.
+
+    Ground truths are prepared only once and shared by all the detectors.
+
+    Args:
+        dts_of_models (dict or list): detection results of each detector,
+            e.g. {model_name: dts}, dts is the same as that of 'eval_det'.
+        gts (DetGtIndex, dict or list[list[ndarray]]): ground truths, refer
+            to 'eval_det'.
+        num_classes (int): number of classes to detect.
+        iou_thr (float or Iterable): refer to 'eval_det'.
+        workers (int or None): number of processes used to evaluate
+            detectors (one detector per process). If None or 1, detectors
+            are evaluated in current process.
+        fp_rates (Iterable or None): refer to 'eval_det'.
+        recalls (Iterable or None): refer to 'eval_det'.
+
+    Returns:
+        (OrderedDict or list): results of each detector (same as the result
+        of 'eval_det'), keyed by model name if dts_of_models is a dict.
+    """
+    if not isinstance(gts, DetGtIndex):
+        gts = DetGtIndex(gts, num_classes)
+    assert gts.num_classes == num_classes, "num_classes not match"
+
+    if isinstance(dts_of_models, dict):
+        names = list(dts_of_models.keys())
+        dts_of_models = list(dts_of_models.values())
+    else:
+        names = None
+
+    args = [
+        (i, gts.order(dts), gts, iou_thr, fp_rates, recalls) for i, dts in enumerate(dts_of_models)
+    ]
+    if workers is None or workers <= 1 or len(args) <= 1:
+        results = [_eval_model(arg) for arg in args]
+    else:
+        results = mv.tqdm_imap_unordered(_eval_model, args, workers)
+    results = [result for _, result in sorted(results, key=lambda x: x[0])]
+
+    return results if names is None else OrderedDict(zip(names, results))
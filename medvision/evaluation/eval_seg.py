@@ -0,0 +1,203 @@
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+from natsort import natsorted
+
+import medvision as mv
+
+from .eval_det import _standardize
+
+
+def _load_mask(mask, root_dir=None):
+    """Load a label map given its path (or the label map itself)."""
+    if isinstance(mask, np.ndarray):
+        return mask
+    if root_dir is not None:
+        mask = mv.joinpath(root_dir, mask)
+    assert mv.isfile(mask), "mask file {} does not exist".format(mask)
+    return mv.imread(mask, mv.ImreadMode.UNCHANGED)
+
+
+def confusion_matrix(dt, gt, num_classes):
+    """Compute the confusion matrix of 2 label maps in one np.bincount call.
+
+    Args:
+        dt (ndarray): predicted label map, labels in [0, num_classes).
+        gt (ndarray): ground truth label map of the same shape as dt.
+        num_classes (int): number of classes (background included).
+
+    Returns:
+        (ndarray): confusion matrix of shape (num_classes, num_classes),
+            confusion[i, j] is the number of pixels of label i in gt and
+            label j in dt.
+    """
+    assert dt.shape == gt.shape, "dt and gt must have the same shape"
+    assert (
+        dt.max(initial=0) < num_classes and gt.max(initial=0) < num_classes
+    ), "labels must be in [0, num_classes)"
+
+    index = gt.astype(np.intp).ravel() * num_classes + dt.ravel()
+    counts = np.bincount(index, minlength=num_classes * num_classes)
+
+    return counts.reshape(num_classes, num_classes)
+
+
+def _overlap_metrics(confusion):
+    """Dice and IoU of each label from a confusion matrix, nan if a label is
+    absent in both dt and gt.
+    """
+    tp = np.diag(confusion).astype(np.float64)
+    fp = confusion.sum(axis=0) - tp
+    fn = confusion.sum(axis=1) - tp
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dice = 2 * tp / (2 * tp + fp + fn)
+        iou = tp / (tp + fp + fn)
+
+    return dice, iou
+
+
+def _boundary(mask):
+    """Pixels of a binary mask (uint8) having a background 8-neighbour, pixels
+    outside the mask are considered to be background.
+    """
+    kernel = np.ones((3, 3), dtype=np.uint8)
+    eroded = cv2.erode(mask, kernel, borderType=cv2.BORDER_CONSTANT, borderValue=0)
+    return mask.astype(bool) & ~eroded.astype(bool)
+
+
+def _distances_to(boundary):
+    """Euclidean distance of each pixel to the nearest boundary pixel."""
+    return cv2.distanceTransform((~boundary).astype(np.uint8), cv2.DIST_L2, cv2.DIST_MASK_PRECISE)
+
+
+def surface_distances(dt, gt, spacing=1.0):
+    """Compute Hausdorff distance, its 95th percentile and the average
+    symmetric surface distance (ASSD) between 2 binary masks.
+
+    Distance transforms are only computed within the bounding box of both
+    masks (padded by 1 pixel), instead of the whole image.
+
+    Args:
+        dt (ndarray): predicted binary mask of shape (h, w).
+        gt (ndarray): ground truth binary mask of shape (h, w).
+        spacing (float): pixel spacing, distances are scaled by it.
+
+    Returns:
+        (tuple[float]): Hausdorff distance, 95% Hausdorff distance and ASSD.
+            nan if both masks are empty, inf if only one of them is empty.
+    """
+    dt, gt = dt.astype(bool), gt.astype(bool)
+    if not dt.any() and not gt.any():
+        return np.nan, np.nan, np.nan
+    if not dt.any() or not gt.any():
+        return np.inf, np.inf, np.inf
+
+    # crop the bounding box of both masks
+    ys, xs = np.nonzero(dt | gt)
+    y1, x1 = max(ys.min() - 1, 0), max(xs.min() - 1, 0)
+    y2, x2 = ys.max() + 2, xs.max() + 2
+    dt, gt = dt[y1:y2, x1:x2], gt[y1:y2, x1:x2]
+
+    dt_boundary = _boundary(dt.astype(np.uint8))
+    gt_boundary = _boundary(gt.astype(np.uint8))
+    dt2gt = _distances_to(gt_boundary)[dt_boundary] * spacing
+    gt2dt = _distances_to(dt_boundary)[gt_boundary] * spacing
+
+    hd = max(dt2gt.max(), gt2dt.max())
+    hd95 = max(np.percentile(dt2gt, 95), np.percentile(gt2dt, 95))
+    assd = (dt2gt.sum() + gt2dt.sum()) / (len(dt2gt) + len(gt2dt))
+
+    return float(hd), float(hd95), float(assd)
+
+
+def _eval_seg_image(args):
+    index, dt, gt, num_classes, surface, spacing, root_dir = args
+    dt, gt = _load_mask(dt, root_dir), _load_mask(gt, root_dir)
+
+    result = OrderedDict()
+    result["confusion_matrix"] = confusion_matrix(dt, gt, num_classes)
+    result["dice"], result["iou"] = _overlap_metrics(result["confusion_matrix"])
+    if surface:
+        distances = [
+            surface_distances(dt == label, gt == label, spacing) for label in range(1, num_classes)
+        ]
+        distances = np.array([(np.nan,) * 3] + distances, dtype=np.float64)
+        result["hausdorff"], result["hausdorff95"], result["assd"] = distances.T
+
+    return index, result
+
+
+def _nanmean(values):
+    # mean over images where a metric is defined (not nan)
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.sum(np.where(valid, values, 0), axis=0) / np.sum(valid, axis=0)
+
+
+def eval_seg(dts, gts, num_classes=2, surface=False, spacing=1.0, root_dir=None, workers=None):
+    """Evaluate segmentation results (label maps) by comparing DT with GT.
+
+    Mask pairs are loaded and evaluated one by one (by a process pool if
+    workers > 1), so masks of the whole dataset are never held in memory.
+
+    Args:
+        dts (dict or list): predicted label maps, a seg dsmd (e.g. loaded
+            by 'load_seg_dsmd') mapping images to mask paths, or a list of
+            mask paths. Label maps (ndarray) are also accepted.
+        gts (dict or list): ground truth label maps, in the same format as
+            dts.
+        num_classes (int): number of classes, background (label 0)
+            included. Pixels of a label map are in [0, num_classes).
+        surface (bool): whether to compute surface distances (Hausdorff
+            distance, 95% Hausdorff distance and ASSD) of foreground labels.
+        spacing (float): pixel spacing used to scale surface distances.
+        root_dir (str or None): directory that relative mask paths are
+            relative to.
+        workers (int or None): number of processes used to evaluate images.
+            If None or 1, images are evaluated in current process.
+
+    Returns:
+        (OrderedDict): results[label] contains 'dice' and 'iou' (averaged
+        over images where the label is present in dt or gt), 'global_dice'
+        and 'global_iou' (from the confusion matrix of the whole dataset),
+        and surface distances averaged over images (if surface is True,
+        inf if a label is missed in an image). results['confusion_matrix']
+        is the confusion matrix of the whole dataset. results['per_image']
+        contains the metrics of each image.
+    """
+    keys = natsorted(gts.keys()) if isinstance(gts, dict) else range(len(gts))
+    dts, gts = _standardize(dts, gts)
+
+    args = [
+        (i, dt, gt, num_classes, surface, spacing, root_dir)
+        for i, (dt, gt) in enumerate(zip(dts, gts))
+    ]
+    if workers is None or workers <= 1:
+        image_results = [_eval_seg_image(arg) for arg in args]
+    else:
+        image_results = mv.tqdm_imap_unordered(_eval_seg_image, args, workers)
+    image_results = [result for _, result in sorted(image_results, key=lambda x: x[0])]
+
+    confusion = np.zeros((num_classes, num_classes), dtype=np.int64)
+    for result in image_results:
+        confusion += result["confusion_matrix"]
+    global_dice, global_iou = _overlap_metrics(confusion)
+
+    metrics = ["dice", "iou"] + (["hausdorff", "hausdorff95", "assd"] if surface else [])
+    means = {m: _nanmean([r[m] for r in image_results]) for m in metrics}
+
+    results = OrderedDict()
+    for label in range(num_classes):
+        results[label] = OrderedDict()
+        results[label]["dice"] = means["dice"][label]
+        results[label]["iou"] = means["iou"][label]
+        results[label]["global_dice"] = global_dice[label]
+        results[label]["global_iou"] = global_iou[label]
+        for m in metrics[2:]:
+            results[label][m] = means[m][label]
+    results["confusion_matrix"] = confusion
+    results["per_image"] = OrderedDict(zip(keys, image_results))
+
+    return results
@@ -0,0 +1,143 @@
+import hashlib
+
+import numpy as np
+
+import medvision as mv
+
+from .match_det import match_labels
+
+
+class MatchCache:
+    """Persistent cache of per-image matching results.
+
+    An entry is keyed by a hash of the detections and ground truths of an
+    image (for a specific label) and the IoU thresholds, so only images
+    whose detections or ground truths changed are matched again.
+
+    Example:
+    >>> cache = mv.MatchCache("match_cache.npz")  # loaded if it exists
+    >>> results = mv.eval_det(dts, gts, iou_thr=0.5, cache=cache)
+    >>> cache.prune()  # drop entries not used since loaded
+    >>> cache.save()
+
+    Args:
+        path (str or None): path of the cache file (.npz). If it exists, the
+            cache is loaded from it.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        self.used = set()
+        self.num_hits = 0
+        self.num_misses = 0
+        if path is not None and mv.isfile(path):
+            self.load(path)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    @staticmethod
+    def image_key(dt, gt, iou_thrs):
+        """Hash of the detections and ground truths of an image.
+
+        Args:
+            dt (ndarray): detected bounding boxes of shape (n, 5).
+            gt (ndarray): ground truth bounding boxes of shape (m, 4).
+            iou_thrs (list[float]): IoU thresholds.
+
+        Returns:
+            (str): hex digest.
+        """
+        h = hashlib.blake2b(digest_size=16)
+        for array in (dt, gt):
+            array = np.ascontiguousarray(array)
+            h.update(str((array.dtype.str, array.shape)).encode())
+            h.update(array.data)
+        h.update(np.asarray(iou_thrs, dtype=np.float64).tobytes())
+
+        return h.hexdigest()
+
+    def match_labels(self, dts, gts, num_classes, iou_thrs, workers=None):
+        """Same as 'match_labels', but only images missing in the cache are
+        matched, and their results are added to the cache.
+        """
+        keys = [
+            [self.image_key(dt[label], gt[label], iou_thrs) for label in range(num_classes)]
+            for dt, gt in zip(dts, gts)
+        ]
+        misses = [i for i, image_keys in enumerate(keys) if not all(k in self for k in image_keys)]
+        self.num_misses += len(misses)
+        self.num_hits += len(keys) - len(misses)
+
+        # match images missing in the cache in one batch
+        if len(misses) != 0:
+            miss_dts, miss_gts = [dts[i] for i in misses], [gts[i] for i in misses]
+            matches = match_labels(miss_dts, miss_gts, num_classes, iou_thrs, workers)
+            for label, (tps, scores, _) in enumerate(matches):
+                num_dets = np.array([len(dt[label]) for dt in miss_dts], dtype=np.int64)
+                ends = np.cumsum(num_dets)
+                for i, start, end in zip(misses, ends - num_dets, ends):
+                    self.entries[keys[i][label]] = (tps[:, start:end].copy(), scores[start:end])
+
+        results = []
+        for label in range(num_classes):
+            entries = [self.entries[image_keys[label]] for image_keys in keys]
+            self.used.update(image_keys[label] for image_keys in keys)
+            tps = np.zeros((len(iou_thrs), 0), dtype=bool)
+            if len(entries) != 0:
+                tps = np.concatenate([tps] + [t for t, _ in entries], axis=1)
+            score_dtype = np.result_type(np.float32, *[s.dtype for _, s in entries if len(s)])
+            scores = np.zeros((tps.shape[1],), dtype=score_dtype)
+            if tps.shape[1] != 0:
+                scores[:] = np.concatenate([s for _, s in entries if len(s)])
+            num_anns = float(sum(len(gt[label]) for gt in gts))
+            results.append((tps, scores, num_anns))
+
+        return results
+
+    def prune(self):
+        """Remove entries not used since the cache was created or loaded."""
+        self.entries = {k: v for k, v in self.entries.items() if k in self.used}
+
+    def load(self, path):
+        """Load entries from a cache file saved by 'save()'."""
+        with np.load(path) as data:
+            keys = data["keys"].tolist()
+            num_thrs, num_dets = data["num_thrs"], data["num_dets"]
+            tps, scores, score_dtypes = data["tps"], data["scores"], data["score_dtypes"]
+
+        tps_ends = np.cumsum(num_thrs * num_dets)
+        score_ends = np.cumsum(num_dets)
+        for i, key in enumerate(keys):
+            tps_end, score_end = tps_ends[i], score_ends[i]
+            tps_start, score_start = tps_end - num_thrs[i] * num_dets[i], score_end - num_dets[i]
+            self.entries[key] = (
+                tps[tps_start:tps_end].reshape(num_thrs[i], num_dets[i]),
+                scores[score_start:score_end].astype(score_dtypes[i]),
+            )
+
+    def save(self, path=None):
+        """Save entries to a cache file (.npz).
+
+        Args:
+            path (str or None): path of the cache file. If None, the path
+                given at creation is used.
+        """
+        path = self.path if path is None else path
+        assert path is not None, "path of the cache file is not given"
+
+        entries = list(self.entries.values())
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                keys=np.array(list(self.entries.keys()), dtype="U32"),
+                num_thrs=np.array([len(t) for t, _ in entries], dtype=np.int64),
+                num_dets=np.array([len(s) for _, s in entries], dtype=np.int64),
+                tps=np.concatenate([np.zeros((0,), bool)] + [t.ravel() for t, _ in entries]),
+                scores=np.concatenate([np.zeros((0,))] + [s for _, s in entries]),
+                score_dtypes=np.array([s.dtype.str for _, s in entries], dtype="U8"),
+            )
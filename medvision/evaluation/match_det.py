@@ -0,0 +1,329 @@
+import math
+
+import numpy as np
+
+import medvision as mv
+
+from .compute_overlap import compute_overlap, compute_overlap_batched, compute_overlap_sparse
+
+# overlaps of an image with more (dt, gt) pairs are computed in sparse format
+SPARSE_OVERLAP_MIN_PAIRS = 1 << 20
+# max number of (dt, gt) pairs of images whose overlaps are computed at once
+MAX_BATCH_PAIRS = 1 << 21
+
+
+def find_max_overlaps(dt, gt):
+    """Find the best overlapping ground truth of each detection.
+
+    Small images use the dense overlap matrix. Images with lots of boxes use
+    the sparse one, which only holds intersecting pairs. Both give the same
+    results as np.argmax over the dense matrix.
+
+    Args:
+        dt (ndarray): detected bounding boxes of shape (n, 4) or (n, 5).
+        gt (ndarray): ground truth bounding boxes of shape (m, 4), m > 0.
+
+    Returns:
+        (ndarray): index of the best overlapping ground truth of shape (n,).
+        (ndarray): max overlap of each detection of shape (n,).
+    """
+    dt, gt = dt.astype(np.float32), gt.astype(np.float32)
+    if len(dt) * len(gt) < SPARSE_OVERLAP_MIN_PAIRS:
+        overlaps = compute_overlap(dt, gt)
+        matched_anns = np.argmax(overlaps, axis=1)
+        return matched_anns, overlaps[np.arange(len(dt)), matched_anns]
+
+    indptr, indices, overlaps = compute_overlap_sparse(dt, gt)
+    counts = np.diff(indptr)
+    rows = np.repeat(np.arange(len(dt)), counts)
+
+    # detections without any intersecting ground truth match the 1st one
+    matched_anns = np.zeros((len(dt),), dtype=np.int64)
+    max_overlaps = np.zeros((len(dt),), dtype=overlaps.dtype)
+    if len(overlaps) == 0:
+        return matched_anns, max_overlaps
+
+    nonempty = counts > 0
+    max_overlaps[nonempty] = np.maximum.reduceat(overlaps, indptr[:-1][nonempty])
+    # column indices are sorted, so the 1st max of a row has the smallest index
+    candidates = np.flatnonzero(overlaps == max_overlaps[rows])
+    _, first = np.unique(rows[candidates], return_index=True)
+    matched_anns[rows[candidates[first]]] = indices[candidates[first]]
+
+    return matched_anns, max_overlaps
+
+
+def match_image(dt, gt, iou_thrs):
+    """Match detections of an image (for a specific label) with ground truths.
+
+    Detections are visited in descending score order. A detection is a true
+    positive if its best overlapping ground truth has IoU > threshold and has
+    not been taken by a higher scored detection yet.
+
+    Args:
+        dt (ndarray): detected bounding boxes of shape (n, 5).
+        gt (ndarray): ground truth bounding boxes of shape (m, 4).
+        iou_thrs (list[float]): thresholds to determine whether a detection
+            is positive or negative. The overlaps are computed only once
+            and matched against all the thresholds.
+
+    Returns:
+        (ndarray): true positive flags of shape (len(iou_thrs), n), in score
+            order.
+        (ndarray): detection scores of shape (n,), in score order.
+    """
+    dt = dt[np.argsort(-dt[:, -1])]
+    tps = np.zeros((len(iou_thrs), len(dt)), dtype=bool)
+    if len(dt) == 0 or len(gt) == 0:
+        return tps, dt[:, -1]
+
+    matched_anns, overlaps = find_max_overlaps(dt, gt)
+
+    tps[:] = _assign(matched_anns, overlaps, len(gt), iou_thrs)
+
+    return tps, dt[:, -1]
+
+
+def _assign(matched_anns, max_overlaps, num_gts, iou_thrs):
+    """Greedily assign ground truths to detections sorted by descending score.
+
+    Args:
+        matched_anns (ndarray): index of the best overlapping ground truth of
+            each detection, in [0, num_gts).
+        max_overlaps (ndarray): max overlap of each detection.
+        num_gts (int): number of ground truths.
+        iou_thrs (list[float]): refer to 'match_image'.
+
+    Returns:
+        (ndarray): true positive flags of shape (len(iou_thrs), n).
+    """
+    num_dts = len(matched_anns)
+    tps = np.zeros((len(iou_thrs), num_dts), dtype=bool)
+
+    # a ground truth is taken by the 1st (highest scored) candidate choosing
+    # it, (threshold, ground truth) pairs are encoded to handle all thresholds
+    iou_thrs = np.asarray(iou_thrs, dtype=max_overlaps.dtype)
+    candidates = np.flatnonzero(max_overlaps > iou_thrs[:, None])
+    thr_ids, dt_ids = np.divmod(candidates, num_dts)
+    _, first = np.unique(thr_ids * num_gts + matched_anns[dt_ids], return_index=True)
+    tps[thr_ids[first], dt_ids[first]] = True
+
+    return tps
+
+
+def _ragged_arange(starts, counts):
+    """Concatenate np.arange(start, start + count) of each (start, count)."""
+    ends = np.cumsum(counts)
+    return np.arange(ends[-1] if len(ends) else 0) + np.repeat(starts - ends + counts, counts)
+
+
+def _batched_max_overlaps(dt_boxes, dt_offsets, gt_boxes, gt_offsets, gt_areas, img_ids):
+    """'find_max_overlaps' of several images (having both dts and gts) at once.
+
+    Returns:
+        (ndarray): indices of detections (in dt_boxes) of the images.
+        (ndarray): index (in gt_boxes) of the best overlapping ground truth
+            of each detection.
+        (ndarray): max overlap of each detection.
+    """
+    num_dets = dt_offsets[img_ids + 1] - dt_offsets[img_ids]
+    num_gts = gt_offsets[img_ids + 1] - gt_offsets[img_ids]
+    dt_ids = _ragged_arange(dt_offsets[img_ids], num_dets)
+    gt_ids = _ragged_arange(gt_offsets[img_ids], num_gts)
+    sub_dt_offsets = np.concatenate([[0], np.cumsum(num_dets)])
+    sub_gt_offsets = np.concatenate([[0], np.cumsum(num_gts)])
+    overlaps, offsets = compute_overlap_batched(
+        dt_boxes[dt_ids], sub_dt_offsets, gt_boxes[gt_ids], sub_gt_offsets, area_b=gt_areas[gt_ids]
+    )
+
+    # each detection is a row of overlaps in the (n_i, m_i) block of its image
+    row_imgs = np.repeat(np.arange(len(img_ids)), num_dets)
+    row_lens = num_gts[row_imgs]
+    row_starts = offsets[row_imgs] + (np.arange(len(dt_ids)) - sub_dt_offsets[row_imgs]) * row_lens
+    max_overlaps = np.maximum.reduceat(overlaps, row_starts)
+
+    # the 1st max of a row, as np.argmax does
+    row_ids = np.repeat(np.arange(len(dt_ids)), row_lens)
+    candidates = np.flatnonzero(overlaps == max_overlaps[row_ids])
+    _, first = np.unique(row_ids[candidates], return_index=True)
+    matched_anns = candidates[first] - row_starts + sub_gt_offsets[row_imgs]
+
+    return dt_ids, gt_ids[matched_anns], max_overlaps
+
+
+def gather_gts(gts, label):
+    """Gather ground truths of a specific label in all images into flat arrays.
+
+    Args:
+        gts (list[list[ndarray]]): ground truth bounding boxes, refer to
+            'eval_det'.
+        label (int): label to be gathered.
+
+    Returns:
+        (ndarray): ground truth bounding boxes of shape (m, 4) (float32).
+        (ndarray): offsets of images of shape (len(gts) + 1,), boxes of the
+            i-th image are boxes[offsets[i]:offsets[i + 1]].
+        (ndarray): areas of the bounding boxes of shape (m,).
+    """
+    gts = [gt[label] for gt in gts]
+    num_gts = np.array([len(gt) for gt in gts], dtype=np.int64)
+    gt_offsets = np.concatenate([[0], np.cumsum(num_gts)])
+    gt_boxes = np.zeros((gt_offsets[-1], 4), dtype=np.float32)
+    if gt_offsets[-1] != 0:
+        gt_boxes[:] = np.concatenate([gt[:, :4] for gt in gts if len(gt)])
+    gt_areas = (gt_boxes[:, 2] - gt_boxes[:, 0] + 1) * (gt_boxes[:, 3] - gt_boxes[:, 1] + 1)
+
+    return gt_boxes, gt_offsets, gt_areas
+
+
+def match_label(dts, gts, label, iou_thrs, gathered_gts=None, return_areas=False):
+    """Match detections with ground truths of a specific label in all images.
+
+    Args:
+        dts (list[list[ndarray]]): detected bounding boxes, refer to 'eval_det'.
+        gts (list[list[ndarray]] or None): ground truth bounding boxes, refer
+            to 'eval_det'. Ignored if gathered_gts is given.
+        label (int): label to be matched.
+        iou_thrs (list[float]): refer to 'match_image'.
+        gathered_gts (tuple or None): ground truths of the label returned by
+            'gather_gts', which can be shared by several calls.
+        return_areas (bool): whether to return areas of detections and of
+            their best overlapping ground truths.
+
+    Returns:
+        (ndarray): true positive flags of all the detections, of shape
+            (len(iou_thrs), n). Detections are ordered by image, then by
+            descending score within an image.
+        (ndarray): detection scores, in the same order as true positive flags.
+        (float): number of ground truth bounding boxes.
+        (ndarray): areas of detections, only if return_areas is True.
+        (ndarray): areas of the best overlapping ground truths of detections
+            (nan if there is no ground truth in an image), only if
+            return_areas is True.
+    """
+    if gathered_gts is None:
+        gathered_gts = gather_gts(gts, label)
+    gt_boxes, gt_offsets, gt_areas = gathered_gts
+    assert len(gt_offsets) == len(dts) + 1, "dts and gts must have the same length"
+
+    dts = [dt[label] for dt in dts]
+    num_dets = np.array([len(dt) for dt in dts], dtype=np.int64)
+    num_gts = np.diff(gt_offsets)
+    dt_offsets = np.concatenate([[0], np.cumsum(num_dets)])
+
+    # gather boxes and scores of all images into flat buffers
+    score_dtype = np.result_type(np.float32, *[dt.dtype for dt in dts if len(dt)])
+    scores = np.zeros((dt_offsets[-1],), dtype=score_dtype)
+    dt_boxes = np.zeros((dt_offsets[-1], 4), dtype=np.float32)
+    if dt_offsets[-1] != 0:
+        scores[:] = np.concatenate([dt[:, -1] for dt in dts if len(dt)])
+        dt_boxes[:] = np.concatenate([dt[:, :4] for dt in dts if len(dt)])
+
+    # sort detections of each image by descending score. Images having tied
+    # scores are sorted one by one to keep the same order as 'match_image'
+    img_ids = np.repeat(np.arange(len(dts)), num_dets)
+    indices = np.lexsort((-scores, img_ids))
+    ties = (np.diff(img_ids) == 0) & (np.diff(scores[indices]) == 0)
+    for i in np.unique(img_ids[1:][ties]):
+        start, end = dt_offsets[i], dt_offsets[i + 1]
+        indices[start:end] = start + np.argsort(-dts[i][:, -1])
+    scores, dt_boxes = scores[indices], dt_boxes[indices]
+
+    # detections of images without gt keep max overlap -inf (false positive)
+    matched_anns = np.zeros((len(scores),), dtype=np.int64)
+    max_overlaps = np.full((len(scores),), -np.inf, dtype=np.float32)
+
+    # images with lots of boxes are matched one by one (in sparse format)
+    num_pairs = num_dets * num_gts
+    large = (num_pairs >= SPARSE_OVERLAP_MIN_PAIRS) & (num_pairs > 0)
+    for i in np.flatnonzero(large):
+        start, end = dt_offsets[i], dt_offsets[i + 1]
+        gt_start, gt_end = gt_offsets[i], gt_offsets[i + 1]
+        matched_anns[start:end], max_overlaps[start:end] = find_max_overlaps(
+            dt_boxes[start:end], gt_boxes[gt_start:gt_end]
+        )
+        matched_anns[start:end] += gt_start
+
+    # other images are matched in batches
+    small = np.flatnonzero(~large & (num_pairs > 0))
+    ends = np.cumsum(num_pairs[small])
+    start = 0
+    while start < len(small):
+        offset = ends[start - 1] if start > 0 else 0
+        end = max(np.searchsorted(ends, offset + MAX_BATCH_PAIRS, side="right"), start + 1)
+        dt_ids, matched, overlaps = _batched_max_overlaps(
+            dt_boxes, dt_offsets, gt_boxes, gt_offsets, gt_areas, small[start:end]
+        )
+        matched_anns[dt_ids], max_overlaps[dt_ids] = matched, overlaps
+        start = end
+
+    tps = _assign(matched_anns, max_overlaps, gt_offsets[-1], iou_thrs)
+
+    if not return_areas:
+        return tps, scores, float(gt_offsets[-1])
+
+    dt_areas = (dt_boxes[:, 2] - dt_boxes[:, 0] + 1) * (dt_boxes[:, 3] - dt_boxes[:, 1] + 1)
+    matched_areas = np.full((len(scores),), np.nan, dtype=gt_areas.dtype)
+    has_gts = num_gts[img_ids] > 0
+    matched_areas[has_gts] = gt_areas[matched_anns[has_gts]]
+
+    return tps, scores, float(gt_offsets[-1]), dt_areas, matched_areas
+
+
+def _match_chunk(args):
+    chunk_id, dts, gts, num_classes, iou_thrs, return_areas = args
+    return chunk_id, [
+        match_label(dts, gts, label, iou_thrs, return_areas=return_areas)
+        for label in range(num_classes)
+    ]
+
+
+def match_labels(
+    dts, gts, num_classes, iou_thrs, workers=None, chunks_per_worker=4, return_areas=False
+):
+    """Match detections with ground truths of all labels in all images.
+
+    Args:
+        dts (list[list[ndarray]]): detected bounding boxes, refer to 'eval_det'.
+        gts (list[list[ndarray]]): ground truth bounding boxes, refer to
+            'eval_det'.
+        num_classes (int): number of classes to detect.
+        iou_thrs (list[float]): refer to 'match_image'.
+        workers (int or None): number of processes used to match images.
+            If None or 1, images are matched in current process.
+        chunks_per_worker (int): images are split into
+            `workers * chunks_per_worker` chunks to balance the workload.
+        return_areas (bool): refer to 'match_label'.
+
+    Returns:
+        (list[tuple]): results of 'match_label' for each label. Results are
+            independent of the number of workers.
+    """
+    if workers is None or workers <= 1 or len(gts) == 0:
+        return [
+            match_label(dts, gts, label, iou_thrs, return_areas=return_areas)
+            for label in range(num_classes)
+        ]
+
+    chunk_size = math.ceil(len(gts) / (workers * chunks_per_worker))
+    args = []
+    for chunk_id, start in enumerate(range(0, len(gts), chunk_size)):
+        end = start + chunk_size
+        args.append((chunk_id, dts[start:end], gts[start:end], num_classes, iou_thrs, return_areas))
+    chunk_results = mv.tqdm_imap_unordered(_match_chunk, args, workers)
+
+    # merge results of chunks in image order to keep output deterministic
+    chunk_results = [result for _, result in sorted(chunk_results, key=lambda x: x[0])]
+    results = []
+    for label in range(num_classes):
+        label_results = [result[label] for result in chunk_results]
+        tps = np.concatenate([r[0] for r in label_results], axis=1)
+        scores = np.concatenate([r[1] for r in label_results])
+        num_anns = sum(r[2] for r in label_results)
+        # areas of detections and matched ground truths (if returned)
+        areas = [
+            np.concatenate([r[i] for r in label_results]) for i in range(3, len(label_results[0]))
+        ]
+        results.append((tps, scores, num_anns, *areas))
+
+    return results
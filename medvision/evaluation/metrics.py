@@ -0,0 +1,132 @@
+"""Sort-based ROC / PR kernels.
+
+Outputs are the same as those of sklearn.metrics (binary case without
+sample weights), so that sklearn is not needed at import time.
+"""
+
+import numpy as np
+
+
+def _binary_clf_curve(y_true, y_score, pos_label=1):
+    """Count false positives and true positives at each distinct score.
+
+    Args:
+        y_true (array-like): labels of samples.
+        y_score (array-like): scores of samples.
+        pos_label (int or bool): label of the positive class.
+
+    Returns:
+        (ndarray): false positives (float64) at each threshold.
+        (ndarray): true positives (float64) at each threshold.
+        (ndarray): thresholds (distinct scores) in descending order.
+    """
+    y_true = np.asarray(y_true).ravel() == pos_label
+    y_score = np.asarray(y_score).ravel()
+    assert len(y_true) == len(y_score), "y_true and y_score must have the same length"
+
+    indices = np.argsort(y_score, kind="mergesort")[::-1]
+    y_score, y_true = y_score[indices], y_true[indices]
+
+    # the last sample of each group of tied scores
+    threshold_idxs = np.r_[np.flatnonzero(np.diff(y_score)), len(y_true) - 1]
+    tps = np.cumsum(y_true, dtype=np.float64)[threshold_idxs]
+    fps = 1 + threshold_idxs.astype(np.float64) - tps
+
+    return fps, tps, y_score[threshold_idxs]
+
+
+def roc_curve(y_true, y_score, pos_label=1, drop_intermediate=True):
+    """Compute Receiver Operating Characteristic (ROC) curve.
+
+    Args:
+        y_true (array-like): labels of samples.
+        y_score (array-like): scores of samples.
+        pos_label (int or bool): label of the positive class.
+        drop_intermediate (bool): whether to drop thresholds which are not
+            corners of the ROC curve.
+
+    Returns:
+        (ndarray): false positive rates, nan if there is no negative sample.
+        (ndarray): true positive rates, nan if there is no positive sample.
+        (ndarray): thresholds in descending order, the 1st one is inf.
+    """
+    fps, tps, thresholds = _binary_clf_curve(y_true, y_score, pos_label)
+
+    if drop_intermediate and len(fps) > 2:
+        corners = np.r_[True, np.logical_or(np.diff(fps, 2), np.diff(tps, 2)), True]
+        fps, tps, thresholds = fps[corners], tps[corners], thresholds[corners]
+
+    # make sure that the curve starts at (0, 0)
+    fps, tps = np.r_[0.0, fps], np.r_[0.0, tps]
+    thresholds = np.r_[np.inf, thresholds.astype(np.float64)]
+
+    fpr = fps / fps[-1] if fps[-1] > 0 else np.full(fps.shape, np.nan)
+    tpr = tps / tps[-1] if tps[-1] > 0 else np.full(tps.shape, np.nan)
+
+    return fpr, tpr, thresholds
+
+
+def auc(x, y):
+    """Compute area under a curve by the trapezoidal rule.
+
+    Args:
+        x (array-like): x coordinates, either increasing or decreasing.
+        y (array-like): y coordinates.
+
+    Returns:
+        (float): area under the curve.
+    """
+    x, y = np.asarray(x, dtype=np.float64).ravel(), np.asarray(y, dtype=np.float64).ravel()
+    if len(x) < 2:
+        raise ValueError("at least 2 points are needed to compute area under curve")
+
+    direction = 1
+    dx = np.diff(x)
+    if np.any(dx < 0):
+        if np.all(dx <= 0):
+            direction = -1
+        else:
+            raise ValueError("x is neither increasing nor decreasing: {}".format(x))
+
+    return float(direction * np.sum(dx * (y[1:] + y[:-1]) / 2.0))
+
+
+def roc_auc_score(y_true, y_score, pos_label=1):
+    """Compute area under the ROC curve.
+
+    Args:
+        y_true (array-like): labels of samples.
+        y_score (array-like): scores of samples.
+        pos_label (int or bool): label of the positive class.
+
+    Returns:
+        (float): ROC AUC, nan if only one class is present in y_true.
+    """
+    fpr, tpr, _ = roc_curve(y_true, y_score, pos_label)
+    if np.isnan(fpr[-1]) or np.isnan(tpr[-1]):
+        return np.nan
+
+    return auc(fpr, tpr)
+
+
+def precision_recall_curve(y_true, y_score, pos_label=1):
+    """Compute precision-recall pairs for different thresholds.
+
+    Args:
+        y_true (array-like): labels of samples.
+        y_score (array-like): scores of samples.
+        pos_label (int or bool): label of the positive class.
+
+    Returns:
+        (ndarray): precisions, the last one is 1.
+        (ndarray): recalls in descending order, the last one is 0. Recalls
+            are 1 if there is no positive sample.
+        (ndarray): thresholds in ascending order.
+    """
+    fps, tps, thresholds = _binary_clf_curve(y_true, y_score, pos_label)
+
+    ps = tps + fps
+    precision = np.where(ps != 0, tps / np.where(ps != 0, ps, 1), 0.0)
+    recall = np.ones_like(tps) if tps[-1] == 0 else tps / tps[-1]
+
+    return np.r_[precision[::-1], 1.0], np.r_[recall[::-1], 0.0], thresholds[::-1]
@@ -0,0 +1,59 @@
+import numpy as np
+
+# false positives per image of the default operating points, i.e. 0.1 ~ 1.0
+DEFAULT_FP_RATES = np.array(range(10)) * 0.1 + 0.1
+
+
+def find_operating_points(fps, recall, precision, scores, fp_rates=None, recalls=None):
+    """Find operating points on a FROC/PR curve by binary search.
+
+    The curve is described by cumulative arrays computed at retrieval
+    cutoff of k bboxes (k in [1, n]), i.e. scores are in descending order,
+    fps and recall are non-decreasing.
+
+    Args:
+        fps (ndarray): average number of false positives per image.
+        recall (ndarray): recall (sensitivity).
+        precision (ndarray): precision.
+        scores (ndarray): detection scores in descending order.
+        fp_rates (Iterable or None): target numbers of false positives per
+            image. The operating point of rate r is the last cutoff with
+            fps < r, provided that fps reaches r at the next cutoff.
+            If None, 0.1, 0.2, ..., 1.0 are used.
+        recalls (Iterable or None): target recalls. The operating point of
+            recall r is the first cutoff with recall >= r.
+
+    Returns:
+        (dict): operating points keyed by 'fp-<rate>' or 'recall-<recall>',
+        each one is a dict containing 'thr', 'recall', 'precision' and
+        'fps'. Unreachable targets are omitted.
+    """
+    fp_rates = DEFAULT_FP_RATES if fp_rates is None else np.asarray(fp_rates, dtype=np.float64)
+    recalls = np.zeros((0,)) if recalls is None else np.asarray(recalls, dtype=np.float64)
+
+    results = {}
+
+    indices = np.searchsorted(fps, fp_rates, side="left") - 1
+    for rate, i in zip(fp_rates, indices):
+        if 0 <= i < len(fps) - 1:
+            results["fp-" + str(round(float(rate), 6))] = _operating_point(
+                fps, recall, precision, scores, i
+            )
+
+    indices = np.searchsorted(recall, recalls, side="left")
+    for target, i in zip(recalls, indices):
+        if i < len(recall):
+            results["recall-" + str(round(float(target), 6))] = _operating_point(
+                fps, recall, precision, scores, i
+            )
+
+    return results
+
+
+def _operating_point(fps, recall, precision, scores, i):
+    return {
+        "thr": scores[i],
+        "recall": recall[i],
+        "precision": precision[i],
+        "fps": fps[i],
+    }
@@ -1,21 +1,10 @@
 # flake8: noqa
+from .._lazy import attach as _attach
 
-from .io import ImreadMode, imread, imwrite
-from .transforms import (
-    center_crop,
-    crop,
-    denormalize_image,
-    gray2rgb,
-    hflip,
-    imadjust,
-    normalize_image,
-    pad_to_square,
-    rescale,
-    resize,
-    rgb2gray,
-    rot90,
-    rotate,
-    vflip,
+__getattr__, __dir__, __all__ = _attach(
+    __name__,
+    {
+        "io": ["ImreadMode", "imread", "imwrite"],
+        "transforms": None,
+    },
 )
-
-__all__ = [k for k in globals().keys() if not k.startswith("_")]
@@ -1,7 +1,21 @@
 # flake8: noqa
+from ..._lazy import attach as _attach
 
-from .colorspace import gray2rgb, rgb2gray
-from .geometry import center_crop, crop, hflip, pad_to_square, rescale, resize, rot90, rotate, vflip
-from .normalize import denormalize_image, imadjust, normalize_image
-
-__all__ = [k for k in globals().keys() if not k.startswith("_")]
+__getattr__, __dir__, __all__ = _attach(
+    __name__,
+    {
+        "colorspace": ["gray2rgb", "rgb2gray"],
+        "geometry": [
+            "center_crop",
+            "crop",
+            "hflip",
+            "pad_to_square",
+            "rescale",
+            "resize",
+            "rot90",
+            "rotate",
+            "vflip",
+        ],
+        "normalize": ["denormalize_image", "imadjust", "normalize_image"],
+    },
+)
@@ -1,5 +1,4 @@
 # flake8: noqa
+from .._lazy import attach as _attach
 
-from .download import download_url
-
-__all__ = [k for k in globals().keys() if not k.startswith("_")]
+__getattr__, __dir__, __all__ = _attach(__name__, {"download": ["download_url"]})
@@ -1,33 +1,37 @@
 # flake8: noqa
+from .._lazy import attach as _attach
 
-from .encryption import decrypt, decrypt_to_file_object, encrypt
-from .fileutil import (
-    GlobMode,
-    abspath,
-    basename,
-    change_suffix,
-    copyfiles,
-    cp,
-    cptree,
-    empty_dir,
-    filetitle,
-    find_duplicated_files,
-    glob,
-    isdir,
-    isfile,
-    joinpath,
-    listdir_natsorted,
-    mkdirs,
-    move,
-    non_overwrite_cp,
-    parentdir,
-    rm,
-    rmtree,
-    splitext,
-    symlink,
+__getattr__, __dir__, __all__ = _attach(
+    __name__,
+    {
+        "encryption": ["decrypt", "decrypt_to_file_object", "encrypt"],
+        "fileutil": [
+            "GlobMode",
+            "abspath",
+            "basename",
+            "change_suffix",
+            "copyfiles",
+            "cp",
+            "cptree",
+            "empty_dir",
+            "filetitle",
+            "find_duplicated_files",
+            "glob",
+            "isdir",
+            "isfile",
+            "joinpath",
+            "listdir_natsorted",
+            "mkdirs",
+            "move",
+            "non_overwrite_cp",
+            "parentdir",
+            "rm",
+            "rmtree",
+            "splitext",
+            "symlink",
+        ],
+        "multiprocessutil": ["tqdm_imap_unordered"],
+        "timer": ["Timer"],
+        "typeutil": ["isarrayinstance"],
+    },
 )
-from .multiprocessutil import tqdm_imap_unordered
-from .timer import Timer
-from .typeutil import isarrayinstance
-
-__all__ = [k for k in globals().keys() if not k.startswith("_")]
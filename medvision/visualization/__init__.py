@@ -1,7 +1,11 @@
 # flake8: noqa
+from .._lazy import attach as _attach
 
-from .draw_curve import draw_froc_curve, draw_pr_curve, draw_roc_curve
-from .image import Color, imshow, imshow_bboxes, imshow_dynamic
-from .plot_rws import plot_rws
-
-__all__ = [k for k in globals().keys() if not k.startswith("_")]
+__getattr__, __dir__, __all__ = _attach(
+    __name__,
+    {
+        "draw_curve": ["draw_froc_curve", "draw_pr_curve", "draw_roc_curve"],
+        "image": ["Color", "imshow", "imshow_bboxes", "imshow_dynamic"],
+        "plot_rws": ["plot_rws"],
+    },
+)
@@ -2,9 +2,10 @@ from typing import Optional, Sequence
 
 import matplotlib.pyplot as plt
 import numpy as np
-import sklearn
 from matplotlib.ticker import FixedFormatter
 
+from medvision.evaluation.metrics import auc
+
 
 def draw_froc_curve(average_fps, sensitivity, save_path=None, bLogPlot=True, **kwargs):
     """Plot the FROC curve.
@@ -46,7 +47,7 @@ def draw_froc_curve(average_fps, sensitivity, save_path=None, bLogPlot=True, **k
 
 
 def draw_roc_curve(fpr: Sequence[float], tpr: Sequence[float], save_path: Optional[str] = None):
-    roc_auc = sklearn.metrics.auc(fpr, tpr)
+    roc_auc = auc(fpr, tpr)
     plt.figure()
     plt.plot(fpr, tpr, color="darkorange", lw=2, label="ROC curve (auc = %0.4f)" % roc_auc)
     plt.plot([0, 1], [0, 1], color="navy", lw=2, linestyle="--")
@@ -68,7 +69,7 @@ def draw_roc_curve(fpr: Sequence[float], tpr: Sequence[float], save_path: Option
 def draw_pr_curve(
     precision: Sequence[float], recall: Sequence[float], save_path: Optional[str] = None
 ):
-    pr_auc = sklearn.metrics.auc(precision, recall)
+    pr_auc = auc(precision, recall)
     plt.figure()
     plt.plot(
         recall,
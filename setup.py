@@ -23,7 +23,6 @@ REQUIRED = [
     "pillow",
     "pycryptodome",
     "pydicom",
-    "scikit-learn",
     "SimpleITK",
     "tqdm",
 ]
@@ -1,3 +1,6 @@
+import pickle
+
+import numpy as np
 import pytest
 
 import medvision as mv
@@ -55,6 +58,50 @@ def test_update_dsmd_keys():
     assert '000002' in dst_dsmd
 
 
+def test_dsmd_container():
+    dsmd = mv.Dsmd({'b10': 1, 'b2': 2, 'a': 3})
+    assert list(dsmd) == ['a', 'b2', 'b10']
+    dsmd['b3'] = 4
+    dsmd['c'] = 5
+    assert list(dsmd) == ['a', 'b2', 'b3', 'b10', 'c']
+    del dsmd['b2']
+    assert dsmd.pop('a') == 3 and dsmd.popitem() == ('c', 5)
+    assert list(dsmd.items()) == [('b3', 4), ('b10', 1)]
+    assert pickle.loads(pickle.dumps(dsmd)) == dsmd
+
+    other = {'b10': 0, 'd1': 0}
+    assert list(dsmd.intersection(other)) == ['b10']
+    assert list(dsmd.difference(other)) == ['b3']
+    assert list(dsmd.subset(['b10', 'b3']).items()) == [('b3', 4), ('b10', 1)]
+
+    dt, gt, missing, unmatched = mv.match_dsmds(dsmd, other, return_unmatched=True)
+    assert list(dt.items()) == [('b10', 1)] and list(gt.items()) == [('b10', 0)]
+    assert list(missing) == ['d1'] and list(unmatched) == ['b3']
+
+    with pytest.raises(NotImplementedError):
+        dsmd.move_to_end('b3')
+    dsmd['b1'] = 0
+    assert list(dsmd) == ['b1', 'b3', 'b10'] and list(dsmd.subset(['b10', 'b1'])) == ['b1', 'b10']
+
+
+def test_loaded_dsmds_are_natsorted(tmpdir):
+    gts = mv.load_dsmd(DSMD_DET_GT, DSMD_DET_C2L, mode='det')
+    assert isinstance(gts, mv.Dsmd) and list(gts) == list(mv.make_dsmd(dict(gts)))
+    gts['0'] = gts[next(iter(gts))]
+    assert next(iter(gts)) == '0'
+
+    cls_path, det_path = str(tmpdir.join('cls.npz')), str(tmpdir.join('det.npz'))
+    mv.save_dsmd(cls_path, mv.load_dsmd(DSMD_CLS_ML), format='npz')
+    mv.save_dsmd(det_path, gts, DSMD_DET_C2L, mode='det', format='npz')
+    assert isinstance(mv.load_dsmd(cls_path), mv.Dsmd)
+    assert isinstance(mv.load_dsmd(det_path, DSMD_DET_C2L, mode='det'), mv.Dsmd)
+
+    mv.split_dsmd_file(cls_path, {'train': 0.5, 'val': 0.5}, shuffle=False)
+    train_dsmd = mv.load_dsmd(str(tmpdir.join('train.csv')))
+    val_dsmd = mv.load_dsmd(str(tmpdir.join('val.csv')))
+    assert list(train_dsmd) + list(val_dsmd) == list(mv.load_dsmd(DSMD_CLS_ML))
+
+
 def test_merge_det_dsmds():
     dsmd_dt = mv.load_det_dsmd(DSMD_DET_GT, DSMD_DET_C2L)
     assert len(dsmd_dt) == 703
@@ -73,6 +120,165 @@ def test_merge_det_dsmds():
     assert a2[1] in (3, 5)
 
 
+def test_load_det_dsmd(tmpdir):
+    dsmd_path = str(tmpdir.join('dsmd.csv'))
+    with open(dsmd_path, 'w') as f:
+        f.write(
+            'img10.png,1,2,3,4,0.5,dog\n'
+            'img2.png,5,6,7,8,0.9,cat\n'
+            'img3.png,,,,,,\n'
+            'img10.png,9,10,11,12,0.7,cat\n'
+            'img10.png,13,14,15,16,0.1,dog\n'
+        )
+    dsmd = mv.load_det_dsmd(dsmd_path, {'cat': 0, 'dog': 1})
+    assert list(dsmd.keys()) == ['img2.png', 'img3.png', 'img10.png']
+    assert [len(boxes) for boxes in dsmd['img10.png']] == [1, 2]
+    boxes = np.array([[1, 2, 3, 4, 0.5], [13, 14, 15, 16, 0.1]], dtype=np.float32)
+    assert dsmd['img10.png'][1].dtype == np.float32
+    assert np.array_equal(dsmd['img10.png'][1], boxes)
+    assert dsmd['img3.png'][0].shape == (0, 5)
+    assert dsmd['img2.png'][1].shape == (0, 5)
+
+
+def test_save_det_dsmd(tmpdir):
+    dsmd = {
+        'img10.png': [np.array([[1, 2, 3, 4, 0.5]]), np.array([[5, 6, 7, 8, 0.25]])],
+        'img2.png': [np.zeros((0, 5)), np.zeros((0, 5))],
+    }
+    expected = (
+        'img2.png,,,,,,\n'
+        'img10.png,1.0,2.0,3.0,4.0,0.5,cat\n'
+        'img10.png,5.0,6.0,7.0,8.0,0.25,dog\n'
+    )
+    for chunk_size in [1, 1 << 20]:
+        dsmd_path = str(tmpdir.join('dsmd_%d.csv' % chunk_size))
+        mv.save_det_dsmd(dsmd_path, dsmd, {'cat': 0, 'dog': 1}, chunk_size=chunk_size)
+        with open(dsmd_path) as f:
+            assert f.read() == expected
+
+    dsmd = {'img1.png': [np.array([[1, 2, 3, 4]])]}
+    mv.save_det_dsmd(dsmd_path, dsmd, {'cat': 0})
+    with open(dsmd_path) as f:
+        assert f.read() == 'img1.png,1,2,3,4,cat\n'
+
+
+def test_ragged_det_dsmd(tmpdir):
+    dsmd = mv.load_det_dsmd(DSMD_DET_DT, DSMD_DET_C2L)
+    ragged = mv.load_det_dsmd(DSMD_DET_DT, DSMD_DET_C2L, ragged=True)
+    assert isinstance(ragged, mv.RaggedDetDsmd) and len(ragged) == len(dsmd)
+    assert list(ragged.keys()) == list(dsmd.keys())
+    for key in dsmd:
+        assert all(np.array_equal(a, b) for a, b in zip(ragged[key], dsmd[key]))
+
+    converted = mv.RaggedDetDsmd.from_dsmd(dsmd)
+    assert np.array_equal(converted.boxes, ragged.boxes)
+    assert np.array_equal(converted.offsets, ragged.offsets)
+    assert converted.labels.dtype == np.int16 and converted.offsets.dtype == np.int64
+    unpickled = pickle.loads(pickle.dumps(ragged))
+    assert all(np.array_equal(a[0], b[0]) for a, b in zip(unpickled.values(), dsmd.values()))
+
+    # merging, saving and evaluation accept RaggedDetDsmds directly
+    merged = mv.merge_det_dsmds(ragged, ragged)
+    assert isinstance(merged, mv.RaggedDetDsmd)
+    expected = mv.merge_det_dsmds(dsmd, dsmd)
+    for key in dsmd:
+        assert np.array_equal(merged[key][0], expected[key][0])
+
+    paths = [str(tmpdir.join('dict.csv')), str(tmpdir.join('ragged.csv'))]
+    mv.save_det_dsmd(paths[0], dsmd, DSMD_DET_C2L)
+    mv.save_det_dsmd(paths[1], ragged, DSMD_DET_C2L)
+    with open(paths[0]) as f1, open(paths[1]) as f2:
+        assert f1.read() == f2.read()
+
+    gts = mv.load_det_dsmd(DSMD_DET_GT, DSMD_DET_C2L)
+    gts = {key: gts.get(key, [np.zeros((0, 4), dtype=np.float32)]) for key in dsmd}
+    ragged_gts = mv.RaggedDetDsmd.from_dsmd(gts)
+    assert mv.eval_det(ragged, ragged_gts)[0]['ap'] == mv.eval_det(dsmd, gts)[0]['ap']
+
+
+@pytest.mark.parametrize('format', ['npz', 'parquet'])
+def test_binary_dsmd(tmpdir, format):
+    if format == 'parquet':
+        pytest.importorskip('pyarrow')
+
+    det_path = str(tmpdir.join('det.bin'))
+    dsmd = mv.load_det_dsmd(DSMD_DET_DT, DSMD_DET_C2L)
+    mv.save_dsmd(det_path, dsmd, DSMD_DET_C2L, mode='det', format=format)
+    assert mv.binary_format(det_path) == format
+    loaded = mv.load_dsmd(det_path, DSMD_DET_C2L, mode='det')
+    assert list(loaded.keys()) == list(dsmd.keys())
+    for key in dsmd:
+        assert all(np.array_equal(a, b) for a, b in zip(loaded[key], dsmd[key]))
+    ragged = mv.load_binary_dsmd(det_path, ragged=True)
+    if format == 'npz':
+        assert isinstance(ragged.boxes.base, np.memmap)
+
+    # lossless round trip through the binary format
+    csv_path = str(tmpdir.join('det.csv'))
+    mv.convert_dsmd(det_path, csv_path, mode='det', format='csv')
+    mv.save_det_dsmd(str(tmpdir.join('expected.csv')), dsmd, DSMD_DET_C2L)
+    with open(csv_path) as f1, open(str(tmpdir.join('expected.csv'))) as f2:
+        assert f1.read() == f2.read()
+    with pytest.raises(ValueError):
+        mv.convert_dsmd(csv_path, str(tmpdir.join('det2.bin')), mode='det', format=format)
+
+    for dsmd_file in [DSMD_CLS_SL, DSMD_CLS_ML, CLS2LBL]:
+        cls_path = str(tmpdir.join('cls.bin'))
+        mv.convert_dsmd(dsmd_file, cls_path, format=format)
+        assert mv.load_dsmd(cls_path) == mv.load_dsmd(dsmd_file)
+
+
+@pytest.mark.parametrize('chunk_rows', [3, 50, 100000])
+def test_iter_dsmd(tmpdir, chunk_rows):
+    dsmd = mv.load_det_dsmd(DSMD_DET_DT, DSMD_DET_C2L)
+    items = list(mv.iter_dsmd(DSMD_DET_DT, DSMD_DET_C2L, mode='det', chunk_rows=chunk_rows))
+    assert [key for key, _ in items] == list(dsmd.keys())
+    for key, value in items:
+        assert all(np.array_equal(a, b) for a, b in zip(value, dsmd[key]))
+
+    chunks = list(mv.iter_dsmd(DSMD_DET_DT, DSMD_DET_C2L, 'det', chunk_rows, chunked=True))
+    assert sum(len(chunk) for chunk in chunks) == len(dsmd)
+
+    npz_path = str(tmpdir.join('det.npz'))
+    mv.save_dsmd(npz_path, dsmd, DSMD_DET_C2L, mode='det', format='npz')
+    chunks = list(mv.iter_dsmd(npz_path, mode='det', chunk_rows=chunk_rows, chunked=True))
+    assert [key for chunk in chunks for key in chunk] == list(dsmd.keys())
+
+    dsmd = mv.load_dsmd(DSMD_CLS_ML)
+    chunks = list(mv.iter_dsmd(DSMD_CLS_ML, chunk_rows=chunk_rows, chunked=True))
+    assert all(len(chunk) <= chunk_rows for chunk in chunks)
+    assert dict(mv.iter_dsmd(DSMD_CLS_ML)) == {k: v for c in chunks for k, v in c.items()} == dsmd
+
+
+def test_load_cls_dsmd(tmpdir):
+    # values are parsed as 'ast.literal_eval' does, or kept as str
+    texts = [
+        ('b,1\na, 2 \nc,-1\nd,0\na,3', {'a': 3, 'b': 1, 'c': -1, 'd': 0}),
+        ('a,1,0,1\nb, 0,1 ,0\n', {'a': (1, 0, 1), 'b': (0, 1, 0)}),
+        ('a,1\nb,01\n', {'a': 1, 'b': '01'}),
+        ('a,1\nb,1,0\n', {'a': 1, 'b': (1, 0)}),
+        ('a,data/a.png\nb,data/b.png\n', {'a': 'data/a.png', 'b': 'data/b.png'}),
+        ('a b ,99999999999999999999\nb,True\n', {'a b ': 99999999999999999999, 'b': True}),
+    ]
+    for i, (text, expected) in enumerate(texts):
+        dsmd_path = str(tmpdir.join('%d.csv' % i))
+        with open(dsmd_path, 'w') as f:
+            f.write(text)
+        dsmd = mv.load_cls_dsmd(dsmd_path)
+        assert list(dsmd.items()) == list(expected.items())
+        assert [type(v) for v in dsmd.values()] == [type(v) for v in expected.values()]
+
+    keys, labels = mv.load_cls_dsmd(str(tmpdir.join('1.csv')), as_matrix=True)
+    assert keys.tolist() == ['a', 'b']
+    assert labels.dtype == np.uint8 and labels.tolist() == [[1, 0, 1], [0, 1, 0]]
+    keys, labels = mv.load_cls_dsmd(DSMD_CLS_SL, as_matrix=True, num_classes=5)
+    dsmd = mv.load_dsmd(DSMD_CLS_SL)
+    assert keys.tolist() == list(dsmd.keys())
+    assert labels.shape == (len(dsmd), 5) and labels.argmax(axis=1).tolist() == list(dsmd.values())
+    with pytest.raises(ValueError):
+        mv.load_cls_dsmd(str(tmpdir.join('4.csv')), as_matrix=True)
+
+
 def test_gen_cls_ds():
     tmp_dir = mv.joinpath(DATA_DIR, 'temporary_subdir')
     mv.mkdirs(tmp_dir)
@@ -134,3 +340,45 @@ def test_split_dsmd_file(dsmd_file):
     assert 'brain_019.dcm' in val_dsmd
 
     mv.rmtree(tmp_dir)
+
+
+def test_split_dsmd(tmpdir):
+    dsmd_path = str(tmpdir.join('dsmd.csv'))
+    with open(dsmd_path, 'w') as f:
+        for i in range(40):
+            f.write('p%d/%d.png,%d\n' % (i // 2, i, (i // 2) % 4 == 0))
+    dsmd = mv.load_dsmd(dsmd_path)
+
+    result = mv.split_dsmd(dsmd_path, num_folds=5, group_fn=mv.parentdir, chunk_rows=7)
+    assert result == mv.split_dsmd(dsmd_path, num_folds=5, group_fn=mv.parentdir)
+    assert len(result) == 10
+    for i in range(5):
+        train = mv.load_dsmd(str(tmpdir.join('fold%d' % i, 'train.csv')))
+        val = mv.load_dsmd(str(tmpdir.join('fold%d' % i, 'val.csv')))
+        assert len(val) == 8 and sum(val.values()) == 2
+        assert sorted(list(train) + list(val)) == sorted(dsmd)
+        assert not {mv.parentdir(k) for k in train} & {mv.parentdir(k) for k in val}
+
+    out_dir = str(tmpdir.join('det'))
+    gts = mv.load_dsmd(DSMD_DET_GT, DSMD_DET_C2L, mode='det')
+    result = mv.split_dsmd(
+        DSMD_DET_GT, {'train': 0.8, 'val': 0.2}, out_dir, DSMD_DET_C2L, 'det', chunk_rows=10
+    )
+    assert sum(result.values()) == len(gts)
+    for dsmd_path in result:
+        for key, value in mv.load_dsmd(dsmd_path, DSMD_DET_C2L, mode='det').items():
+            assert all(np.array_equal(a, b) for a, b in zip(value, gts[key]))
+
+    det_path = str(tmpdir.join('det.csv'))
+    with open(det_path, 'w') as f:
+        f.write('a.png,0.3,1,5,7.25,cat\nb.png,,,,,\nc.png,1,2,3,4,dog\nc.png,5,6,7,8,cat\n')
+    class2label = {'cat': 0, 'dog': 1}
+    with pytest.raises(AssertionError):
+        mv.split_dsmd(det_path, mode='det')
+    result = mv.split_dsmd(det_path, num_folds=2, class2label=class2label, mode='det')
+    rows = []
+    for i in range(2):
+        with open(str(tmpdir.join('fold%d' % i, 'val.csv'))) as f:
+            rows.extend(f.read().splitlines())
+    with open(det_path) as f:
+        assert sorted(rows) == sorted(f.read().splitlines())
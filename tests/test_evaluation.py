@@ -42,3 +42,375 @@ def test_eval_det_b():
 
     m = mv.eval_det4binarycls(dts, gts, score_thrs=[0.05])
     assert m['thrs']['0.05']['accuracy'] > 0.99
+
+
+def test_match_image():
+    from medvision.evaluation.match_det import match_image
+
+    gt = np.array([[0, 0, 9, 9], [20, 20, 29, 29]], dtype=np.float32)
+    dt = np.array([
+        [0, 0, 9, 9, 0.6],      # duplicate of gt 0 (lower score) -> fp
+        [20, 20, 29, 29, 0.2],  # matches gt 1 -> tp
+        [1, 1, 9, 9, 0.9],      # matches gt 0 -> tp
+        [50, 50, 59, 59, 0.4],  # no overlap -> fp
+    ], dtype=np.float32)
+    tps, scores = match_image(dt, gt, [0.5, 0.95])
+    assert np.allclose(scores, [0.9, 0.6, 0.4, 0.2])
+    assert tps.tolist() == [[True, False, False, True], [False, True, False, True]]
+
+    tps, _ = match_image(dt, gt[:0], [0.5])
+    assert tps.shape == (1, 4) and not tps.any()
+
+
+def test_eval_det_multi_iou_thrs():
+    dts = mv.load_dsmd(DSMD_DET_DT, DSMD_DET_C2L, mode='det')
+    gts = mv.load_dsmd(DSMD_DET_GT, DSMD_DET_C2L, mode='det')
+    iou_thrs = [0.3, 0.5, 0.75]
+    det_metric = mv.eval_det(dts, gts, iou_thr=iou_thrs)
+    aps = []
+    for iou_thr in iou_thrs:
+        single = mv.eval_det(dts, gts, iou_thr=iou_thr)[0]
+        multi = det_metric[0]['thrs']['%g' % iou_thr]
+        assert multi['ap'] == single['ap']
+        assert multi['froc_auc'] == single['froc_auc']
+        aps.append(single['ap'])
+    assert det_metric[0]['ap'] == np.mean(aps)
+    assert int(det_metric[0]['num_gt_bboxes']) == 546
+
+
+def test_eval_det_workers():
+    dts = mv.load_dsmd(DSMD_DET_DT, DSMD_DET_C2L, mode='det')
+    gts = mv.load_dsmd(DSMD_DET_GT, DSMD_DET_C2L, mode='det')
+    single = mv.eval_det(dts, gts, iou_thr=[0.5, 0.75])[0]
+    for workers in (2, 3):
+        multi = mv.eval_det(dts, gts, iou_thr=[0.5, 0.75], workers=workers)[0]
+        assert multi['ap'] == single['ap']
+        assert np.array_equal(multi['thrs']['0.5']['froc'][0], single['thrs']['0.5']['froc'][0])
+        assert np.array_equal(multi['thrs']['0.5']['froc'][1], single['thrs']['0.5']['froc'][1])
+
+
+def test_eval_dets():
+    dts = mv.load_dsmd(DSMD_DET_DT, DSMD_DET_C2L, mode='det')
+    gts = mv.load_dsmd(DSMD_DET_GT, DSMD_DET_C2L, mode='det')
+    # a 2nd model missing detections of half of the images
+    keys = list(dts.keys())
+    dts2 = {k: v if i % 2 else [v[0][:0]] for i, (k, v) in enumerate(dts.items())}
+    expected = [mv.eval_det(d, gts, iou_thr=[0.5, 0.75]) for d in (dts, dts2)]
+
+    gt_index = mv.DetGtIndex(gts)
+    for workers in (None, 2):
+        results = mv.eval_dets(
+            {'a': dts, 'b': dts2}, gt_index, iou_thr=[0.5, 0.75], workers=workers)
+        assert list(results.keys()) == ['a', 'b']
+        for result, exp in zip(results.values(), expected):
+            assert result[0]['ap'] == exp[0]['ap']
+            assert result[0]['froc_auc'] == exp[0]['froc_auc']
+    assert expected[0][0]['ap'] != expected[1][0]['ap']
+
+    results = mv.eval_dets([[dts[k] for k in keys]], [gts[k] for k in keys], iou_thr=0.5)
+    assert results[0][0]['ap'] == mv.eval_det(dts, gts, iou_thr=0.5)[0]['ap']
+
+
+def test_eval_det_subsets():
+    dts = mv.load_dsmd(DSMD_DET_DT, DSMD_DET_C2L, mode='det')
+    gts = mv.load_dsmd(DSMD_DET_GT, DSMD_DET_C2L, mode='det')
+    expected = mv.eval_det(dts, gts, iou_thr=0.5)[0]
+
+    # 2 groups of images
+    keys = sorted(gts.keys())
+    groups = {k: i % 2 for i, k in enumerate(keys)}
+    area_ranges = {'all': (0, np.inf), 'small': (0, 32 ** 2), 'large': (32 ** 2, np.inf)}
+    results = mv.eval_det_subsets(
+        dts, gts, iou_thr=0.5, area_ranges=area_ranges, groups=groups, workers=2)
+    assert results['all'][0]['ap'] == expected['ap']
+    assert results['areas']['all'][0]['ap'] == expected['ap']
+    assert np.array_equal(results['areas']['all'][0]['froc'][1], expected['froc'][1])
+    num_gts = [results['areas'][name][0]['num_gt_bboxes'] for name in ('small', 'large')]
+    assert sum(num_gts) == expected['num_gt_bboxes']
+
+    for group in (0, 1):
+        subset = [k for k in keys if groups[k] == group]
+        group_expected = mv.eval_det(
+            {k: dts[k] for k in subset}, {k: gts[k] for k in subset}, iou_thr=0.5)[0]
+        assert np.isclose(results['groups'][group][0]['ap'], group_expected['ap'])
+        assert np.isclose(results['groups'][group][0]['froc_auc'], group_expected['froc_auc'])
+
+
+def test_match_cache(tmpdir):
+    dts = mv.load_dsmd(DSMD_DET_DT, DSMD_DET_C2L, mode='det')
+    gts = mv.load_dsmd(DSMD_DET_GT, DSMD_DET_C2L, mode='det')
+    expected = mv.eval_det(dts, gts, iou_thr=[0.5, 0.75])[0]
+
+    path = str(tmpdir.join('match_cache.npz'))
+    cache = mv.MatchCache(path)
+    result = mv.eval_det(dts, gts, iou_thr=[0.5, 0.75], cache=cache)[0]
+    assert cache.num_misses == len(gts) and cache.num_hits == 0
+    assert result['ap'] == expected['ap']
+    num_entries = len(cache)  # images with the same dts and gts share entries
+    cache.save()
+
+    # only the changed image is matched again
+    key = [k for k, v in dts.items() if len(v[0]) > 1][0]
+    dts[key] = [dts[key][0][:1]]
+    expected = mv.eval_det(dts, gts, iou_thr=[0.5, 0.75])[0]
+    cache = mv.MatchCache(path)
+    result = mv.eval_det(dts, gts, iou_thr=[0.5, 0.75], cache=cache)[0]
+    assert cache.num_misses == 1 and cache.num_hits == len(gts) - 1
+    assert result['ap'] == expected['ap']
+    assert np.array_equal(result['thrs']['0.75']['froc'][0], expected['thrs']['0.75']['froc'][0])
+    assert len(cache) == num_entries + 1
+    cache.prune()
+    assert len(cache) == num_entries
+
+
+def test_det_evaluator():
+    import pickle
+
+    dts = mv.load_dsmd(DSMD_DET_DT, DSMD_DET_C2L, mode='det')
+    gts = mv.load_dsmd(DSMD_DET_GT, DSMD_DET_C2L, mode='det')
+    expected = mv.eval_det(dts, gts, iou_thr=0.5)[0]
+
+    # feed batches in a shuffled order to 2 evaluators and merge them
+    keys = list(gts.keys())
+    np.random.RandomState(0).shuffle(keys)
+    evaluators = [mv.DetEvaluator(iou_thr=0.5), mv.DetEvaluator(iou_thr=0.5)]
+    for i, start in enumerate(range(0, len(keys), 100)):
+        batch = keys[start:start + 100]
+        evaluators[i % 2].update({k: dts[k] for k in batch}, {k: gts[k] for k in batch})
+    state = pickle.loads(pickle.dumps(evaluators[1].state_dict()))
+    evaluator = evaluators[0].merge(mv.DetEvaluator.from_state_dict(state))
+    result = evaluator.compute()[0]
+
+    assert result['ap'] == expected['ap']
+    assert result['froc_auc'] == expected['froc_auc']
+    assert np.array_equal(result['froc'][0], expected['froc'][0])
+    assert np.array_equal(result['froc'][1], expected['froc'][1])
+
+    # list batches of 2 evaluators are merged in order
+    keys = list(gts.keys())
+    evaluators = [mv.DetEvaluator(iou_thr=0.5), mv.DetEvaluator(iou_thr=0.5)]
+    for start in range(0, len(keys), 100):
+        batch = keys[start:start + 100]
+        evaluators[start * 2 // len(keys)].update(
+            [dts[k] for k in batch], [gts[k] for k in batch])
+    result = evaluators[0].merge(evaluators[1]).compute()[0]
+    assert result['ap'] == expected['ap']
+    assert np.array_equal(result['froc'][0], expected['froc'][0])
+
+
+def test_eval_det4binarycls_operating_points():
+    dts = mv.load_dsmd(DSMD_DET_DT, DSMD_DET_C2L, mode='det')
+    gts = mv.load_dsmd(DSMD_DET_GT, DSMD_DET_C2L, mode='det')
+    m = mv.eval_det4binarycls(dts, gts, score_thrs=[0.05, 0.5])
+    table = m['operating_points']
+    assert np.all(np.diff(table['thr']) < 0)
+    assert np.all(np.diff(table['tp']) >= 0) and np.all(np.diff(table['fp']) >= 0)
+
+    # images at the score of a row are positive, i.e. a row is the same as
+    # thresholding (> thr) at the score of the next row
+    thrs = table['thr'][1::50].tolist()
+    m = mv.eval_det4binarycls(dts, gts, score_thrs=(thr for thr in thrs))
+    for i, thr in enumerate(thrs):
+        result = m['thrs'][str(thr)]
+        assert result['tp'] == table['tp'][i * 50]
+        assert result['fp'] == table['fp'][i * 50]
+        assert result['tn'] + result['fp'] == table['tn'][0] + table['fp'][0]
+
+    # the first row has the images of the max score, the last one has all
+    # the images with detections
+    max_scores = [max((b[-1] for b in dt[0]), default=None) for dt in dts.values()]
+    scores = np.array([s for s in max_scores if s is not None])
+    has_gts = np.array([len(gt[0]) > 0 for gt, s in zip(gts.values(), max_scores) if s is not None])
+    assert table['tp'][0] + table['fp'][0] == np.sum(scores == scores.max())
+    assert table['tp'][-1] == has_gts.sum() and table['fp'][-1] == (~has_gts).sum()
+
+
+def test_find_operating_points():
+    dts = mv.load_dsmd(DSMD_DET_DT, DSMD_DET_C2L, mode='det')
+    gts = mv.load_dsmd(DSMD_DET_GT, DSMD_DET_C2L, mode='det')
+    det_metric = mv.eval_det(dts, gts, fp_rates=[0.25, 0.5, 100], recalls=[0.3, 2.0])[0]
+    fps, recall = det_metric['froc']
+    pr = det_metric['pr']
+    assert set(pr.keys()) == {'fp-0.25', 'fp-0.5', 'recall-0.3'}
+    for rate in (0.25, 0.5):
+        point = pr['fp-' + str(rate)]
+        i = np.flatnonzero(fps == point['fps'])[-1]
+        assert fps[i] < rate <= fps[i + 1]
+    assert pr['recall-0.3']['recall'] >= 0.3
+    assert np.sum(recall >= 0.3) == np.sum(recall >= pr['recall-0.3']['recall'])
+
+    points = mv.find_operating_points(
+        np.array([0.0, 0.1, 0.5]), np.array([0.1, 0.2, 0.3]), np.ones(3), np.array([0.9, 0.8, 0.7]))
+    assert list(points.keys()) == ['fp-0.1', 'fp-0.2', 'fp-0.3', 'fp-0.4', 'fp-0.5']
+    assert points['fp-0.1']['thr'] == 0.9
+    assert points['fp-0.5']['thr'] == 0.8
+
+
+def test_bootstrap_eval_det():
+    dts = mv.load_dsmd(DSMD_DET_DT, DSMD_DET_C2L, mode='det')
+    gts = mv.load_dsmd(DSMD_DET_GT, DSMD_DET_C2L, mode='det')
+    det_metric = mv.eval_det(dts, gts)[0]
+    ci = mv.bootstrap_eval_det(dts, gts, num_samples=50, seed=1)[0]
+    assert ci['ap']['lower'] < det_metric['ap'] < ci['ap']['upper']
+    assert ci['froc_auc']['lower'] < det_metric['froc_auc'] < ci['froc_auc']['upper']
+    ci2 = mv.bootstrap_eval_det(dts, gts, num_samples=50, seed=1, workers=2)[0]
+    assert np.array_equal(ci['ap']['samples'], ci2['ap']['samples'])
+
+    m = mv.eval_det4binarycls(dts, gts, score_thrs=0.5)
+    ci = mv.bootstrap_eval_det4binarycls(dts, gts, num_samples=50, seed=1)
+    assert ci['roc_auc']['lower'] < m['roc_auc'] < ci['roc_auc']['upper']
+
+
+def test_compute_overlap_sparse():
+    from medvision.evaluation import match_det
+    from medvision.evaluation.compute_overlap import compute_overlap, compute_overlap_sparse
+
+    rng = np.random.RandomState(0)
+    xy = rng.randint(0, 1000, size=(2000, 2)).astype(np.float32)
+    boxes = np.hstack([xy, xy + rng.randint(0, 40, size=(2000, 2))])
+    a, b = boxes[:1200], boxes[1200:]
+
+    dense = compute_overlap(a, b)
+    indptr, indices, overlaps = compute_overlap_sparse(a, b, max_candidates=5000)
+    rows, cols = np.nonzero(dense)
+    assert np.array_equal(indptr, np.r_[0, np.cumsum(np.count_nonzero(dense, axis=1))])
+    assert np.array_equal(indices, cols)
+    assert np.array_equal(overlaps, dense[rows, cols])
+
+    # matching results are the same in dense and sparse modes
+    dt = np.hstack([a, rng.rand(len(a), 1).astype(np.float32)])
+    dense_results = match_det.match_image(dt, b, [0.1, 0.5])
+    min_pairs = match_det.SPARSE_OVERLAP_MIN_PAIRS
+    match_det.SPARSE_OVERLAP_MIN_PAIRS = 0
+    sparse_results = match_det.match_image(dt, b, [0.1, 0.5])
+    match_det.SPARSE_OVERLAP_MIN_PAIRS = min_pairs
+    assert np.array_equal(dense_results[0], sparse_results[0])
+    assert dense_results[0].sum() > 0
+
+
+def test_compute_overlap_batched():
+    from medvision.evaluation import match_det
+    from medvision.evaluation.compute_overlap import compute_overlap, compute_overlap_batched
+
+    rng = np.random.RandomState(0)
+
+    def random_boxes(n):
+        xy = rng.randint(0, 100, size=(n, 2)).astype(np.float32)
+        return np.hstack([xy, xy + rng.randint(1, 40, size=(n, 2))])
+
+    num_dets, num_gts = [3, 0, 5, 2, 4], [2, 3, 0, 1, 4]
+    dts = [random_boxes(n) for n in num_dets]
+    gts = [random_boxes(n) for n in num_gts]
+    overlaps, offsets = compute_overlap_batched(
+        np.concatenate(dts), np.r_[0, np.cumsum(num_dets)],
+        np.concatenate(gts), np.r_[0, np.cumsum(num_gts)],
+    )
+    assert len(offsets) == len(dts) + 1
+    for i, (dt, gt) in enumerate(zip(dts, gts)):
+        block = overlaps[offsets[i]:offsets[i + 1]].reshape(len(dt), len(gt))
+        assert np.array_equal(block, compute_overlap(dt, gt))
+
+    # batched matching equals matching image by image
+    dts = [[np.hstack([dt, rng.rand(len(dt), 1)])] for dt in dts]
+    gts = [[gt] for gt in gts]
+    max_batch_pairs = match_det.MAX_BATCH_PAIRS
+    match_det.MAX_BATCH_PAIRS = 8
+    tps, scores, num_anns = match_det.match_label(dts, gts, 0, [0.1, 0.3])
+    match_det.MAX_BATCH_PAIRS = max_batch_pairs
+    expected = [match_det.match_image(dt[0], gt[0], [0.1, 0.3]) for dt, gt in zip(dts, gts)]
+    assert np.array_equal(tps, np.hstack([tps for tps, _ in expected]))
+    assert np.array_equal(scores, np.concatenate([scores for _, scores in expected]))
+    assert num_anns == sum(num_gts)
+
+
+def test_eval_seg(tmpdir):
+    gt = np.zeros((50, 60), dtype=np.uint8)
+    gt[10:20, 10:20] = 1
+    gt[30:40, 30:50] = 2
+    dt = gt.copy()
+    dt[10:20, 10:22] = 0
+    dt[10:20, 12:22] = 1  # shifted by 2 pixels
+    for name, mask in (('dt.png', dt), ('gt.png', gt)):
+        mv.imwrite(str(tmpdir.join(name)), mask)
+    tmpdir.join('dt.txt').write('1.png,dt.png\n2.png,gt.png\n')
+    tmpdir.join('gt.txt').write('1.png,gt.png\n2.png,gt.png\n')
+    dts = mv.load_seg_dsmd(str(tmpdir.join('dt.txt')))
+    gts = mv.load_seg_dsmd(str(tmpdir.join('gt.txt')))
+
+    for workers in (None, 2):
+        results = mv.eval_seg(
+            dts, gts, num_classes=3, surface=True, root_dir=str(tmpdir), workers=workers)
+        image_result = results['per_image']['1.png']
+        assert image_result['dice'][1] == 0.8 and image_result['dice'][2] == 1
+        assert image_result['hausdorff'][1] == 2 and image_result['assd'][2] == 0
+        assert results[1]['dice'] == 0.9 and results[1]['hausdorff'] == 1
+        assert results['confusion_matrix'].sum() == 2 * dt.size
+        assert results[1]['global_iou'] == 180 / 220
+
+    assert mv.surface_distances(dt == 1, np.zeros_like(gt)) == (np.inf, np.inf, np.inf)
+
+
+def test_eval_cls():
+    from sklearn import metrics as skm
+
+    rng = np.random.RandomState(0)
+    labels = rng.randint(0, 3, 500)
+    scores = np.round(rng.rand(500, 3), 2)  # with ties
+    scores[np.arange(500), labels] += 0.2
+    preds = {str(i): scores[i].tolist() for i in range(500)}
+    targets = {str(i): int(labels[i]) for i in range(500)}
+
+    # feed in 2 batches, and an unmatched prediction is ignored
+    evaluator = mv.ClsEvaluator(num_classes=3)
+    evaluator.update({k: preds[k] for k in list(preds)[:200]}, targets)
+    evaluator.update(dict(list(preds.items())[200:], extra=[1, 0, 0]), targets)
+    results = evaluator.compute(score_thrs=[0.3, 0.6])
+    for label in range(3):
+        expected = skm.roc_auc_score(labels == label, scores[:, label])
+        assert np.isclose(results[label]['auc'], expected)
+        tp = np.sum((labels == label) & (scores[:, label] >= 0.6))
+        assert results[label]['thrs']['tp'][1] == tp
+    assert np.array_equal(
+        results['confusion_matrix'], skm.confusion_matrix(labels, scores.argmax(axis=1)))
+
+    # merge evaluators fed with list batches
+    evaluators = [mv.ClsEvaluator(num_classes=3), mv.ClsEvaluator(num_classes=3)]
+    evaluators[0].update(scores[:200].tolist(), labels[:200].tolist())
+    evaluators[1].update(scores[200:].tolist(), labels[200:].tolist())
+    merged = evaluators[0].merge(evaluators[1]).compute(score_thrs=[0.3, 0.6])
+    expected = mv.eval_cls(scores.tolist(), labels.tolist(), 3, score_thrs=[0.3, 0.6])
+    for label in range(3):
+        assert merged[label]['auc'] == expected[label]['auc']
+        assert np.array_equal(merged[label]['thrs']['tp'], expected[label]['thrs']['tp'])
+    assert np.array_equal(merged['confusion_matrix'], expected['confusion_matrix'])
+
+    # multi-label
+    multi_labels = rng.randint(0, 2, (500, 3))
+    results = mv.eval_cls(
+        [tuple(s) for s in scores], [tuple(t) for t in multi_labels], 3, multi_label=True)
+    assert np.array_equal(
+        results['confusion_matrix'], skm.multilabel_confusion_matrix(multi_labels, scores >= 0.5))
+    assert np.isclose(results[2]['auc'], skm.roc_auc_score(multi_labels[:, 2], scores[:, 2]))
+
+
+def test_roc_pr_curves():
+    from sklearn import metrics as skm
+
+    rng = np.random.RandomState(0)
+    for y_true, y_score in [
+        (rng.randint(0, 2, 300), rng.rand(300)),
+        (rng.rand(300) < 0.3, np.round(rng.rand(300), 1).astype(np.float32)),  # ties
+    ]:
+        for actual, expected in [
+            (mv.roc_curve(y_true, y_score), skm.roc_curve(y_true, y_score)),
+            (mv.roc_curve(y_true, y_score, drop_intermediate=False),
+             skm.roc_curve(y_true, y_score, drop_intermediate=False)),
+            (mv.precision_recall_curve(y_true, y_score),
+             skm.precision_recall_curve(y_true, y_score)),
+        ]:
+            for a, e in zip(actual, expected):
+                assert np.array_equal(a, e) and a.dtype == e.dtype
+        assert mv.roc_auc_score(y_true, y_score) == skm.roc_auc_score(y_true, y_score)
+
+    assert np.isnan(mv.roc_auc_score([1, 1], [0.2, 0.3]))
+    assert mv.auc([1, 0.5, 0], [0, 1, 1]) == 0.75
@@ -1,3 +1,6 @@
+import os
+import subprocess
+import sys
 from contextlib import contextmanager
 
 import pytest
@@ -8,6 +11,25 @@ DATA_DIR = mv.joinpath(mv.parentdir(__file__), 'data')
 DCM_DIR = mv.joinpath(DATA_DIR, 'dicoms')
 PNG_DIR = mv.joinpath(DATA_DIR, 'pngs')
 
+# public names of 'import medvision as mv' before lazy loading
+BASELINE_NAMES = '''
+    Color GlobMode ImreadMode Timer abspath annotation basename batch_mask2rws batch_rws2mask
+    center_crop change_suffix classification compute_overlap copyfiles cp cptree crop dataset
+    dcminfo_pydicom dcmread_itk dcmread_pydicom decrypt decrypt_to_file_object denormalize_image
+    detection dicom download download_url draw_curve draw_froc_curve draw_pr_curve
+    draw_roc_curve dsmd dsmd2rws_bbox empty_dir encrypt encryption eval_det eval_det4binarycls
+    evaluation filetitle fileutil find_duplicated_files gen_cls_ds_from_datafolder
+    gen_cls_dsmd_file_from_datafolder get_rws_annot_path get_rws_datainfo_path get_rws_flag_path
+    get_rws_text_path glob gray2rgb hflip imadjust image imread imshow imshow_bboxes
+    imshow_dynamic imwrite io isarrayinstance isdicom isdicomdir isdir isfile joinpath
+    listdir_natsorted load_c2l load_det_dsmd load_dsmd load_rws_bbox load_rws_contour
+    load_seg_dsmd make_dsmd mask2rws match_dsmds merge_det_dsmds mkdirs move multiprocessutil
+    network non_overwrite_cp normalize_image pad_to_square parentdir plot_rws rescale resize
+    rgb2gray rm rmtree rot90 rotate rws rws2dsmd rws2dsmd_bbox rws2mask save_det_dsmd save_dsmd
+    save_rws_bbox save_seg_dsmd segmentation split_dsmd_file splitext symlink timer
+    tqdm_imap_unordered transforms typeutil update_dsmd_keys util vflip visualization
+'''.split()
+
 
 @contextmanager
 def not_raises(exception):
@@ -111,3 +133,29 @@ def test_encrypt_decrypt():
     data_encrypted = mv.encrypt(src_path, key, iv)
     data_decrypted = mv.decrypt(data_encrypted, key, iv)
     assert data_origin == data_decrypted
+
+
+def test_lazy_import():
+    script = (
+        'import sys\n'
+        'import medvision as mv\n'
+        'heavy = ["cv2", "matplotlib", "pandas", "pydicom", "SimpleITK"]\n'
+        'assert not [m for m in heavy if m in sys.modules]\n'
+        'assert callable(mv.glob) and "cv2" not in sys.modules\n'
+        'assert callable(mv.eval_det) and callable(mv.evaluation.eval_det)\n'
+        'assert callable(mv.mask2rws) and mv.util.__name__ == "medvision.util"\n'
+        'assert "imread" in dir(mv) and "imread" in mv.__all__\n'
+    )
+    root_dir = mv.parentdir(mv.parentdir(mv.__file__))
+    env = dict(os.environ, PYTHONPATH=root_dir)
+    subprocess.run([sys.executable, '-c', script], env=env, check=True)
+
+    with pytest.raises(AttributeError):
+        mv.no_such_attribute
+
+
+def test_public_names():
+    assert not [name for name in BASELINE_NAMES if name not in mv.__all__]
+    assert not [name for name in BASELINE_NAMES if name not in dir(mv)]
+    assert all(hasattr(mv, name) for name in BASELINE_NAMES)
+    assert mv.compute_overlap.__name__ == 'medvision.evaluation.compute_overlap'